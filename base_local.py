@@ -0,0 +1,139 @@
+# base_local.py
+# -*- coding: utf-8 -*-
+# Armazenamento local (SQLite) dos itens da API, usado pela sincronização incremental do main.py, e o checkpoint
+# das páginas da busca em curso, para retomar uma busca interrompida.
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+class LocalStore:
+    """Itens da API por endpoint e id, com a janela já sincronizada (início e marca de água) de cada endpoint."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                endpoint TEXT NOT NULL, id TEXT NOT NULL, item_date TEXT, data TEXT NOT NULL,
+                PRIMARY KEY (endpoint, id)
+            );
+            CREATE INDEX IF NOT EXISTS items_by_date ON items (endpoint, item_date);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                endpoint TEXT PRIMARY KEY, start_date TEXT NOT NULL, high_water TEXT NOT NULL, synced_at TEXT NOT NULL
+            );
+        """)
+
+    def close(self): self.conn.close()
+
+    def sync_state(self, endpoint):
+        row = self.conn.execute("SELECT start_date, high_water FROM sync_state WHERE endpoint = ?", (endpoint,)).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def set_sync_state(self, endpoint, start_date, high_water):
+        self.conn.execute("INSERT INTO sync_state (endpoint, start_date, high_water, synced_at) VALUES (?, ?, ?, ?) "
+                          "ON CONFLICT(endpoint) DO UPDATE SET start_date = excluded.start_date, high_water = excluded.high_water, synced_at = excluded.synced_at",
+                          (endpoint, start_date, high_water, datetime.now().isoformat(timespec="seconds")))
+        self.conn.commit()
+
+    def clear(self, endpoint):
+        self.conn.execute("DELETE FROM items WHERE endpoint = ?", (endpoint,))
+        self.conn.execute("DELETE FROM sync_state WHERE endpoint = ?", (endpoint,))
+        self.conn.commit()
+
+    def upsert(self, endpoint, items, date_of):
+        # ON CONFLICT ... DO UPDATE mantém o rowid, logo a ordem de inserção original (como o dict de unique_items).
+        rows = ((endpoint, str(it["id"]), date_of(it), json.dumps(it, ensure_ascii=False, separators=(",", ":"))) for it in items if it.get("id"))
+        cur = self.conn.executemany("INSERT INTO items (endpoint, id, item_date, data) VALUES (?, ?, ?, ?) "
+                                    "ON CONFLICT(endpoint, id) DO UPDATE SET item_date = excluded.item_date, data = excluded.data", rows)
+        self.conn.commit()
+        return cur.rowcount
+
+    def items(self, endpoint, start_date=None, end_date=None):
+        query, args = "SELECT data FROM items WHERE endpoint = ?", [endpoint]
+        if start_date: query += " AND (item_date IS NULL OR item_date >= ?)"; args.append(start_date)
+        if end_date: query += " AND (item_date IS NULL OR item_date <= ?)"; args.append(end_date)
+        for (data,) in self.conn.execute(query + " ORDER BY rowid", args):
+            yield json.loads(data)
+
+    def count(self, endpoint):
+        return self.conn.execute("SELECT COUNT(*) FROM items WHERE endpoint = ?", (endpoint,)).fetchone()[0]
+
+class FetchCheckpoint:
+    """Páginas já recebidas de cada janela (endpoint, início, fim) da busca em curso, num SQLite à parte.
+
+    Cada página fica gravada, com o cursor seguinte, assim que chega; uma busca interrompida recomeça da última
+    página gravada de cada janela em vez do início. Os workers da busca partilham o objeto (uma ligação com lock).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS runs (endpoint TEXT PRIMARY KEY, start_date TEXT NOT NULL, end_date TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS windows (
+                endpoint TEXT NOT NULL, window_start TEXT NOT NULL, window_end TEXT NOT NULL, status TEXT NOT NULL,
+                pages INTEGER NOT NULL, items INTEGER NOT NULL, next_cursor TEXT, updated_at TEXT NOT NULL,
+                PRIMARY KEY (endpoint, window_start, window_end)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                endpoint TEXT NOT NULL, window_start TEXT NOT NULL, window_end TEXT NOT NULL, page INTEGER NOT NULL, data TEXT NOT NULL,
+                PRIMARY KEY (endpoint, window_start, window_end, page)
+            );
+        """)
+
+    def close(self): self.conn.close()
+
+    def begin(self, endpoint, start_date, end_date):
+        """Começa (ou retoma) a busca de endpoint entre as duas datas. Se as datas mudaram (ex.: END_DATE é hoje e a
+        busca interrompida foi ontem), ficam só as janelas completas que ainda cabem no novo intervalo; as páginas
+        ficam gravadas por (endpoint, início, fim), logo as janelas que se repetem não voltam a ser pedidas."""
+        with self.lock:
+            row = self.conn.execute("SELECT start_date, end_date FROM runs WHERE endpoint = ?", (endpoint,)).fetchone()
+            if row == (start_date, end_date): return
+            stale = "endpoint = ? AND (status = 'partial' OR window_start < ? OR window_end > ?)"
+            keys = (endpoint, start_date, end_date)
+            self.conn.execute(f"DELETE FROM pages WHERE (endpoint, window_start, window_end) IN (SELECT endpoint, window_start, window_end FROM windows WHERE {stale})", keys)
+            self.conn.execute(f"DELETE FROM windows WHERE {stale}", keys)
+            self.conn.execute("INSERT OR REPLACE INTO runs (endpoint, start_date, end_date) VALUES (?, ?, ?)", (endpoint, start_date, end_date))
+            self.conn.commit()
+
+    def window(self, endpoint, ini, end):
+        """(estado, cursor seguinte, páginas, itens) gravados da janela, ou None; estado é partial, done ou split."""
+        with self.lock:
+            row = self.conn.execute("SELECT status, next_cursor, pages FROM windows WHERE endpoint = ? AND window_start = ? AND window_end = ?", (endpoint, ini, end)).fetchone()
+            if row is None: return None
+            items = []
+            for (data,) in self.conn.execute("SELECT data FROM pages WHERE endpoint = ? AND window_start = ? AND window_end = ? ORDER BY page", (endpoint, ini, end)):
+                items.extend(json.loads(data))
+        return row[0], row[1], row[2], items
+
+    def save_page(self, endpoint, ini, end, page, items, next_cursor, status):
+        """Grava a página (numerada a partir de 1) e o progresso da janela na mesma transação."""
+        data = json.dumps(items, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO pages (endpoint, window_start, window_end, page, data) VALUES (?, ?, ?, ?, ?)", (endpoint, ini, end, page, data))
+            self.conn.execute("INSERT INTO windows (endpoint, window_start, window_end, status, pages, items, next_cursor, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                              "ON CONFLICT(endpoint, window_start, window_end) DO UPDATE SET status = excluded.status, pages = excluded.pages, "
+                              "items = windows.items + excluded.items, next_cursor = excluded.next_cursor, updated_at = excluded.updated_at",
+                              (endpoint, ini, end, status, page, len(items), next_cursor, datetime.now().isoformat(timespec="seconds")))
+            self.conn.commit()
+
+    def progress(self, endpoint):
+        """[(início, fim, estado, páginas, itens)] das janelas de endpoint, por ordem de data."""
+        with self.lock:
+            return self.conn.execute("SELECT window_start, window_end, status, pages, items FROM windows WHERE endpoint = ? ORDER BY window_start, window_end", (endpoint,)).fetchall()
+
+    def finish(self, endpoint):
+        """Descarta o checkpoint de endpoint, depois de os itens estarem gravados na base local."""
+        with self.lock:
+            self._delete(endpoint)
+            self.conn.execute("DELETE FROM runs WHERE endpoint = ?", (endpoint,))
+            self.conn.commit()
+
+    def _delete(self, endpoint):
+        self.conn.execute("DELETE FROM pages WHERE endpoint = ?", (endpoint,))
+        self.conn.execute("DELETE FROM windows WHERE endpoint = ?", (endpoint,))
@@ -0,0 +1,993 @@
+# benchmark.py
+# -*- coding: utf-8 -*-
+# Benchmarks de desempenho com dados sintéticos. Não acede à API real.
+# Uso: python benchmark.py kpis --tamanhos 10000 100000 1000000
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import subprocess
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DMG_USER_TOKEN", "benchmark")
+import main
+from base_local import LocalStore
+from mock_guru import MockGuruAPI, synthetic_dataset
+
+def _cronometrar(fn, *args):
+    t0 = time.perf_counter(); result = fn(*args)
+    return time.perf_counter() - t0, result
+
+# =========================
+# BENCHMARKS
+# =========================
+def bench_kpis(tamanhos):
+    print(f"{'assinaturas':>12} {'transações':>12} {'índice (s)':>11} {'mensal (s)':>11} {'semanal (s)':>12}")
+    start_dt, end_dt = main.to_tz("2024-01-01"), main.to_tz("2025-12-31")
+    for n in tamanhos:
+        subs, txs = synthetic_dataset(n)
+        subs, txs = main.normalize_subscriptions(subs), main.normalize_transactions(txs)
+        t_index, index = _cronometrar(main.KpiIndex, subs, txs)
+        t_month, _ = _cronometrar(main.compute_monthly_kpis, index, main.month_periods(start_dt, end_dt))
+        t_week, _ = _cronometrar(main.compute_weekly_kpis, index, main.week_periods(start_dt, end_dt))
+        print(f"{n:>12} {len(txs):>12} {t_index:>11.3f} {t_month:>11.4f} {t_week:>12.4f}")
+
+def bench_normalize(tamanhos):
+    print(f"{'assinaturas':>12} {'dicts (MB)':>11} {'registos (MB)':>14} {'normalizar (s)':>15} {'relatórios (s)':>15}")
+    out_dir, main.OUT_DIR = main.OUT_DIR, tempfile.mkdtemp(prefix="kpis-bench-")
+    try:
+        for n in tamanhos:
+            # Memória medida numa passagem com tracemalloc; tempos numa segunda passagem sem o custo do rastreio.
+            tracemalloc.start()
+            subs, txs = synthetic_dataset(n)
+            raw_mem = tracemalloc.get_traced_memory()[0]
+            sub_recs, tx_recs = main.normalize_subscriptions(subs), main.normalize_transactions(txs)
+            del subs, txs
+            rec_mem = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop(); del sub_recs, tx_recs
+
+            subs, txs = synthetic_dataset(n)
+            t_norm, (sub_recs, tx_recs) = _cronometrar(lambda: (main.normalize_subscriptions(subs), main.normalize_transactions(txs)))
+            t0 = time.perf_counter()
+            main.generate_detailed_csv(sub_recs, tx_recs, "2025-12-31")
+            main.generate_kpi_csvs(sub_recs, tx_recs, "2024-01-01", "2025-12-31")
+            t_rep = time.perf_counter() - t0
+            print(f"{n:>12} {raw_mem / 1e6:>11.1f} {rec_mem / 1e6:>14.1f} {t_norm:>15.2f} {t_rep:>15.2f}")
+    finally:
+        shutil.rmtree(main.OUT_DIR, ignore_errors=True); main.OUT_DIR = out_dir
+
+def _sync_all(client, store, start_date, end_date, full_resync):
+    subs = list(main.sync_endpoint(client, store, "/subscriptions", "created_at_ini", "created_at_end", main.sub_created_date, start_date, end_date, full_resync))
+    txs = list(main.sync_endpoint(client, store, "/transactions", "confirmed_at_ini", "confirmed_at_end", main.tx_confirmed_date, start_date, end_date, full_resync))
+    return subs, txs
+
+def bench_sync(n):
+    subs, txs = synthetic_dataset(n)
+    api = MockGuruAPI(subs, txs)
+    client = main.DMGClient("benchmark", base_url=api.start())
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    store = LocalStore(os.path.join(tmp, "dados.sqlite"))
+    try:
+        with redirect_stdout(io.StringIO()):
+            _sync_all(client, store, "2024-01-01", "2025-12-30", True)
+            api.requests.clear()
+            t_inc, (inc_subs, inc_txs) = _cronometrar(_sync_all, client, store, "2024-01-01", "2025-12-31", False)
+            inc_requests = dict(api.requests); api.requests.clear()
+            t_full, (full_subs, full_txs) = _cronometrar(_sync_all, client, store, "2024-01-01", "2025-12-31", True)
+            full_requests = dict(api.requests)
+        same = [s["id"] for s in inc_subs] == [s["id"] for s in full_subs] and [t["id"] for t in inc_txs] == [t["id"] for t in full_txs]
+        print(f"{'modo':<14} {'/subscriptions':>15} {'/transactions':>14} {'tempo (s)':>10}")
+        print(f"{'completo':<14} {full_requests.get('/subscriptions', 0):>15} {full_requests.get('/transactions', 0):>14} {t_full:>10.2f}")
+        print(f"{'incremental':<14} {inc_requests.get('/subscriptions', 0):>15} {inc_requests.get('/transactions', 0):>14} {t_inc:>10.2f}")
+        print(f"Mesmos itens nos dois modos: {'sim' if same else 'NÃO'} ({len(full_subs)} assinaturas, {len(full_txs)} transações)")
+    finally:
+        store.close(); api.stop(); shutil.rmtree(tmp, ignore_errors=True)
+
+def bench_fetch(n, latency, workers_list, throttle_every):
+    subs, txs = synthetic_dataset(n)
+    print(f"{n} assinaturas, {len(txs)} transações, latência simulada de {latency * 1000:.0f} ms por página")
+    print(f"{'workers':>8} {'pedidos':>8} {'429':>5} {'tempo (s)':>10} {'itens':>8}")
+    expected = None
+    for workers in workers_list:
+        api = MockGuruAPI(subs, txs, latency=latency, throttle_every=throttle_every)
+        client = main.DMGClient("benchmark", base_url=api.start(), limiter=main.RateLimiter(rate=0))
+        tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+        store = LocalStore(os.path.join(tmp, "dados.sqlite"))
+        try:
+            with redirect_stdout(io.StringIO()):
+                t, (s_items, t_items) = _cronometrar(main.sync_endpoints, client, store,
+                                                     [main.SUBSCRIPTIONS_ENDPOINT + ("2024-01-01",), main.TRANSACTIONS_ENDPOINT + ("2024-01-01",)],
+                                                     "2025-12-31", True, None, workers)
+                s_items, t_items = list(s_items), list(t_items)
+            ids = ([s["id"] for s in s_items], [t["id"] for t in t_items])
+            expected = expected or ids
+            print(f"{workers:>8} {api.total_requests():>8} {api.throttled:>5} {t:>10.2f} {len(s_items) + len(t_items):>8}{'' if ids == expected else '  (itens diferentes!)'}")
+        finally:
+            store.close(); api.stop(); shutil.rmtree(tmp, ignore_errors=True)
+
+def bench_chunks(n, latency, workers):
+    # Metade das assinaturas criadas num único mês de promoção: essa janela de 180 dias vira uma longa cadeia de páginas.
+    subs, txs = synthetic_dataset(n, hotspot=("2025-03-01", 31, 0.5))
+    print(f"{n} assinaturas (50% em mar/2025), {len(txs)} transações, {workers} workers, latência de {latency * 1000:.0f} ms")
+    print(f"{'modo':<12} {'pedidos':>8} {'janelas':>8} {'caminho crítico':>16} {'tempo (s)':>10}")
+    expected = None
+    for adaptive in (False, True):
+        api = MockGuruAPI(subs, txs, latency=latency)
+        client = main.DMGClient("benchmark", base_url=api.start(), limiter=main.RateLimiter(rate=0))
+        tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+        store, stats = LocalStore(os.path.join(tmp, "dados.sqlite")), {}
+        try:
+            with redirect_stdout(io.StringIO()):
+                t, (s_items, t_items) = _cronometrar(main.sync_endpoints, client, store,
+                                                     [main.SUBSCRIPTIONS_ENDPOINT + ("2024-01-01",), main.TRANSACTIONS_ENDPOINT + ("2024-01-01",)],
+                                                     "2025-12-31", True, None, workers, adaptive, stats)
+                s_items, t_items = list(s_items), list(t_items)
+            ids = (sorted(s["id"] for s in s_items), sorted(t["id"] for t in t_items))
+            expected = expected or ids
+            print(f"{'adaptativo' if adaptive else 'fixo 180d':<12} {api.total_requests():>8} {stats['windows']:>8} {stats['critical_path_pages']:>16} {t:>10.2f}{'' if ids == expected else '  (itens diferentes!)'}")
+        finally:
+            store.close(); api.stop(); shutil.rmtree(tmp, ignore_errors=True)
+
+def _read_outputs(out_dir):
+    names = ("assinaturas.csv", "monthly_kpis.csv", "weekly_kpis.csv")
+    return [open(os.path.join(out_dir, name), "rb").read() for name in names]
+
+def _reports_from_lists(store):
+    subs = main.normalize_subscriptions(list(store.items("/subscriptions")))
+    txs = main.normalize_transactions(list(store.items("/transactions")))
+    main.generate_detailed_csv(subs, txs, "2025-12-31")
+    main.generate_kpi_csvs(subs, txs, "2024-01-01", "2025-12-31")
+
+def _reports_streaming(store):
+    subs, tx_index, index = main.build_report_state(store.items("/subscriptions"), store.items("/transactions"))
+    main.write_detailed_csv(subs, tx_index, "2025-12-31")
+    main.write_kpi_csvs(index, "2024-01-01", "2025-12-31")
+
+def bench_stream(tamanhos):
+    # Verificação de memória: o pico do modo streaming tem de ficar perto do tamanho dos registos compactos,
+    # e não do tamanho dos dicts da API; os três CSVs têm de sair iguais byte a byte nos dois modos.
+    print(f"{'assinaturas':>12} {'dicts (MB)':>11} {'registos (MB)':>14} {'pico listas (MB)':>17} {'pico streaming (MB)':>20} {'CSVs iguais':>12}")
+    import numpy  # importado antes do tracemalloc, para o TxIndex não contar a memória do próprio módulo
+    out_dir, tmp = main.OUT_DIR, tempfile.mkdtemp(prefix="kpis-bench-")
+    try:
+        for n in tamanhos:
+            store = LocalStore(os.path.join(tmp, f"dados-{n}.sqlite"))
+            subs, txs = synthetic_dataset(n)
+            store.upsert("/subscriptions", subs, main.sub_created_date); store.upsert("/transactions", txs, main.tx_confirmed_date)
+            tracemalloc.start()
+            subs, txs = list(store.items("/subscriptions")), list(store.items("/transactions"))
+            raw_mem = tracemalloc.get_traced_memory()[0]
+            records = main.build_report_state(iter(subs), iter(txs))
+            del subs, txs
+            rec_mem = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop(); del records
+
+            peaks, outputs = [], []
+            for mode in (_reports_from_lists, _reports_streaming):
+                main.OUT_DIR = os.path.join(tmp, mode.__name__); os.makedirs(main.OUT_DIR, exist_ok=True)
+                tracemalloc.start()
+                with redirect_stdout(io.StringIO()): mode(store)
+                peaks.append(tracemalloc.get_traced_memory()[1]); tracemalloc.stop()
+                outputs.append(_read_outputs(main.OUT_DIR))
+            store.close()
+            print(f"{n:>12} {raw_mem / 1e6:>11.1f} {rec_mem / 1e6:>14.1f} {peaks[0] / 1e6:>17.1f} {peaks[1] / 1e6:>20.1f} {'sim' if outputs[0] == outputs[1] else 'NÃO':>12}")
+            assert outputs[0] == outputs[1], "o modo streaming gerou CSVs diferentes"
+            assert peaks[1] < rec_mem * 1.5, "o pico do modo streaming passou dos registos compactos"
+    finally:
+        main.OUT_DIR = out_dir; shutil.rmtree(tmp, ignore_errors=True)
+
+# Mede no node o parse do payload antigo (registos com datas ISO) e do novo (agregados por dia), e uma consulta de
+# um ano: o filtro + laços por assinatura do updateDashboard antigo contra o cohortStats do script.js gerado.
+NODE_PARSE = r"""
+const fs = require('fs');
+const [scriptJs, oldJson, newJson] = process.argv.slice(1);
+global.document = { addEventListener() {} }; global.window = {};
+eval(fs.readFileSync(scriptJs, 'utf8') + ';global.buildCohortIndex = buildCohortIndex; global.cohortStats = cohortStats;');
+function time(fn) { const t0 = process.hrtime.bigint(); const r = fn(); return [Number(process.hrtime.bigint() - t0) / 1e6, r]; }
+function oldQuery(data, startDate, endDate, now) {
+    const cohort = data.filter(d => d.data_assinatura >= startDate && d.data_assinatura <= endDate);
+    const lifetime = s => Math.floor((((s.data_cancelamento || now) - s.data_assinatura) / 864e5) / 30.44);
+    const maxMonths = Math.max(...cohort.map(lifetime)) + 1;
+    const retention = Array(maxMonths).fill(0), mrr = Array(maxMonths).fill(0);
+    cohort.forEach(s => { for (let i = 0; i <= lifetime(s) && i < maxMonths; i++) retention[i]++; });
+    cohort.forEach(s => { const e = s.data_cancelamento ? lifetime(s) : maxMonths - 1; for (let i = 0; i <= e && i < maxMonths; i++) mrr[i] += s.ticket_oferta; });
+    return [cohort.length, retention];
+}
+const [tOldParse, data] = time(() => JSON.parse(fs.readFileSync(oldJson, 'utf8')).map(d => ({...d, ativo: String(d.ativo).trim().toUpperCase() === 'TRUE',
+    data_assinatura: new Date(d.data_assinatura), data_cancelamento: d.data_cancelamento ? new Date(d.data_cancelamento) : null})));
+const [tNewParse, idx] = time(() => buildCohortIndex(JSON.parse(fs.readFileSync(newJson, 'utf8'))));
+const now = new Date(), start = new Date(2025, 0, 1), end = new Date(2025, 11, 31, 23, 59, 59, 999);
+const [tOldQuery, [size, retention]] = time(() => oldQuery(data, start, end, now));
+const [tNewQuery, stats] = time(() => cohortStats(idx, start, end, now));
+if (stats.cohortSize !== size || stats.retentionPercentage.some((v, i) => Math.abs(v - retention[i] / size * 100) > 1e-9)) throw new Error('coorte diferente');
+console.log([tOldParse, tNewParse, tOldQuery, tNewQuery].map(v => v.toFixed(1)).join(' '));
+"""
+
+def _node_parse_ms(script_js, old_json, new_json):
+    if not shutil.which("node"): return None
+    out = subprocess.run(["node", "-e", NODE_PARSE, script_js, old_json, new_json], capture_output=True, text=True, check=True).stdout
+    return tuple(float(v) for v in out.split())
+
+def bench_dashboard(tamanhos):
+    import json
+    import pandas as pd
+    import gerar_dashboard
+    print(f"{'linhas':>8} {'registos (KB)':>14} {'agregados (KB)':>15} {'gzip (KB)':>10} {'parse py reg/agr (ms)':>22} {'parse node reg/agr (ms)':>24} {'consulta 1 ano (ms)':>20}")
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    out_dir, dash_dir, csv_path = main.OUT_DIR, gerar_dashboard.DASHBOARD_DIR, gerar_dashboard.ASSINATURAS_CSV
+    try:
+        main.OUT_DIR = gerar_dashboard.DASHBOARD_DIR = tmp
+        gerar_dashboard.ASSINATURAS_CSV = os.path.join(tmp, "assinaturas.csv")
+        for n in tamanhos:
+            subs, txs = synthetic_dataset(n)
+            with redirect_stdout(io.StringIO()):
+                main.generate_detailed_csv(main.normalize_subscriptions(subs), main.normalize_transactions(txs), "2025-12-31")
+                payload = gerar_dashboard.process_data_for_dashboard()
+                gerar_dashboard.write_dashboard_files(payload)
+            df = pd.read_csv(gerar_dashboard.ASSINATURAS_CSV, dtype={'ativo': str})
+            df['data_assinatura'] = pd.to_datetime(df['data_assinatura'])
+            df['data_cancelamento'] = pd.to_datetime(df['data_cancelamento'], errors='coerce')
+            old_path, new_path = os.path.join(tmp, "registos.json"), os.path.join(tmp, gerar_dashboard.DADOS_JSON)
+            with open(old_path, "w", encoding="utf-8") as f: f.write(df.to_json(orient='records', date_format='iso'))
+            old_text, new_text = open(old_path, encoding="utf-8").read(), open(new_path, encoding="utf-8").read()
+            t_old, _ = _cronometrar(json.loads, old_text)
+            t_new, _ = _cronometrar(json.loads, new_text)
+            node = _node_parse_ms(os.path.join(tmp, "script.js"), old_path, new_path)
+            parse = f"{node[0]:.0f} / {node[1]:.0f}" if node else "(sem node)"
+            query = f"{node[2]:.1f} / {node[3]:.2f}" if node else "(sem node)"
+            print(f"{len(df):>8} {len(old_text.encode()) / 1024:>14.0f} {len(new_text.encode()) / 1024:>15.0f} {os.path.getsize(new_path + '.gz') / 1024:>10.0f} "
+                  f"{f'{t_old * 1000:.0f} / {t_new * 1000:.0f}':>22} {parse:>24} {query:>20}")
+    finally:
+        main.OUT_DIR, gerar_dashboard.DASHBOARD_DIR, gerar_dashboard.ASSINATURAS_CSV = out_dir, dash_dir, csv_path
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def synthetic_assinaturas_frame(n, start_date="2020-01-01", end_date="2025-12-31", seed=42):
+    """Tabela no formato do assinaturas.csv (só as colunas das coortes), gerada direto em NumPy para chegar a 1M linhas."""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    signup = start + pd.to_timedelta(rng.integers(0, (end - start).days + 1, n), unit="D")
+    cancel = signup + pd.to_timedelta(rng.integers(1, 900, n), unit="D")
+    cancel = pd.Series(cancel).where((rng.random(n) < 0.4) & (cancel <= end))
+    return pd.DataFrame({"data_assinatura": signup, "data_cancelamento": cancel, "ticket_oferta": rng.uniform(90, 300, n).round(2)})
+
+# Fixture verificada à mão (data de fim 2025-03-15): meses ativos A=2, B=1, C=0, D=1, E=1, F=0.
+COORTES_FIXTURE = [("2025-01-05", None, 100.0), ("2025-01-20", "2025-02-10", 200.0), ("2025-01-31", "2025-01-31", 50.0),
+                   ("2025-02-01", None, 150.0), ("2025-02-28", "2025-03-01", 90.0), ("2025-03-15", None, 120.0)]
+COORTES_RETENCAO = [[1.0, 2 / 3, 1 / 3], [1.0, 1.0, None], [1.0, None, None]]
+COORTES_LTV = [("2025-01", 3, 350 / 3, 1.0), ("2025-02", 2, 120.0, 1.0), ("2025-03", 1, 120.0, 0.0)]
+
+def _check_coortes_fixture():
+    import math
+    import pandas as pd
+    import coortes
+    df = pd.DataFrame(COORTES_FIXTURE, columns=["data_assinatura", "data_cancelamento", "ticket_oferta"])
+    df["data_assinatura"], df["data_cancelamento"] = pd.to_datetime(df["data_assinatura"]), pd.to_datetime(df["data_cancelamento"])
+    matriz, ltv = coortes.retention_matrix(df, "2025-03-15"), coortes.ltv_by_cohort(df, "2025-03-15")
+    assert list(matriz["mes_coorte"]) == ["2025-01", "2025-02", "2025-03"]
+    for row, expected in zip(matriz.drop(columns="mes_coorte").itertuples(index=False), COORTES_RETENCAO):
+        assert all((e is None and math.isnan(v)) or math.isclose(v, e) for v, e in zip(row, expected)), (row, expected)
+    for row, (mes, n, ticket, meses) in zip(ltv.itertuples(index=False), COORTES_LTV):
+        assert (row.mes_coorte, row.clientes_na_coorte) == (mes, n)
+        assert math.isclose(row.ticket_medio_coorte, ticket) and math.isclose(row.meses_ativos_media, meses)
+        assert math.isclose(row.ltv_estimado, ticket * meses)
+
+def _retention_por_linha(df, end_date):
+    # Referência ingénua (um laço Python por assinatura e por mês) para validar a versão vetorizada.
+    import coortes
+    inicio, meses, horizonte, _ = coortes.cohort_months(df, end_date)
+    tamanho, retidas = {}, {}
+    for c, m in zip(inicio.tolist(), meses.tolist()):
+        tamanho[c] = tamanho.get(c, 0) + 1
+        for k in range(m + 1): retidas[c, k] = retidas.get((c, k), 0) + 1
+    return tamanho, retidas
+
+def bench_coortes(tamanhos, referencia_max=100_000):
+    import math
+    import coortes
+    _check_coortes_fixture()
+    print("Fixture verificada à mão: OK")
+    print(f"{'assinaturas':>12} {'coortes':>8} {'matriz (s)':>11} {'LTV (s)':>9} {'laço Python (s)':>16}")
+    for n in tamanhos:
+        df = synthetic_assinaturas_frame(n)
+        t_matriz, matriz = _cronometrar(coortes.retention_matrix, df, "2025-12-31")
+        t_ltv, _ = _cronometrar(coortes.ltv_by_cohort, df, "2025-12-31")
+        t_ref = "-"
+        if n <= referencia_max:
+            t, (tamanho, retidas) = _cronometrar(_retention_por_linha, df, "2025-12-31")
+            for row in matriz.itertuples(index=False):
+                c = int(row.mes_coorte[:4]) * 12 + int(row.mes_coorte[5:]) - 1
+                for k, v in enumerate(row[1:]):
+                    if not math.isnan(v): assert math.isclose(v, retidas.get((c, k), 0) / tamanho[c]), (row.mes_coorte, k)
+            t_ref = f"{t:.2f}"
+        print(f"{n:>12} {len(matriz):>8} {t_matriz:>11.3f} {t_ltv:>9.3f} {t_ref:>16}")
+
+def bench_cache(n):
+    from cache_http import ResponseCache
+    subs, txs = synthetic_dataset(n)
+    api = MockGuruAPI(subs, txs, etags=True)
+    client_url = api.start()
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    cache_path = os.path.join(tmp, "cache.sqlite")
+    endpoints = [main.SUBSCRIPTIONS_ENDPOINT + ("2024-01-01",), main.TRANSACTIONS_ENDPOINT + ("2024-01-01",)]
+    print(f"{n} assinaturas, {len(txs)} transações")
+    print(f"{'execução':<28} {'pedidos':>8} {'304':>5} {'hits':>6} {'misses':>7} {'tempo (s)':>10}")
+    expected = None
+    # Frio com TTL normal, quente (tudo válido), frio com TTL 0 e depois revalidação por ETag (tudo expirado).
+    runs = [("sem cache", None), ("cache frio", {}), ("cache quente", {}),
+            ("cache frio, TTL 0", {"ttl_historical": 0, "ttl_recent": 0, "fresh": True}), ("expirado, revalida ETag", {"ttl_historical": 0, "ttl_recent": 0})]
+    try:
+        for label, opts in runs:
+            if opts is not None and opts.pop("fresh", False) and os.path.exists(cache_path): os.remove(cache_path)
+            cache = ResponseCache(cache_path, **opts) if opts is not None else None
+            client = main.DMGClient("benchmark", base_url=client_url, limiter=main.RateLimiter(rate=0), cache=cache)
+            store = LocalStore(os.path.join(tmp, "dados.sqlite"))
+            api.requests.clear(); api.not_modified = 0
+            with redirect_stdout(io.StringIO()):
+                t, (s_items, t_items) = _cronometrar(main.sync_endpoints, client, store, endpoints, "2025-12-31", True, None, 1)
+                ids = ([s["id"] for s in s_items], [t["id"] for t in t_items])
+            store.close()
+            expected = expected or ids
+            hits, misses = (cache.hits, cache.misses) if cache else ("-", "-")
+            print(f"{label:<28} {api.total_requests():>8} {api.not_modified:>5} {hits:>6} {misses:>7} {t:>10.2f}{'' if ids == expected else '  (itens diferentes!)'}")
+            if cache: cache.close()
+    finally:
+        api.stop(); shutil.rmtree(tmp, ignore_errors=True)
+
+def synthetic_tx_records(n_txs, n_subs, seed=42):
+    # TxRecords direto (sem passar pelos dicts da API), com empates de data e transações sem confirmed_at.
+    rnd = random.Random(seed)
+    base = datetime(2024, 1, 1).timestamp()
+    return [main.TxRecord(f"tx_{i}", f"sub_{rnd.randrange(n_subs):09d}", None if rnd.random() < 0.02 else base + rnd.randrange(0, 730) * 86400.0,
+                          round(rnd.uniform(90, 300), 2)) for i in range(n_txs)]
+
+def _latest_ticket_por_sort(txs):
+    # Como o generate_detailed_csv fazia: lista por assinatura e um sort por assinatura.
+    by_sub, out = {}, {}
+    for tx in txs:
+        if tx.sub_id: by_sub.setdefault(tx.sub_id, []).append(tx)
+    for sid, sub_txs in by_sub.items():
+        valid = sorted([tx for tx in sub_txs if tx.confirmed_ts is not None], key=lambda tx: tx.confirmed_ts)
+        out[sid] = (len(sub_txs), valid[-1].confirmed_ts if valid else None, valid[-1].net_amount if valid else None)
+    return out
+
+def bench_join(tamanhos):
+    print(f"{'transações':>11} {'assinaturas':>12} {'sort por assinatura (s)':>24} {'TxIndex (s)':>12} {'iguais':>7}")
+    for n in tamanhos:
+        n_subs = max(1, n // 2)
+        txs = synthetic_tx_records(n, n_subs)
+        t_old, old = _cronometrar(_latest_ticket_por_sort, txs)
+        t_new, index = _cronometrar(main.TxIndex, txs)
+        same = all((c, ts, amount if ts is not None else None) == old[sid]
+                   for sid in old for c, _, ts, amount in [index.get(sid)])
+        print(f"{n:>11} {len(index.codes):>12} {t_old:>24.2f} {t_new:>12.2f} {'sim' if same else 'NÃO':>7}")
+
+# Implementação anterior do main.py (strptime + pytz a cada chamada), mantida aqui como referência.
+def _from_iso_any_antigo(s):
+    import pytz
+    if s in (None, "", 0): return None
+    tz = pytz.timezone(main.DMG_TZ)
+    if isinstance(s, (int, float)):
+        ts = float(s); ts = ts/1000.0 if ts > 1e12 else ts
+        return datetime.fromtimestamp(ts, tz)
+    if isinstance(s, str):
+        s2 = s.strip()
+        if not s2: return None
+        if s2.replace(".", "", 1).isdigit():
+            ts = float(s2); ts = ts/1000.0 if ts > 1e12 else ts
+            return datetime.fromtimestamp(ts, tz)
+        s2 = s2.replace("T", " ").replace("Z", "")
+        if "." in s2: s2 = s2.split(".")[0]
+        base = s2[:19] if len(s2) >= 19 else s2[:10]
+        fmt  = "%Y-%m-%d %H:%M:%S" if len(base) > 10 else "%Y-%m-%d"
+        try: return tz.localize(datetime.strptime(base, fmt))
+        except: return None
+    return None
+
+def _epoch_antigo(s):
+    dt = _from_iso_any_antigo(s)
+    return dt.timestamp() if dt else None
+
+def _datas_casos(n, seed=7):
+    """Valores no formato da API: ISO com T/Z/fração, "AAAA-MM-DD HH:MM:SS", datas, epoch (s/ms) e lixo."""
+    import pytz
+    rnd = random.Random(seed)
+    casos = [None, "", " ", 0, "0", "abc", "2025-02-30", "2025-02-30 10:00:00", "2025-1-5", "2025-01-05 7:05:03", "2025-01-05 24:00:00",
+             "2025-01", "2025-01-05 10:00", "2025-01-05T10:00:00-03:00", "  2025-01-05 10:00:00  ", {"x": 1}, 1.5, True,
+             "9999-12-31", "9999-12-31 12:00:00", "9999-12-31 23:59:59", "9999-12-31T23:59:59Z", "0001-01-01 00:00:00"]
+    # Todas as transições de America/Sao_Paulo (horário de verão até 2019), minuto a minuto numa janela de 3 horas.
+    tz = pytz.timezone(main.DMG_TZ)
+    for utc, (offset, _, _) in zip(tz._utc_transition_times[1:], tz._transition_info[1:]):
+        local = utc + offset
+        for minute in range(-90, 91, 7):
+            casos.append((local + timedelta(minutes=minute)).strftime("%Y-%m-%d %H:%M:%S"))
+        casos.append(local.strftime("%Y-%m-%d")); casos.append((local - timedelta(days=1)).strftime("%Y-%m-%d"))
+    for _ in range(n):
+        dt = datetime(1990, 1, 1) + timedelta(seconds=rnd.randrange(45 * 365 * 86400))
+        forma = rnd.randrange(7)
+        if forma == 0: casos.append(dt.strftime("%Y-%m-%d %H:%M:%S"))
+        elif forma == 1: casos.append(dt.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        elif forma == 2: casos.append(dt.strftime("%Y-%m-%dT%H:%M:%S") + f".{rnd.randrange(1000):03d}Z")
+        elif forma == 3: casos.append(dt.strftime("%Y-%m-%d"))
+        elif forma == 4: casos.append(rnd.randrange(10**9, 2 * 10**9))
+        elif forma == 5: casos.append(str(rnd.randrange(10**12, 2 * 10**12)))
+        else: casos.append(rnd.randrange(10**12, 2 * 10**12) / 1.0)
+    return casos
+
+def bench_datas(n):
+    import datas
+    casos = _datas_casos(n)
+    # Propriedade: epoch e data local iguais aos da implementação antiga em todos os casos.
+    diferentes = [c for c in casos if datas.parse_epoch(c) != _epoch_antigo(c) or
+                  (main.fmt_date(datas.parse_datetime(c)) != main.fmt_date(_from_iso_any_antigo(c)))]
+    assert datas.parse_epochs(casos) == [_epoch_antigo(c) for c in casos]
+    print(f"{len(casos)} valores comparados com a implementação antiga: {len(diferentes)} diferenças")
+    assert not diferentes, diferentes[:10]
+
+    # Microbenchmark: valores únicos (memo frio), coluna com repetições (datas sem hora) e a mesma coluna em lote.
+    unicos = [datetime(2024, 1, 1) + timedelta(seconds=random.Random(1).randrange(10**8) + i) for i in range(n)]
+    unicos = [dt.strftime("%Y-%m-%d %H:%M:%S") for dt in unicos]
+    repetidos = [s[:10] for s in unicos]
+    print(f"{'caso':<28} {'antigo (µs/valor)':>18} {'novo (µs/valor)':>16}")
+    for label, col, fn in [("únicos, memo frio", unicos, None), ("datas repetidas", repetidos, None), ("datas repetidas, em lote", repetidos, datas.parse_epochs)]:
+        datas._parse_str.cache_clear()
+        t_old, _ = _cronometrar(lambda: [_epoch_antigo(v) for v in col])
+        t_new, _ = _cronometrar(fn or (lambda c: [datas.parse_epoch(v) for v in c]), col)
+        print(f"{label:<28} {t_old / len(col) * 1e6:>18.2f} {t_new / len(col) * 1e6:>16.2f}")
+
+def _run_pipeline_mock(api, tmp, perfil):
+    """Corre fetch_and_generate_reports contra o mock, com as saídas em tmp; devolve (segundos, métricas)."""
+    import metricas
+    cwd = os.getcwd(); os.chdir(tmp)  # out/perfis e out/run_metrics.json ficam relativos ao diretório atual
+    main.METRICAS = metricas.Metricas(perfil=perfil)
+    config = {"BASE_URL": api.start(), "OUT_DIR": os.path.join(tmp, "out"), "STORE_PATH": os.path.join(tmp, "out", "dados.sqlite"),
+              "END_DATE": "2025-12-31", "SUBS_CREATED_AT_INI": "2024-01-01", "MIN_DATE_ALL": "2024-01-01"}
+    anterior = {k: getattr(main, k) for k in config}
+    try:
+        for k, v in config.items(): setattr(main, k, v)
+        os.makedirs(config["OUT_DIR"], exist_ok=True)
+        with redirect_stdout(io.StringIO()):
+            t, _ = _cronometrar(main.fetch_and_generate_reports, True, 4)
+        return t, metricas.carregar(main.METRICAS.salvar("main.py"))["scripts"]["main.py"]
+    finally:
+        for k, v in anterior.items(): setattr(main, k, v)
+        main.METRICAS = metricas.METRICAS
+        api.stop(); os.chdir(cwd)
+
+def bench_metricas(n, throttle_every):
+    subs, txs = synthetic_dataset(n)
+    print(f"{n} assinaturas, {len(txs)} transações: pipeline completo de main.py contra o mock local")
+    tempos = {}
+    for perfil in (False, True):
+        api = MockGuruAPI(subs, txs, throttle_every=throttle_every, retry_after=0)
+        tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+        try:
+            tempos[perfil], m = _run_pipeline_mock(api, tmp, perfil)
+            paginas = sum(v for k, v in m["contadores"].items() if k.endswith(":paginas"))
+            assert paginas == api.total_requests() == sum(j.get("paginas", 0) for j in m["janelas"])
+            assert sum(v for k, v in m["contadores"].items() if k.endswith(":pausas_429")) == api.throttled
+            perfis = [e["perfil"] for e in m["etapas"] if "perfil" in e]
+            assert len(perfis) == (len(m["etapas"]) if perfil else 0) and all(os.path.exists(os.path.join(tmp, p)) for p in perfis)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        if not perfil:
+            print(f"{'etapa':<24} {'parede (s)':>11} {'CPU (s)':>9} {'pico RSS (MB)':>14}")
+            for e in m["etapas"]:
+                print(f"{e['etapa']:<24} {e['segundos']:>11.3f} {e['cpu_segundos']:>9.3f} {e['pico_rss_mb'] or 0:>14.1f}")
+            print(f"{paginas} páginas ({api.throttled} pausas por 429) em {len(m['janelas'])} janelas, "
+                  f"{sum(v for k, v in m['contadores'].items() if k.endswith(':bytes')) / 1024 / 1024:.1f} MB recebidos")
+    print(f"Tempo total: {tempos[False]:.2f}s sem perfil, {tempos[True]:.2f}s com --profile")
+
+def bench_orquestracao(n):
+    # As duas formas de correr o executar_tudo.py, cada uma num diretório vazio e contra o mesmo mock (sem limite de
+    # pedidos, para medir a orquestração e não a busca). Os ficheiros gerados têm de ser iguais nos dois modos.
+    import filecmp
+    import metricas
+    hoje = datetime.now()
+    subs, txs = synthetic_dataset(n, start_date=hoje.strftime("%Y-01-01"), end_date=hoje.strftime("%Y-%m-%d"))
+    print(f"{n} assinaturas, {len(txs)} transações: executar_tudo.py completo contra o mock local")
+    print(f"{'modo':<14} {'tempo (s)':>10} {'sem a busca (s)':>20} {'pico RSS (MB)':>14}")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "executar_tudo.py")
+    saidas = []
+    for modo, extra in (("subprocessos", ["--subprocessos"]), ("em_processo", [])):
+        api = MockGuruAPI(subs, txs)
+        tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+        env = dict(os.environ, DMG_BASE_URL=api.start(), DMG_USER_TOKEN="benchmark", RATE_LIMIT_RPS="0", END_DATE=hoje.strftime("%Y-%m-%d"))
+        try:
+            t, r = _cronometrar(lambda: subprocess.run([sys.executable, script] + extra, cwd=tmp, env=env, capture_output=True, text=True))
+            execucao = metricas.carregar(os.path.join(tmp, "out", "run_metrics.json")).get("execucao", {})
+            if r.returncode or not execucao.get("sucesso"):
+                print(r.stdout[-2000:], r.stderr[-2000:]); raise SystemExit(f"executar_tudo.py falhou no modo {modo}")
+            secoes = metricas.carregar(os.path.join(tmp, "out", "run_metrics.json"))["scripts"].values()
+            sinc = sum(e["segundos"] for m in secoes for e in m["etapas"] if e["etapa"] == "sincronizacao")
+            print(f"{modo:<14} {t:>10.2f} {t - sinc:>20.2f} {max(execucao['pico_rss_mb'] or 0, execucao['pico_rss_filhos_mb'] or 0):>14.1f}")
+            saidas.append(tmp)
+        finally:
+            api.stop()
+    ficheiros = [os.path.join("out", f) for f in ("assinaturas.csv", "monthly_kpis.csv", "weekly_kpis.csv", "daily_kpis.csv", "product_kpis.csv", "matriz_retencao.csv", "ltv_por_coorte.csv")] + [os.path.join("docs", "dados.json")]
+    iguais = all(filecmp.cmp(os.path.join(saidas[0], f), os.path.join(saidas[1], f), shallow=False) for f in ficheiros)
+    print(f"Ficheiros gerados iguais nos dois modos: {'sim' if iguais else 'NÃO'}")
+    for tmp in saidas: shutil.rmtree(tmp, ignore_errors=True)
+
+def _paginas_no_checkpoint(path, query="SELECT COUNT(*) FROM pages"):
+    import sqlite3
+    try:
+        conn = sqlite3.connect(path)
+        try: return conn.execute(query).fetchone()[0]
+        finally: conn.close()
+    except sqlite3.Error:  # ainda não criado pelo main.py
+        return 0
+
+def bench_retomada(n, latencia, cortes, fracao):
+    # main.py contra o mock com ligações cortadas a meio do corpo: (1) uma execução sem interrupções; (2) uma execução
+    # morta com SIGKILL quando o checkpoint já tem `fracao` das páginas, seguida de outra que a retoma. Os CSVs da
+    # execução retomada têm de ser iguais aos da execução sem interrupções, e a retoma não pode repetir as páginas gravadas.
+    # (3) uma morte com pelo menos uma janela completa antes da última, retomada no dia seguinte (END_DATE + 1): as
+    # janelas completas que não mudam com a nova data continuam a servir.
+    import filecmp
+    import metricas
+    hoje = datetime.now()
+    subs, txs = synthetic_dataset(n, start_date=hoje.strftime("%Y-01-01"), end_date=hoje.strftime("%Y-%m-%d"))
+    api = MockGuruAPI(subs, txs, latency=latencia, drop_rate=cortes)
+    env = dict(os.environ, DMG_BASE_URL=api.start(), DMG_USER_TOKEN="benchmark", RATE_LIMIT_RPS="0", END_DATE=hoje.strftime("%Y-%m-%d"),
+               NETWORK_BACKOFF_BASE="0.05", NETWORK_BACKOFF_MAX="1")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    print(f"{n} assinaturas, {len(txs)} transações, latência {latencia * 1000:.0f} ms, {cortes:.1%} das respostas cortadas a meio")
+    print(f"{'execução':<26} {'tempo (s)':>10} {'pedidos':>8} {'cortes':>7} {'páginas retomadas':>18}")
+    saidas = []
+
+    def correr(tmp, nome, matar_em=None, janelas_completas=0, **extra_env):
+        pedidos, cortadas = api.total_requests(), api.dropped
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, script], cwd=tmp, env=dict(env, **extra_env), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if matar_em is not None:
+            checkpoint = os.path.join(tmp, "out", "busca_checkpoint.sqlite")
+            while proc.poll() is None and (_paginas_no_checkpoint(checkpoint) < matar_em or
+                                           _paginas_no_checkpoint(checkpoint, "SELECT COUNT(*) FROM windows w JOIN runs r USING (endpoint) WHERE w.status = 'done' AND w.window_end < r.end_date") < janelas_completas): time.sleep(0.05)
+            proc.kill()
+        saida, _ = proc.communicate()
+        t = time.perf_counter() - t0
+        if matar_em is None and proc.returncode:
+            print(saida[-3000:]); raise SystemExit(f"main.py falhou ({nome})")
+        m = metricas.carregar(os.path.join(tmp, "out", "run_metrics.json")).get("scripts", {}).get("main.py", {}) if matar_em is None else {}
+        retomadas = sum(v for k, v in m.get("contadores", {}).items() if k.endswith(":paginas_retomadas"))
+        print(f"{nome:<26} {t:>10.2f} {api.total_requests() - pedidos:>8} {api.dropped - cortadas:>7} {retomadas if matar_em is None else '-':>18}")
+        return api.total_requests() - pedidos, m
+
+    try:
+        for _ in range(3): saidas.append(tempfile.mkdtemp(prefix="kpis-bench-"))
+        completos, _ = correr(saidas[0], "sem interrupção")
+        correr(saidas[1], f"morta a {fracao:.0%} das páginas", matar_em=max(1, int(completos * fracao)))
+        retoma, m = correr(saidas[1], "retomada do checkpoint")
+        correr(saidas[2], "morta com 1 janela completa", matar_em=max(1, int(completos * fracao)), janelas_completas=1)
+        amanha, _ = correr(saidas[2], "retomada no dia seguinte", END_DATE=(hoje + timedelta(days=1)).strftime("%Y-%m-%d"))
+        ficheiros = ("assinaturas.csv", "monthly_kpis.csv", "weekly_kpis.csv", "daily_kpis.csv", "product_kpis.csv", "matriz_retencao.csv", "ltv_por_coorte.csv")
+        iguais = all(filecmp.cmp(os.path.join(saidas[0], "out", f), os.path.join(saidas[1], "out", f), shallow=False) for f in ficheiros)
+        print(f"\nCSVs da execução retomada iguais aos da execução sem interrupção: {'sim' if iguais else 'NÃO'}")
+        print(f"Pedidos da retoma: {retoma} de {completos} ({retoma / completos:.0%}); "
+              f"retentativas de rede: {sum(v for k, v in m['contadores'].items() if k.endswith(':retentativas_rede'))}")
+        print(f"Pedidos da retoma no dia seguinte: {amanha} de {completos} ({amanha / completos:.0%})")
+    finally:
+        api.stop()
+        for tmp in saidas: shutil.rmtree(tmp, ignore_errors=True)
+
+def _tamanho(path):
+    if os.path.isfile(path): return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+
+def _alterar_dados(subs, txs, fracao, seed=7):
+    # O "dia seguinte": uma fração das assinaturas muda de status (cancelada) e chegam transações novas em dezembro.
+    rnd = random.Random(seed)
+    subs = [dict(s) for s in subs]
+    for i in rnd.sample(range(len(subs)), int(len(subs) * fracao)):
+        subs[i].update(last_status="canceled", cancelled_at="2025-12-30 12:00:00", last_status_at="2025-12-30 12:00:00")
+    novas = [{"id": f"tx_extra_{i:08d}", "subscription": {"id": subs[rnd.randrange(len(subs))]["id"]},
+              "dates": {"confirmed_at": "2025-12-31 10:00:00"}, "payment": {"net": 129.9}} for i in range(int(len(txs) * fracao))]
+    return subs, txs + novas
+
+def bench_snapshot(n, fracao):
+    # main.py contra o mock num ano sintético (2025), com SNAPSHOT=1: (1) busca completa; (2) dados alterados numa
+    # fração e nova busca completa (--full-resync); (3) sincronização incremental sem mudanças, como num dia normal.
+    # Depois, --from-snapshot da 1 e da 3 (sem API nem base local) têm de dar os CSVs dessas execuções; --offline
+    # (base local) fica como referência de tempo.
+    import filecmp
+    import metricas
+    import snapshots
+    subs, txs = synthetic_dataset(n, start_date="2025-01-01", end_date="2025-12-31")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    snap_dir = os.path.join(tmp, "out", "snapshots")
+    env = dict(os.environ, DMG_USER_TOKEN="benchmark", RATE_LIMIT_RPS="0", START_DATE="2025-01-01", END_DATE="2025-12-31", SNAPSHOT="1", SNAPSHOT_DIR=snap_dir)
+    ficheiros = ("assinaturas.csv", "monthly_kpis.csv", "weekly_kpis.csv", "daily_kpis.csv", "product_kpis.csv", "matriz_retencao.csv", "ltv_por_coorte.csv")
+    print(f"{n} assinaturas, {len(txs)} transações em 2025; {fracao:.0%} alteradas na segunda execução; "
+          f"compressão {'zstd' if snapshots._zstd() else 'gzip'}")
+    print(f"{'execução':<30} {'tempo (s)':>10} {'normalização (s)':>17} {'registos novos':>15} {'arquivo (MB)':>13} {'acréscimo (MB)':>15}")
+
+    def correr(nome, args=(), api=None, guardar=None, **extra):
+        run_env, antes = dict(env, **extra), _tamanho(snap_dir) if os.path.exists(snap_dir) else 0
+        if api: run_env["DMG_BASE_URL"] = api.start()
+        try:
+            t, r = _cronometrar(lambda: subprocess.run([sys.executable, script, *args], cwd=tmp, env=run_env, capture_output=True, text=True))
+        finally:
+            if api: api.stop()
+        if r.returncode: print(r.stdout[-3000:], r.stderr[-3000:]); raise SystemExit(f"main.py falhou ({nome})")
+        etapas = {e["etapa"]: e for e in metricas.carregar(os.path.join(tmp, "out", "run_metrics.json"))["scripts"]["main.py"]["etapas"]}
+        novos = etapas["snapshot"]["novos"] if "snapshot" in etapas else "-"
+        depois = _tamanho(snap_dir)
+        print(f"{nome:<30} {t:>10.2f} {etapas['normalizacao']['segundos']:>17.2f} {novos:>15} {depois / 1024 / 1024:>13.2f} {(depois - antes) / 1024 / 1024:>15.2f}")
+        if guardar:
+            os.makedirs(os.path.join(tmp, guardar))
+            for f in ficheiros: shutil.copy(os.path.join(tmp, "out", f), os.path.join(tmp, guardar))
+        return etapas
+
+    def iguais(guardado):
+        return all(filecmp.cmp(os.path.join(tmp, guardado, f), os.path.join(tmp, "out", f), shallow=False) for f in ficheiros)
+
+    try:
+        recebidos = correr("1: busca completa", api=MockGuruAPI(subs, txs), guardar="execucao1")["snapshot"]["bytes_json"]
+        alterados = _alterar_dados(subs, txs, fracao)
+        correr("2: alterados, --full-resync", ["--full-resync"], api=MockGuruAPI(*alterados))
+        correr("3: incremental, sem mudanças", api=MockGuruAPI(*alterados), guardar="execucao3")
+        ids = snapshots.list_snapshots(snap_dir)
+        sem_rede = dict(SNAPSHOT="0", DMG_USER_TOKEN="", DMG_BASE_URL="http://127.0.0.1:9")
+        correr("--from-snapshot da 1", ["--from-snapshot", ids[0]], **sem_rede)
+        iguais_1 = iguais("execucao1")
+        correr("--from-snapshot da 3", ["--from-snapshot", ids[-1]], **sem_rede)
+        iguais_3 = iguais("execucao3")
+        correr("--offline (base local)", ["--offline"], SNAPSHOT="0")
+
+        partes = {nome: _tamanho(os.path.join(snap_dir, nome)) for nome in ("objetos", "manifestos", "indice.sqlite")}
+        primeiro = _tamanho(os.path.join(snap_dir, "objetos", snapshots.read_header(snap_dir, ids[0])["pacotes"][0]))
+        print(f"\nRegistos da execução 1 em JSON canónico: {recebidos / 1024 / 1024:.1f} MB; no pacote comprimido: {primeiro / 1024 / 1024:.1f} MB "
+              f"({recebidos / max(primeiro, 1):.1f}x menor)")
+        print("Arquivo final: " + ", ".join(f"{k} {v / 1024 / 1024:.2f} MB" for k, v in partes.items()))
+        print(f"CSVs do --from-snapshot iguais aos da execução 1: {'sim' if iguais_1 else 'NÃO'}; aos da execução 3: {'sim' if iguais_3 else 'NÃO'}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _importtime(modulo, env):
+    """(cumulativo do módulo, [(cumulativo, pacote)] dos imports diretos) em µs, pelo python -X importtime."""
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {raiz!r}); import {modulo}"],
+                       env=env, capture_output=True, text=True, cwd=tempfile.gettempdir())
+    linhas = [l.split("|") for l in r.stderr.splitlines() if l.startswith("import time:") and "self [us]" not in l]
+    total, filhos, dentro = 0, [], []
+    for _, cumulativo, nome in reversed(linhas):  # o módulo aparece depois dos seus imports: lê-se de trás para a frente
+        nivel = len(nome) - len(nome.lstrip())
+        if nome.strip() == modulo and nivel == 1: total, dentro = int(cumulativo), [True]
+        elif dentro and nivel == 1: break
+        elif dentro and nivel == 3: filhos.append((int(cumulativo), nome.strip()))
+    return total, sorted(filhos, reverse=True)
+
+def bench_arranque(n, repeticoes):
+    env = {k: v for k, v in os.environ.items() if k != "DMG_USER_TOKEN"}  # o arranque offline não pode precisar do token
+    print(f"{'módulo':<18} {'import (ms, mediana)':>21}   imports diretos mais pesados")
+    for modulo in ("main", "gerar_dashboard", "executar_tudo"):
+        medidas = sorted((_importtime(modulo, env) for _ in range(repeticoes)), key=lambda m: m[0])
+        total, filhos = medidas[len(medidas) // 2]
+        print(f"{modulo:<18} {total / 1000:>21.1f}   " + ", ".join(f"{nome} {us / 1000:.0f}" for us, nome in filhos[:4]))
+    r = subprocess.run([sys.executable, "-c", "import sys; sys.path.insert(0, sys.argv[1]); import main; print(' '.join(m for m in "
+                        "('requests', 'urllib3', 'numpy', 'pandas', 'cProfile') if m in sys.modules))", os.path.dirname(os.path.abspath(__file__))],
+                       env=env, capture_output=True, text=True, cwd=tempfile.gettempdir())
+    assert r.returncode == 0 and not r.stdout.splitlines()[-1].strip(), (r.stdout, r.stderr)
+    print("import main sem token: ok, sem requests/urllib3/numpy/pandas carregados")
+
+    # Relatórios refeitos da base local num diretório vazio, sem token nem API.
+    subs, txs = synthetic_dataset(n, start_date=datetime.now().strftime("%Y-01-01"), end_date=datetime.now().strftime("%Y-%m-%d"))
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    try:
+        os.makedirs(os.path.join(tmp, "out"))
+        store = LocalStore(os.path.join(tmp, "out", "dados.sqlite"))
+        for (path, _, _, date_of), items in ((main.SUBSCRIPTIONS_ENDPOINT, subs), (main.TRANSACTIONS_ENDPOINT, txs)):
+            store.upsert(path, items, date_of); store.set_sync_state(path, main.MIN_DATE_ALL, main.END_DATE)
+        store.close()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        t, r = _cronometrar(lambda: subprocess.run([sys.executable, script, "--offline"], env=env, cwd=tmp, capture_output=True, text=True))
+        assert r.returncode == 0 and os.path.exists(os.path.join(tmp, "out", "assinaturas.csv")), r.stdout[-2000:] + r.stderr[-2000:]
+        print(f"main.py --offline com {n} assinaturas e {len(txs)} transações na base local: {t:.2f}s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _colunas_assinaturas(n, seed=42):
+    # Colunas com a forma das do main.detailed_columns, geradas direto (sem busca nem normalização).
+    from mock_guru import PRODUTOS
+    rnd = random.Random(seed)
+    inicio = datetime(2024, 1, 1)
+    criadas = [(inicio + timedelta(days=rnd.randrange(730))).strftime("%Y-%m-%d") for _ in range(n)]
+    status = [rnd.choice(("active", "active", "active", "canceled", "pastdue", "paused")) for _ in range(n)]
+    canceladas = [(datetime.strptime(c, "%Y-%m-%d") + timedelta(days=rnd.randint(1, 400))).strftime("%Y-%m-%d") if st == "canceled" else ""
+                  for c, st in zip(criadas, status)]
+    return [[f"sub_{i:09d}" for i in range(n)], criadas, canceladas, status, [f"Assinante {i}" for i in range(n)],
+            [rnd.choice(PRODUTOS) for _ in range(n)], [round(rnd.uniform(90, 300), 2) for _ in range(n)],
+            [rnd.randint(1, 3) for _ in range(n)], ["TRUE" if st == "active" else "FALSE" for st in status]]
+
+def bench_escrita(n):
+    # Escrita do assinaturas.csv: csv.writer linha a linha (como antes) vs escrita.py por colunas, e o Parquet
+    # opcional; a leitura mostra o ganho de quem lê a seguir (coortes.load_assinaturas). Os CSVs têm de ser iguais.
+    import csv
+    import coortes
+    import escrita
+    cols = _colunas_assinaturas(n)
+    rows = list(zip(*cols))
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    antigo, novo, parquet = (os.path.join(tmp, nome) for nome in ("antigo.csv", "assinaturas.csv", "assinaturas.parquet"))
+
+    def escrever_antigo():
+        with open(antigo, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(main.DETAILED_COLUMNS)
+            writer.writerows(r[:6] + (f"{r[6]:.2f}",) + r[7:] for r in rows)
+
+    print(f"{n} linhas do assinaturas.csv")
+    print(f"{'formato':<28} {'escrita (s)':>12} {'linhas/s':>12} {'MB':>8} {'leitura (s)':>12}")
+    try:
+        t_antigo, _ = _cronometrar(escrever_antigo)
+        t_novo, _ = _cronometrar(escrita.write_csv, novo, main.DETAILED_COLUMNS, main._detailed_text_columns(cols))
+        t_ler, _ = _cronometrar(coortes.load_assinaturas, novo)
+        mb = os.path.getsize(novo) / 1e6
+        print(f"{'CSV, csv.writer (antes)':<28} {t_antigo:>12.2f} {n / t_antigo:>12,.0f} {mb:>8.1f} {t_ler:>12.2f}")
+        print(f"{'CSV, por colunas':<28} {t_novo:>12.2f} {n / t_novo:>12,.0f} {mb:>8.1f} {t_ler:>12.2f}")
+        if escrita.parquet_available():
+            df = main.detailed_frame(cols)
+            t_pq, _ = _cronometrar(escrita.write_parquet, df, parquet)
+            t_ler_pq, df_pq = _cronometrar(coortes.load_assinaturas, novo)  # o .parquet é mais recente: é ele que é lido
+            print(f"{'Parquet (DataFrame pronto)':<28} {t_pq:>12.2f} {n / t_pq:>12,.0f} {os.path.getsize(parquet) / 1e6:>8.1f} {t_ler_pq:>12.2f}"
+                  f"{'' if df_pq.equals(df) else '  (DataFrame diferente!)'}")
+        else:
+            print(f"{'Parquet':<28} {'indisponível (instale pyarrow ou fastparquet)':>46}")
+        with open(antigo, "rb") as a, open(novo, "rb") as b: iguais = a.read() == b.read()
+        print(f"\nCSV igual byte a byte ao do csv.writer: {'sim' if iguais else 'NÃO'}; escrita {t_antigo / t_novo:.2f}x mais rápida")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _sub_records(n, seed=42):
+    # Registos normalizados sintéticos (sem passar pelos dicts da API), com casos sem data e cancelamentos antes da criação.
+    rnd = random.Random(seed)
+    inicio, span = datetime(2024, 1, 1).timestamp(), 730 * 86400
+    subs = []
+    for i in range(n):
+        created = None if rnd.random() < 0.001 else inicio + rnd.randrange(span)
+        cancelled = (created or inicio) + rnd.randint(-5, 400) * 86400 if rnd.random() < 0.3 else None
+        subs.append(main.SubRecord(f"id_{i}", f"sub_{i:09d}", created, cancelled, rnd.choice(main.SUB_STATUSES), round(rnd.uniform(90, 300), 2), 1, None, None))
+    return subs
+
+def bench_historico(n, dias):
+    # Contagens por status e MRR em `dias` datas: StatusIndex (uma consulta vetorizada) vs get_subscription_status
+    # assinatura a assinatura em cada data (medido em 3 datas e extrapolado). Os números têm de ser iguais.
+    import historico
+    subs = _sub_records(n)
+    tickets = [s.value for s in subs]
+    t_build, index = _cronometrar(historico.StatusIndex, subs, tickets)
+    ends = [datetime(2024, 1, 1).timestamp() + 86400 * (i + 1) - 1 for i in range(dias)]
+    t_query, (counts, mrr) = _cronometrar(lambda: (index.counts(ends), index.mrr(ends)))
+
+    def ingenuo(ts):
+        c, soma = dict.fromkeys((*historico.STATUSES, "future"), 0), 0.0
+        for s, ticket in zip(subs, tickets):
+            st = main.get_subscription_status(s, ts)
+            c[st] += 1
+            if st == "active": soma += ticket
+        return c, soma
+
+    amostra = [0, dias // 2, dias - 1]
+    t_naive, resultados = _cronometrar(lambda: [ingenuo(ends[i]) for i in amostra])
+    iguais = all(c == {k: int(v[i]) for k, v in counts.items()} and abs(soma - mrr[i]) < 0.005 for i, (c, soma) in zip(amostra, resultados))
+    print(f"{n} assinaturas, {dias} datas")
+    print(f"{'':<34} {'tempo (s)':>10}")
+    print(f"{'StatusIndex: construção':<34} {t_build:>10.2f}")
+    print(f"{'StatusIndex: consulta das datas':<34} {t_query:>10.3f}")
+    print(f"{'por assinatura (extrapolado)':<34} {t_naive / len(amostra) * dias:>10.1f}")
+    print(f"Contagens e MRR iguais ao cálculo por assinatura nas datas da amostra: {'sim' if iguais else 'NÃO'}")
+
+    # No último dia, o daily_kpis.csv tem de bater com os status do assinaturas.csv (mesmo critério e mesmo ticket).
+    subs_api, txs_api = synthetic_dataset(5_000)
+    recs, tx_index, _ = main.build_report_state(subs_api, txs_api)
+    cols = main.detailed_columns(recs, tx_index, "2025-12-31")
+    ultimo = main.compute_daily_kpis(main.build_status_index(recs, tx_index), [main.to_tz("2025-12-31")])[0]
+    ativos = [t for t, st in zip(cols[6], cols[3]) if st == "active"]
+    esperado = {"ativas": len(ativos), "inadimplentes": cols[3].count("overdue"), "inativas": cols[3].count("inactive"),
+                "canceladas": cols[3].count("canceled"), "mrr": round(sum(ativos), 2)}
+    print(f"Último dia igual aos status e tickets do assinaturas.csv: {'sim' if all(ultimo[k] == v for k, v in esperado.items()) else 'NÃO'}")
+
+def _por_produto_ingenuo(subs, txs, produto, periods):
+    # Como se faria hoje para um produto: filtrar as assinaturas e as transações dele e refazer o KpiIndex.
+    do_produto = [s for s in subs if s.product_name == produto]
+    ids = {s.id for s in do_produto}
+    index = main.KpiIndex(do_produto, [t for t in txs if t.sub_id in ids])
+    return [{**k, "ativas_fim_mes": index.ativos_em(end.timestamp())} for k, (_, end) in zip(main.compute_monthly_kpis(index, periods), periods)]
+
+def bench_produtos(n, produtos_list, meses=24):
+    # KPIs mensais por produto: ProductKpis (uma passagem agrupada) com 5 a 5000 produtos, à mesma quantidade de
+    # assinaturas; o filtro por produto (um KpiIndex por produto) é medido em poucos produtos e extrapolado.
+    rnd = random.Random(42)
+    base_subs = _sub_records(n)
+    txs = [main.TxRecord(f"tx_{i}", s.id, s.created_ts + k * 30 * 86400, s.value) for i, s in enumerate(base_subs)
+           if s.created_ts is not None for k in range(rnd.randint(0, 3))]
+    txs += [main.TxRecord(f"avulsa_{i}", None, base_subs[i].created_ts, 50.0) for i in range(0, n, 97) if base_subs[i].created_ts is not None]
+    tx_index, index = main.TxIndex(txs), main.KpiIndex(base_subs, txs)
+    periods = main.month_periods(main.to_tz("2024-01-01"), main.to_tz("2024-01-01") + timedelta(days=meses * 30.5))
+    mensal = main.compute_monthly_kpis(index, periods)
+    print(f"{n} assinaturas, {len(txs)} transações, {len(periods)} meses")
+    print(f"{'produtos':>9} {'agrupado (s)':>13} {'linhas CSV':>11} {'por produto (s)':>16} {'soma = mensal':>14} {'igual ao filtro':>16}")
+    for n_produtos in produtos_list:
+        for s in base_subs: s.product_name = f"Produto {rnd.randrange(n_produtos):05d}"
+        t, rows = _cronometrar(main.compute_product_kpis, base_subs, tx_index, index, periods)
+        somas = {}
+        for r in rows:
+            acc = somas.setdefault(r["month"], [0, 0, 0.0])
+            acc[0] += r["novas_assinaturas_brutas"]; acc[1] += r["cancelamentos_brutos"]; acc[2] += r["receita"]
+        bate = all(tuple(somas.get(m["month"], (0, 0, 0.0))[:2]) == (m["novas_assinaturas_brutas"], m["cancelamentos_brutos"])
+                   and abs(somas.get(m["month"], (0, 0, 0.0))[2] - m["receita"]) < 0.01 * n_produtos for m in mensal)
+        amostra = sorted({s.product_name for s in base_subs})[:3]
+        t_naive, ingenuos = _cronometrar(lambda: [_por_produto_ingenuo(base_subs, txs, p, periods) for p in amostra])
+        por_chave = {(r["month"], r["produto_oferta"]): r for r in rows}
+        vazio = {"novas_assinaturas_brutas": 0, "cancelamentos_brutos": 0, "ativas_fim_mes": 0, "receita": 0.0}
+        igual = all(all(por_chave.get((k["month"], p), vazio)[c] == k[c] for c in ("novas_assinaturas_brutas", "cancelamentos_brutos", "ativas_fim_mes"))
+                    and abs(por_chave.get((k["month"], p), vazio)["receita"] - k["receita"]) < 0.01
+                    for p, kpis in zip(amostra, ingenuos) for k in kpis)
+        print(f"{n_produtos:>9} {t:>13.2f} {len(rows):>11} {t_naive / len(amostra) * n_produtos:>16.1f} {'sim' if bate else 'NÃO':>14} {'sim' if igual else 'NÃO':>16}")
+
+# =========================
+# SUITE PONTA A PONTA
+# =========================
+SUITE_ETAPAS = ("fetch", "normalizacao", "csv", "kpis", "dashboard")
+
+def _start_mock_process(n, latencia, erros_5xx, seed=42):
+    """Arranca o mock_guru.py noutro processo (não disputa o GIL com o cliente medido); devolve (processo, URL)."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_guru.py")
+    proc = subprocess.Popen([sys.executable, script, "--assinaturas", str(n), "--seed", str(seed), "--porta", "0", "--data-inicio", "2024-01-01",
+                             "--data-fim", "2025-12-31", "--latencia", str(latencia), "--erros-5xx", str(erros_5xx)],
+                            stdout=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        if line.startswith("http://"): return proc, line.strip()
+    raise RuntimeError("mock_guru.py terminou sem indicar o endereço")
+
+def _suite_tamanho(n, latencia, erros_5xx, fetch_workers):
+    import gerar_dashboard
+    import metricas
+    proc, url = _start_mock_process(n, latencia, erros_5xx)
+    tmp = tempfile.mkdtemp(prefix="kpis-bench-")
+    out_dir, dashboard_dir, main.OUT_DIR, gerar_dashboard.DASHBOARD_DIR = main.OUT_DIR, gerar_dashboard.DASHBOARD_DIR, tmp, tmp
+    main.METRICAS = metricas.Metricas(perfil=False)
+    store = LocalStore(os.path.join(tmp, "dados.sqlite"))
+    tempos = {}
+    try:
+        client = main.DMGClient("benchmark", base_url=url, limiter=main.RateLimiter(rate=0))
+        endpoints = [main.SUBSCRIPTIONS_ENDPOINT + ("2024-01-01",), main.TRANSACTIONS_ENDPOINT + ("2024-01-01",)]
+        with redirect_stdout(io.StringIO()):
+            tempos["fetch"], (subs_iter, txs_iter) = _cronometrar(main.sync_endpoints, client, store, endpoints, "2025-12-31", True, None, fetch_workers)
+            tempos["normalizacao"], (subs, tx_index, index) = _cronometrar(main.build_report_state, subs_iter, txs_iter)
+            tempos["csv"], cols = _cronometrar(main.write_detailed_csv, subs, tx_index, "2025-12-31")
+            tempos["kpis"], _ = _cronometrar(main.write_kpi_csvs, index, "2024-01-01", "2025-12-31")
+            del subs, tx_index, index
+            tempos["dashboard"], _ = _cronometrar(lambda: gerar_dashboard.write_data_files(gerar_dashboard.process_data_for_dashboard(main.detailed_frame(cols))))
+        contadores = main.METRICAS.como_dict()["contadores"]
+        return {**{k: round(v, 3) for k, v in tempos.items()}, "assinaturas_no_csv": len(cols[0]),
+                "paginas": sum(v for k, v in contadores.items() if k.endswith(":paginas")),
+                "retentativas": contadores.get("retentativas_urllib3", 0), "pico_rss_mb": metricas.peak_rss_mb()}
+    finally:
+        store.close(); proc.terminate(); proc.wait()
+        main.OUT_DIR, gerar_dashboard.DASHBOARD_DIR, main.METRICAS = out_dir, dashboard_dir, metricas.METRICAS
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def bench_suite(tamanhos, latencia, erros_5xx, fetch_workers, saida, comparar, limite):
+    import json
+    import platform
+    anterior = json.load(open(comparar, encoding="utf-8")) if comparar else None
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    resultados = {"gerado_em": datetime.now().isoformat(timespec="seconds"), "commit": commit or None, "python": platform.python_version(),
+                  "cpus": os.cpu_count(), "parametros": {"latencia": latencia, "erros_5xx": erros_5xx, "fetch_workers": fetch_workers}, "tamanhos": {}}
+    print(f"mock em processo à parte, latência {latencia * 1000:.0f} ms, {erros_5xx:.1%} de 5xx, {fetch_workers} workers de busca")
+    print(f"{'assinaturas':>12} " + " ".join(f"{e + ' (s)':>16}" for e in SUITE_ETAPAS) + f" {'páginas':>8} {'retent.':>8} {'pico RSS':>9}")
+    regressoes = []
+    for n in tamanhos:
+        r = resultados["tamanhos"][str(n)] = _suite_tamanho(n, latencia, erros_5xx, fetch_workers)
+        antes = (anterior or {}).get("tamanhos", {}).get(str(n), {})
+        celulas = []
+        for etapa in SUITE_ETAPAS:
+            celula = f"{r[etapa]:.3f}"
+            if etapa in antes:
+                razao = r[etapa] / antes[etapa] if antes[etapa] else 1.0
+                celula += f" ({razao:.2f}x)"
+                # Abaixo de 50 ms o ruído domina; só conta como regressão acima do limite e dessa diferença absoluta.
+                if razao > limite and r[etapa] - antes[etapa] > 0.05: regressoes.append(f"{etapa} com {n} assinaturas: {antes[etapa]:.3f}s -> {r[etapa]:.3f}s")
+            celulas.append(f"{celula:>16}")
+        print(f"{n:>12} " + " ".join(celulas) + f" {r['paginas']:>8} {r['retentativas']:>8} {r['pico_rss_mb'] or 0:>8.0f}M", flush=True)
+    if saida:
+        os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+        with open(saida, "w", encoding="utf-8") as f: json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"Resultados gravados em '{saida}'" + (f" (comparados com '{comparar}', commit {anterior.get('commit')})" if anterior else "") + ".")
+    if regressoes:
+        print("REGRESSÕES (> {:.0%} mais lento):\n  ".format(limite - 1) + "\n  ".join(regressoes))
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de KPIs com dados sintéticos.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("kpis", help="Tempo do motor de KPIs mensal/semanal.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p = sub.add_parser("normalize", help="Memória dos dicts da API vs registos normalizados e tempo dos relatórios.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[100_000])
+    p = sub.add_parser("stream", help="Pico de memória (tracemalloc) dos relatórios lidos da base local: listas vs streaming.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[100_000])
+    p = sub.add_parser("dashboard", help="Dados do dashboard: registos JSON vs agregados por dia (tamanho, parse e consulta de um ano).")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000])
+    p = sub.add_parser("coortes", help="Matriz de retenção e LTV por coorte (vetorizado), com a fixture verificada à mão.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[100_000, 1_000_000])
+    p = sub.add_parser("cache", help="Pedidos poupados pelo cache de respostas (mock local com ETag).")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p = sub.add_parser("join", help="Índice de transações (último ticket por assinatura): sort por assinatura vs TxIndex.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[100_000, 1_000_000])
+    p = sub.add_parser("datas", help="Parser de datas: igualdade com a implementação antiga (incl. horário de verão) e microbenchmark.")
+    p.add_argument("--valores", type=int, default=200_000)
+    p = sub.add_parser("metricas", help="Pipeline completo contra o mock: métricas por etapa (run_metrics.json) e custo do --profile.")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p.add_argument("--throttle-every", type=int, default=50, help="Devolve um 429 a cada N pedidos.")
+    p = sub.add_parser("orquestracao", help="executar_tudo.py em subprocessos vs no mesmo processo: tempo e pico de memória.")
+    p.add_argument("--assinaturas", type=int, default=50_000)
+    p = sub.add_parser("retomada", help="Busca com ligações cortadas pelo mock e retoma do checkpoint depois de um SIGKILL a meio.")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p.add_argument("--latencia", type=float, default=0.02)
+    p.add_argument("--cortes", type=float, default=0.02, help="Fração das respostas cortadas a meio do corpo.")
+    p.add_argument("--fracao", type=float, default=0.5, help="Fração das páginas gravadas no checkpoint antes do SIGKILL.")
+    p = sub.add_parser("snapshot", help="Arquivo comprimido das respostas da API (SNAPSHOT=1): tamanho num ano sintético e replay com --from-snapshot.")
+    p.add_argument("--assinaturas", type=int, default=100_000)
+    p.add_argument("--fracao", type=float, default=0.01, help="Fração das assinaturas alteradas (e de transações novas) na segunda execução.")
+    p = sub.add_parser("arranque", help="Tempo de import (python -X importtime) dos scripts e main.py --offline sem token.")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p.add_argument("--repeticoes", type=int, default=5)
+    p = sub.add_parser("escrita", help="Escrita do assinaturas.csv: csv.writer vs por colunas (escrita.py) e Parquet, com leitura e igualdade.")
+    p.add_argument("--linhas", type=int, default=1_000_000)
+    p = sub.add_parser("historico", help="Status e MRR em N datas (as-of): StatusIndex vetorizado vs cálculo por assinatura.")
+    p.add_argument("--assinaturas", type=int, default=1_000_000)
+    p.add_argument("--dias", type=int, default=365)
+    p = sub.add_parser("produtos", help="KPIs mensais por produto numa passagem agrupada: tempo com 5 a 5000 produtos e igualdade com os totais.")
+    p.add_argument("--assinaturas", type=int, default=1_000_000)
+    p.add_argument("--produtos", type=int, nargs="+", default=[5, 50, 500, 5000])
+    p = sub.add_parser("suite", help="Ponta a ponta contra o mock (busca, normalização, CSV, KPIs, dashboard) com ficheiro de resultados comparável.")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    p.add_argument("--latencia", type=float, default=0.0)
+    p.add_argument("--erros-5xx", type=float, default=0.005, help="Fração dos pedidos com 5xx (exercita as retentativas).")
+    p.add_argument("--fetch-workers", type=int, default=4)
+    p.add_argument("--saida", default=os.path.join("out", "benchmark_suite.json"), help="Ficheiro JSON com os resultados desta execução.")
+    p.add_argument("--comparar", help="Resultados anteriores (JSON da --saida) para comparar; sai com erro se houver regressões.")
+    p.add_argument("--limite", type=float, default=1.2, help="Razão a partir da qual uma etapa conta como regressão.")
+    p = sub.add_parser("sync", help="Pedidos à API (mock local) na sincronização completa vs incremental.")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p = sub.add_parser("fetch", help="Tempo da busca concorrente contra o mock local com latência simulada.")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p.add_argument("--latencia", type=float, default=0.05)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--throttle-every", type=int, default=0, help="Devolve um 429 a cada N pedidos.")
+    p = sub.add_parser("chunks", help="Janelas fixas vs divisão adaptativa com dados concentrados num mês.")
+    p.add_argument("--assinaturas", type=int, default=20_000)
+    p.add_argument("--latencia", type=float, default=0.2)
+    p.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    if args.bench == "kpis": bench_kpis(args.tamanhos)
+    elif args.bench == "normalize": bench_normalize(args.tamanhos)
+    elif args.bench == "stream": bench_stream(args.tamanhos)
+    elif args.bench == "dashboard": bench_dashboard(args.tamanhos)
+    elif args.bench == "coortes": bench_coortes(args.tamanhos)
+    elif args.bench == "cache": bench_cache(args.assinaturas)
+    elif args.bench == "join": bench_join(args.tamanhos)
+    elif args.bench == "datas": bench_datas(args.valores)
+    elif args.bench == "metricas": bench_metricas(args.assinaturas, args.throttle_every)
+    elif args.bench == "orquestracao": bench_orquestracao(args.assinaturas)
+    elif args.bench == "retomada": bench_retomada(args.assinaturas, args.latencia, args.cortes, args.fracao)
+    elif args.bench == "snapshot": bench_snapshot(args.assinaturas, args.fracao)
+    elif args.bench == "arranque": bench_arranque(args.assinaturas, args.repeticoes)
+    elif args.bench == "escrita": bench_escrita(args.linhas)
+    elif args.bench == "historico": bench_historico(args.assinaturas, args.dias)
+    elif args.bench == "produtos": bench_produtos(args.assinaturas, args.produtos)
+    elif args.bench == "suite": bench_suite(args.tamanhos, args.latencia, args.erros_5xx, args.fetch_workers, args.saida, args.comparar, args.limite)
+    elif args.bench == "sync": bench_sync(args.assinaturas)
+    elif args.bench == "fetch": bench_fetch(args.assinaturas, args.latencia, args.workers, args.throttle_every)
+    elif args.bench == "chunks": bench_chunks(args.assinaturas, args.latencia, args.workers)
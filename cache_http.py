@@ -0,0 +1,100 @@
+# cache_http.py
+# -*- coding: utf-8 -*-
+# Cache em disco (SQLite) das páginas da API, usado pelo DMGClient.iter_pages do main.py.
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+class CachedPage:
+    __slots__ = ("body", "etag", "last_modified", "expires_at")
+
+    def __init__(self, body, etag, last_modified, expires_at):
+        self.body, self.etag, self.last_modified, self.expires_at = body, etag, last_modified, expires_at
+
+    def fresh(self): return self.expires_at > time.time()
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag: headers["If-None-Match"] = self.etag
+        if self.last_modified: headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class ResponseCache:
+    """Respostas por (path, parâmetros, cursor), com validade pela idade dos dados e despejo LRU acima de max_bytes.
+
+    Páginas de janelas já fechadas (fim antes de hoje - closed_after_days) valem ttl_historical segundos; as da
+    janela atual, ttl_recent. Uma página expirada com ETag/Last-Modified é revalidada com um pedido condicional.
+    """
+
+    def __init__(self, path, max_bytes=200 * 1024 * 1024, ttl_recent=3600, ttl_historical=7 * 86400, closed_after_days=7):
+        self.path, self.max_bytes = path, max_bytes
+        self.ttl_recent, self.ttl_historical, self.closed_after_days = ttl_recent, ttl_historical, closed_after_days
+        self.hits = self.misses = self.revalidated = self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT,
+                expires_at REAL NOT NULL, last_used REAL NOT NULL, size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_lru ON pages (last_used);
+        """)
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def close(self): self.conn.close()
+
+    @staticmethod
+    def key(path, params): return path + "?" + json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+    def ttl(self, params):
+        # A data de fim da janela é o maior parâmetro "*_end" (ex.: created_at_end, confirmed_at_end).
+        ends = [str(v)[:10] for k, v in params.items() if k.endswith("_end") and v]
+        cutoff = (datetime.now() - timedelta(days=self.closed_after_days)).strftime("%Y-%m-%d")
+        return self.ttl_historical if ends and max(ends) < cutoff else self.ttl_recent
+
+    # Os contadores são atualizados aqui, sob o lock, porque o cliente é partilhado pelos workers.
+    def get(self, key, revalidate=False):
+        """Página guardada (ou None); com revalidate, uma página ainda válida não conta como hit, porque vai ser
+        confirmada com um pedido condicional."""
+        with self.lock:
+            row = self.conn.execute("SELECT body, etag, last_modified, expires_at FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None: return None
+            self.conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            page = CachedPage(*row)
+            if page.fresh() and not revalidate: self.hits += 1
+            return page
+
+    def put(self, key, body, etag, last_modified, ttl):
+        now = time.time()
+        with self.lock:
+            self.misses += 1
+            old = self.conn.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO pages (key, body, etag, last_modified, expires_at, last_used, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (key, body, etag, last_modified, now + ttl, now, len(body)))
+            self.total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def touch(self, key, ttl):
+        """Renova a validade de uma página confirmada por um 304."""
+        now = time.time()
+        with self.lock:
+            self.revalidated += 1
+            self.conn.execute("UPDATE pages SET expires_at = ?, last_used = ? WHERE key = ?", (now + ttl, now, key))
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT key, size FROM pages ORDER BY last_used LIMIT 64").fetchall()
+            if not rows: break
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes: break
+                self.conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self.total_bytes -= size; self.evictions += 1
+
+    def summary(self):
+        return (f"Cache de respostas: {self.hits} hits, {self.misses} misses, {self.revalidated} revalidadas (304), "
+                f"{self.evictions} despejadas, {self.total_bytes / 1024 / 1024:.1f} MB em '{self.path}'.")
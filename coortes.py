@@ -0,0 +1,94 @@
+# coortes.py
+# -*- coding: utf-8 -*-
+# Matriz de retenção (mês de assinatura x meses desde a assinatura) e LTV por coorte, calculados sobre a tabela
+# inteira do assinaturas.csv com pandas/NumPy, sem laços por coorte.
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import escrita
+
+OUT_DIR = './out'
+ASSINATURAS_CSV = os.path.join(OUT_DIR, 'assinaturas.csv')
+
+# =========================
+# MESES DE VIDA POR ASSINATURA
+# =========================
+def _month_number(dates):
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype='float64')
+
+def cohort_months(df, end_date):
+    """Devolve (mês da coorte, meses ativos, horizonte) por assinatura, como inteiros numpy.
+
+    Meses ativos = meses de calendário entre o mês da assinatura e o do cancelamento (ou o de end_date), ou seja,
+    a assinatura conta como retida em todos os meses em que esteve ativa em algum momento; um cancelamento depois
+    de end_date conta como ativa até end_date. Horizonte = meses observáveis até end_date. Linhas sem data de
+    assinatura ficam de fora.
+    """
+    df = df[df['data_assinatura'].notna()]
+    inicio = _month_number(df['data_assinatura'])
+    fim_mes = _month_number(pd.Series([pd.Timestamp(end_date)]))[0]
+    fim = _month_number(df['data_cancelamento'])
+    fim = np.where(np.isnan(fim), fim_mes, fim)
+    horizonte = fim_mes - inicio
+    meses = np.clip(np.minimum(fim - inicio, horizonte), 0, None).astype('int64')
+    return inicio.astype('int64'), meses, horizonte.astype('int64'), df
+
+def _cohort_label(month_number): return f"{month_number // 12:04d}-{month_number % 12 + 1:02d}"
+
+# =========================
+# RELATÓRIOS
+# =========================
+def retention_matrix(df, end_date):
+    """Fração da coorte ainda ativa em cada mês desde a assinatura; meses além de end_date ficam vazios."""
+    inicio, meses, horizonte, _ = cohort_months(df, end_date)
+    if len(inicio) == 0: return pd.DataFrame(columns=['mes_coorte'])
+    coortes, coorte_idx = np.unique(inicio, return_inverse=True)
+    horizonte_coorte = np.zeros(len(coortes), dtype='int64'); horizonte_coorte[coorte_idx] = horizonte
+    n_meses = int(max(horizonte_coorte.max(), 0)) + 1
+    # Histograma (coorte, meses ativos) e soma acumulada do fim para o início: retidas no mês k = vida >= k.
+    hist = np.bincount(coorte_idx * n_meses + meses, minlength=len(coortes) * n_meses).reshape(len(coortes), n_meses)
+    retidas = np.cumsum(hist[:, ::-1], axis=1)[:, ::-1]
+    taxa = retidas / retidas[:, :1]
+    taxa[np.arange(n_meses)[None, :] > horizonte_coorte[:, None]] = np.nan
+    matriz = pd.DataFrame(taxa, columns=[f"Mês {k}" for k in range(n_meses)])
+    matriz.insert(0, 'mes_coorte', [_cohort_label(int(c)) for c in coortes])
+    return matriz
+
+def ltv_by_cohort(df, end_date):
+    """Clientes, ticket médio, média de meses ativos e LTV estimado (ticket médio x meses ativos) por coorte."""
+    inicio, meses, _, df = cohort_months(df, end_date)
+    grupos = pd.DataFrame({'mes_coorte': inicio, 'ticket': df['ticket_oferta'].fillna(0).to_numpy(), 'meses': meses}).groupby('mes_coorte', sort=True)
+    ltv = grupos.agg(clientes_na_coorte=('ticket', 'size'), ticket_medio_coorte=('ticket', 'mean'), meses_ativos_media=('meses', 'mean')).reset_index()
+    ltv['ltv_estimado'] = ltv['ticket_medio_coorte'] * ltv['meses_ativos_media']
+    ltv['mes_coorte'] = [_cohort_label(int(c)) for c in ltv['mes_coorte']]
+    return ltv
+
+def _parquet_atual(path):
+    # O assinaturas.parquet só substitui o CSV se não for mais antigo que ele (ex.: de uma execução sem --parquet).
+    parquet = os.path.splitext(path)[0] + '.parquet'
+    try:
+        if os.path.getmtime(parquet) < os.path.getmtime(path): return None
+    except OSError:
+        return None
+    return parquet if escrita.parquet_available() else None
+
+def load_assinaturas(path=ASSINATURAS_CSV):
+    """Lê o assinaturas.csv (ou o .parquet gravado ao lado dele pelo main.py --parquet, que é mais rápido de ler)."""
+    parquet = _parquet_atual(path)
+    if parquet: return pd.read_parquet(parquet)
+    df = pd.read_csv(path, dtype={'ativo': str})
+    df['data_assinatura'] = pd.to_datetime(df['data_assinatura'])
+    df['data_cancelamento'] = pd.to_datetime(df['data_cancelamento'], errors='coerce')
+    return df
+
+def generate_cohort_csvs(df, end_date, out_dir=OUT_DIR):
+    print("\nGerando matriz de retenção e LTV por coorte (matriz_retencao.csv, ltv_por_coorte.csv)...")
+    for nome, tabela in (('matriz_retencao.csv', retention_matrix(df, end_date)), ('ltv_por_coorte.csv', ltv_by_cohort(df, end_date))):
+        with escrita.atomic_path(os.path.join(out_dir, nome)) as tmp: tabela.to_csv(tmp, index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera a matriz de retenção e o LTV por coorte a partir do assinaturas.csv.")
+    parser.add_argument("--data-fim", default=pd.Timestamp.now().strftime("%Y-%m-%d"), help="Data de referência (AAAA-MM-DD) para as assinaturas ainda ativas.")
+    args = parser.parse_args()
+    generate_cohort_csvs(load_assinaturas(), args.data_fim)
@@ -0,0 +1,99 @@
+# datas.py
+# -*- coding: utf-8 -*-
+# Conversão rápida das datas da API da Guru para epoch (segundos), com os mesmos resultados do from_iso_any antigo.
+# Formatos com caminho rápido: "AAAA-MM-DD HH:MM:SS", ISO com T/Z/fração, "AAAA-MM-DD" e epoch em segundos ou ms;
+# qualquer outra coisa cai no strptime, como antes.
+import calendar
+from datetime import datetime
+from functools import lru_cache
+import pytz
+
+DMG_TZ = "America/Sao_Paulo"
+PARSE_CACHE_SIZE = 1 << 16  # valores repetidos (ex.: datas sem hora) são lidos uma única vez
+
+@lru_cache(maxsize=None)
+def timezone(tzname=DMG_TZ): return pytz.timezone(tzname)
+
+def _offset(tz, dt): return tz.localize(dt).utcoffset().total_seconds()
+
+def _same_offset(tz, first, dt):
+    # O localize() das últimas horas de 9999-12-31 passa de datetime.max (OverflowError): aí desce-se ao valor.
+    try:
+        return _offset(tz, dt) == first
+    except OverflowError:
+        return False
+
+@lru_cache(maxsize=None)  # um item por dia distinto nos dados: poucos milhares mesmo com anos de histórico
+def _day_offset(y, m, d, tzname):
+    # Deslocamento do dia inteiro, ou None nos dias em que o fuso muda (aí desce-se à hora).
+    tz = timezone(tzname)
+    first = _offset(tz, datetime(y, m, d))
+    return first if _same_offset(tz, first, datetime(y, m, d, 23, 59, 59)) else None
+
+@lru_cache(maxsize=8192)
+def _hour_offset(y, m, d, h, tzname):
+    # Deslocamento do localize() (is_dst=False nas horas ambíguas e inexistentes) para a hora local inteira, ou None
+    # se ele muda dentro da hora (ex.: a troca de LMT para -03 em 1914 às 00:07:28); aí cada valor é calculado à parte.
+    tz = timezone(tzname)
+    first = _offset(tz, datetime(y, m, d, h))
+    return first if _same_offset(tz, first, datetime(y, m, d, h, 59, 59)) else None
+
+def _local_epoch(y, m, d, hh, mm, ss, tzname):
+    dt = datetime(y, m, d, hh, mm, ss)  # valida a data como o strptime (ValueError em 2025-02-30, 24:00:00, ...)
+    offset = _day_offset(y, m, d, tzname)
+    if offset is None: offset = _hour_offset(y, m, d, hh, tzname)
+    if offset is None: offset = _offset(timezone(tzname), dt)
+    return calendar.timegm((y, m, d, hh, mm, ss)) - offset
+
+def _numeric_epoch(ts, tzname):
+    ts = ts / 1000.0 if ts > 1e12 else ts
+    return datetime.fromtimestamp(ts, timezone(tzname)).timestamp()
+
+def _is_fast(base):
+    # Só dígitos ASCII nas posições fixas; o resto (ex.: "2025-1-5") vai para o strptime, que aceita mais formas.
+    if not base.isascii(): return False
+    if len(base) == 10: return base[4] == base[7] == "-" and (base[:4] + base[5:7] + base[8:]).isdigit()
+    return (len(base) == 19 and base[4] == base[7] == "-" and base[10] == " " and base[13] == base[16] == ":"
+            and (base[:4] + base[5:7] + base[8:10] + base[11:13] + base[14:16] + base[17:]).isdigit())
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_str(s, tzname):
+    s2 = s.strip()
+    if not s2: return None
+    if s2.replace(".", "", 1).isdigit(): return _numeric_epoch(float(s2), tzname)
+    s2 = s2.replace("T", " ").replace("Z", "")
+    if "." in s2: s2 = s2.split(".")[0]
+    base = s2[:19] if len(s2) >= 19 else s2[:10]
+    try:
+        if _is_fast(base):
+            if len(base) == 10: return _local_epoch(int(base[:4]), int(base[5:7]), int(base[8:10]), 0, 0, 0, tzname)
+            return _local_epoch(int(base[:4]), int(base[5:7]), int(base[8:10]), int(base[11:13]), int(base[14:16]), int(base[17:19]), tzname)
+        fmt = "%Y-%m-%d %H:%M:%S" if len(base) > 10 else "%Y-%m-%d"
+        return timezone(tzname).localize(datetime.strptime(base, fmt)).timestamp()
+    except (ValueError, OverflowError):  # data inválida, ou fora do que o localize() consegue converter (ex.: 9999-12-31 23:59:59)
+        return None
+
+def parse_epoch(value, tzname=DMG_TZ):
+    """Epoch (float, segundos) de um valor da API, lido em tzname quando não traz fuso; None se vazio ou inválido."""
+    if value in (None, "", 0): return None
+    if isinstance(value, str): return _parse_str(value, tzname)
+    if isinstance(value, (int, float)): return _numeric_epoch(float(value), tzname)
+    return None
+
+def parse_datetime(value, tzname=DMG_TZ):
+    ts = parse_epoch(value, tzname)
+    return datetime.fromtimestamp(ts, timezone(tzname)) if ts is not None else None
+
+def parse_epochs(values, tzname=DMG_TZ):
+    """Converte uma coluna inteira de uma vez; cada valor distinto é lido uma única vez. Os epochs são floats, como os de
+    parse_epoch (os valores em ms trazem frações de segundo e None marca os vazios)."""
+    seen, out = {}, []
+    for v in values:
+        try:
+            ts = seen[v]
+        except KeyError:
+            ts = seen[v] = parse_epoch(v, tzname)
+        except TypeError:  # valor não hashable (ex.: dict): sem memo
+            ts = parse_epoch(v, tzname)
+        out.append(ts)
+    return out
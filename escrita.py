@@ -0,0 +1,72 @@
+# escrita.py
+# -*- coding: utf-8 -*-
+# Escrita dos relatórios: ficheiros escritos num temporário e renomeados no fim (quem lê nunca vê um ficheiro a meio),
+# CSV montado por colunas inteiras em vez de linha a linha, e Parquet opcional ao lado do CSV.
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+CSV_CHUNK_ROWS = 2_000  # linhas por bloco de texto; limita a memória da string montada
+_CSV_SPECIAL = re.compile(r'[",\r\n]')
+_UMASK = os.umask(0); os.umask(_UMASK)  # o mkstemp cria com 0600; o ficheiro final fica com as permissões de um open()
+
+@contextmanager
+def atomic_path(path):
+    """Devolve um caminho temporário na mesma pasta; no fim sem erros, substitui path por ele (os.replace é atómico)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except FileNotFoundError: pass
+        raise
+
+@contextmanager
+def atomic_open(path, mode="w", **kwargs):
+    with atomic_path(path) as tmp, open(tmp, mode, **kwargs) as f:
+        yield f
+
+def csv_column(values):
+    """Coluna como texto pronto para o CSV, igual ao csv.writer (None -> "", str() no resto, aspas só quando precisa)."""
+    if not all(type(v) is str for v in values): values = ["" if v is None else str(v) for v in values]
+    # Uma única procura na coluna inteira; só as colunas com vírgulas, aspas ou quebras de linha vão campo a campo.
+    if _CSV_SPECIAL.search("\x00".join(values)):
+        values = ['"' + v.replace('"', '""') + '"' if _CSV_SPECIAL.search(v) else v for v in values]
+    return values
+
+def write_csv_columns(f, header, columns):
+    """Escreve o cabeçalho e as colunas (listas do mesmo tamanho) em f, aberto com newline=""; o texto sai igual ao do
+    csv.writer com as opções por omissão. Os floats têm de chegar já formatados (ex.: "%.2f")."""
+    if header: f.write(",".join(_fields(csv_column(list(header)), len(header))) + "\r\n")
+    n = len(columns[0]) if columns else 0
+    for lo in range(0, n, CSV_CHUNK_ROWS):
+        block = [csv_column(col[lo:lo + CSV_CHUNK_ROWS]) for col in columns]
+        if len(block) == 1: block[0] = _fields(block[0], 1)
+        f.write("\r\n".join(map(",".join, zip(*block))) + "\r\n")
+
+def _fields(values, width):
+    # Como no csv.writer, uma linha com um único campo vazio sai como "" (e não como linha em branco).
+    return ['""' if v == "" else v for v in values] if width == 1 else values
+
+def write_csv(path, header, columns):
+    with atomic_open(path, "w", newline="", encoding="utf-8") as f: write_csv_columns(f, header, columns)
+
+def parquet_available():
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            __import__(engine); return True
+        except ImportError:
+            continue
+    return False
+
+def write_parquet(df, path):
+    """Grava df em Parquet (pyarrow ou fastparquet, via pandas); devolve False se nenhum dos dois estiver instalado."""
+    if not parquet_available(): return False
+    with atomic_path(path) as tmp: df.to_parquet(tmp, index=False)
+    return True
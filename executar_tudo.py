@@ -3,9 +3,17 @@
 import subprocess
 import sys
 import os
+import json
+import time
+import argparse
+import traceback
 from datetime import datetime
+import metricas
+from escrita import atomic_open
 
-def executar_script(nome_script):
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def executar_script(nome_script, env=None, argumentos=()):
     """Executa um script Python e verifica se houve erros."""
     print("-" * 50)
     print(f"A EXECUTAR: {nome_script}")
@@ -15,12 +23,13 @@ def executar_script(nome_script):
     
     try:
         processo = subprocess.Popen(
-            [python_executable, nome_script],
+            [python_executable, os.path.join(SCRIPTS_DIR, nome_script), *argumentos],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
             encoding='utf-8',
-            errors='replace' 
+            errors='replace',
+            env=env
         )
         
         for linha in processo.stdout:
@@ -45,20 +54,74 @@ def executar_script(nome_script):
         print(f"\n!!!!!! Ocorreu um erro inesperado: {e} !!!!!!")
         return False
 
+def executar_em_processo(offline=False, full_resync=False):
+    """Extração, relatórios e dashboard no mesmo processo: o DataFrame do assinaturas.csv passa direto para o
+    dashboard, sem segundo arranque do Python/pandas nem nova leitura do CSV (que continua a ser escrito)."""
+    print("-" * 50)
+    print("A EXECUTAR: main.py e gerar_dashboard.py no mesmo processo")
+    print("-" * 50)
+    try:
+        import main
+        import gerar_dashboard
+        df = main.fetch_and_generate_reports(full_resync=full_resync, offline=offline)
+        if df is None or not gerar_dashboard.gerar_dashboard(df): return False
+    except Exception:
+        print("\n!!!!!! ERRO AO EXECUTAR O PIPELINE !!!!!!")
+        traceback.print_exc(file=sys.stdout)
+        return False
+    finally:
+        metricas.METRICAS.salvar("executar_tudo.py")
+    print("\n--- SUCESSO: pipeline concluído sem erros. ---")
+    return True
+
+def gravar_metricas_execucao(inicio, modo, duracoes, sucesso):
+    """Acrescenta ao run_metrics.json (já com as secções de cada script) o resumo da execução completa."""
+    dados = metricas.carregar()
+    dados["execucao"] = {"inicio": inicio.isoformat(timespec="seconds"), "modo": modo, "sucesso": sucesso,
+                         "segundos": round(sum(duracoes.values()), 3), "segundos_por_passo": duracoes,
+                         "pico_rss_mb": metricas.peak_rss_mb(),
+                         "pico_rss_filhos_mb": metricas.peak_rss_mb(getattr(metricas.resource, "RUSAGE_CHILDREN", None))}
+    os.makedirs(os.path.dirname(metricas.RUN_METRICS_PATH) or ".", exist_ok=True)
+    with atomic_open(metricas.RUN_METRICS_PATH, "w", encoding="utf-8") as f: json.dump(dados, f, ensure_ascii=False, indent=2)
+    return metricas.RUN_METRICS_PATH
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executa a extração (main.py) e a geração do dashboard em sequência.")
+    parser.add_argument("--profile", action="store_true", help="Grava um cProfile por etapa de cada script em out/perfis/.")
+    parser.add_argument("--subprocessos", action="store_true", help="Corre cada script num processo Python à parte (isolamento), passando os dados pelo CSV.")
+    parser.add_argument("--offline", action="store_true", help="Não acede à API: refaz relatórios e dashboard a partir da base local.")
+    parser.add_argument("--full-resync", action="store_true", help="Ignora a base local e volta a descarregar todo o histórico, incluindo o das transações.")
+    args = parser.parse_args()
+
+    # Cada script junta a sua secção ao run_metrics.json; começa-se de um ficheiro vazio para não misturar execuções.
+    if os.path.exists(metricas.RUN_METRICS_PATH): os.remove(metricas.RUN_METRICS_PATH)
+    env = dict(os.environ, KPIS_PROFILE="1") if args.profile else None
+    metricas.METRICAS.perfil = metricas.METRICAS.perfil or args.profile
+    modo = "subprocessos" if args.subprocessos else "em_processo"
+
     start_time = datetime.now()
     print("="*50)
     print("INICIANDO PROCESSO COMPLETO DE GERAÇÃO DE KPIS")
     print(f"Iniciado em: {start_time.strftime('%d/%m/%Y %H:%M:%S')}")
     print("="*50)
 
-    scripts = ['main.py', 'gerar_dashboard.py']
+    if args.subprocessos:
+        argumentos = {'main.py': (['--offline'] if args.offline else []) + (['--full-resync'] if args.full_resync else [])}
+        passos = [(script, lambda script=script: executar_script(script, env, argumentos.get(script, ()))) for script in ['main.py', 'gerar_dashboard.py']]
+    else:
+        passos = [("em_processo", lambda: executar_em_processo(args.offline, args.full_resync))]
+    duracoes = {}
 
-    for script in scripts:
-        if not executar_script(script):
+    for nome, passo in passos:
+        t0 = time.perf_counter()
+        ok = passo()
+        duracoes[nome] = round(time.perf_counter() - t0, 3)
+        if not ok:
+            gravar_metricas_execucao(start_time, modo, duracoes, False)
             print("\nO processo foi interrompido devido a um erro.")
-            break
+            sys.exit(1)
     else:
+        print(f"\nMétricas da execução gravadas em '{gravar_metricas_execucao(start_time, modo, duracoes, True)}'.")
         end_time = datetime.now()
         dashboard_path = os.path.abspath(os.path.join('docs', 'index.html'))
         print("\n\nPROCESSO FINALIZADO COM SUCESSO!")
@@ -1,10 +1,16 @@
 # gerar_dashboard.py
 # -*- coding: utf-8 -*-
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime
 import json
+import gzip
 import os
+import argparse
+from metricas import METRICAS
+from escrita import atomic_open
+from coortes import load_assinaturas
+from produtos import dashboard_payload as produtos_payload
 
 # =========================
 # CONFIGURAÇÃO
@@ -13,29 +19,122 @@ OUT_DIR = './out'
 DASHBOARD_DIR = './docs'
 ASSINATURAS_CSV = os.path.join(OUT_DIR, 'assinaturas.csv')
 OUTPUT_HTML = os.path.join(DASHBOARD_DIR, 'index.html')
+PRODUCT_KPIS_CSV = 'product_kpis.csv'  # do main.py, na mesma pasta do assinaturas.csv
+DADOS_JSON = 'dados.json'
+PRECOMPRIMIR = ('gzip', 'br')  # variantes pré-comprimidas de dados.json; 'br' só se o pacote brotli estiver instalado
 
 # =========================
 # 1. CARREGAMENTO E PROCESSAMENTO DOS DADOS
 # =========================
-def process_data_for_dashboard():
-    print("A carregar e processar dados do CSV...")
-    try:
-        df = pd.read_csv(ASSINATURAS_CSV, dtype={'ativo': str})
-    except FileNotFoundError:
-        print(f"ERRO: Ficheiro '{ASSINATURAS_CSV}' não encontrado. Execute o 'main.py' primeiro.")
-        return None
-
-    df['data_assinatura'] = pd.to_datetime(df['data_assinatura'])
-    df['data_cancelamento'] = pd.to_datetime(df['data_cancelamento'], errors='coerce')
-    
-    data_for_js = df.to_json(orient='records', date_format='iso')
+def process_data_for_dashboard(df=None):
+    """df: o DataFrame do assinaturas.csv já em memória (main.fetch_and_generate_reports); sem ele, lê o CSV."""
+    if df is None:
+        print("A carregar e processar dados do CSV...")
+        with METRICAS.etapa("leitura_csv", script="dashboard") as etapa:
+            try:
+                df = load_assinaturas(ASSINATURAS_CSV)
+            except FileNotFoundError:
+                print(f"ERRO: Ficheiro '{ASSINATURAS_CSV}' não encontrado. Execute o 'main.py' primeiro.")
+                return None
+            etapa["linhas"] = len(df)
+    else:
+        print("A processar os dados já carregados em memória...")
+
+    with METRICAS.etapa("payload", script="dashboard"):
+        payload = build_dashboard_payload(df)
+        produtos = load_product_kpis(os.path.join(os.path.dirname(ASSINATURAS_CSV), PRODUCT_KPIS_CSV))
+        if produtos: payload['produtos'] = produtos
     print("Processamento de dados concluído.")
-    return data_for_js
+    return payload
+
+def load_product_kpis(path):
+    """Payload compacto dos KPIs por produto (produtos.dashboard_payload) a partir do product_kpis.csv; None sem ele."""
+    if not os.path.exists(path): return None
+    rows = pd.read_csv(path, dtype={'month': str, 'produto_oferta': str}, keep_default_na=False).to_dict('records')
+    return produtos_payload(rows) if rows else None
+
+MESES_POR_DIA = 30.44  # a mesma aproximação de mês que o script.js usa nas curvas de retenção e MRR
+
+def _day_offsets(dates, base):
+    return (dates - base).dt.days.to_numpy(dtype='float64')
+
+def build_dashboard_payload(df):
+    """Agregados por dia de assinatura, somáveis por prefixo: o script.js responde a qualquer período somando dias.
+
+    Por dia: assinaturas, cancelados, dias até cancelar, tickets (em centavos) de todas, das ativas e das sem
+    data de cancelamento, e o histograma (mês de vida -> quantidade, ticket) das canceladas. A vida das assinaturas
+    sem cancelamento depende de "hoje" e é calculada no browser, uma vez por dia do período.
+    """
+    base = df['data_assinatura'].min()
+    base = base.normalize() if pd.notna(base) else pd.Timestamp('1970-01-01')
+    ativo = (df['ativo'].astype(str).str.strip().str.upper() == 'TRUE').to_numpy()
+    totais = {'ativos': int(ativo.sum()), 'cancelados': int((~ativo).sum())}
+
+    # Assinaturas sem data de início nunca caem num período (como no filtro antigo), mas contam nos totais.
+    signup, cancel = _day_offsets(df['data_assinatura'], base), _day_offsets(df['data_cancelamento'], base)
+    tem_inicio = ~np.isnan(signup)
+    signup, cancel, ativo = signup[tem_inicio].astype('int64'), cancel[tem_inicio], ativo[tem_inicio]
+    centavos = (df['ticket_oferta'].fillna(0) * 100).round().astype('int64').to_numpy()[tem_inicio]
+    dias = int(signup.max()) + 1 if len(signup) else 0
+    cancelada = ~np.isnan(cancel)
+    dias_vida = cancel[cancelada] - signup[cancelada]
+
+    def por_dia(mask=None, weights=None):
+        idx = signup if mask is None else signup[mask]
+        w = weights if mask is None or weights is None else weights[mask]
+        return np.bincount(idx, weights=w, minlength=dias).astype('int64').tolist()
+
+    # Histograma das canceladas por (dia, mês de vida); meses negativos (cancelamento antes do início) ficam de fora.
+    meses = np.floor(dias_vida / MESES_POR_DIA).astype('int64')
+    validos = meses >= 0
+    hist_dia, hist_mes, hist_centavos = signup[cancelada][validos], meses[validos], centavos[cancelada][validos]
+    n_meses = int(hist_mes.max()) + 1 if len(hist_mes) else 0
+    chave = hist_dia * n_meses + hist_mes
+    contagem = np.bincount(chave, minlength=dias * n_meses)
+    soma = np.bincount(chave, weights=hist_centavos, minlength=dias * n_meses).astype('int64')
+    histograma = [[] for _ in range(dias)]
+    for k in np.flatnonzero(contagem):
+        histograma[k // n_meses].extend((int(k % n_meses), int(contagem[k]), int(soma[k])))
+
+    return {
+        'base': base.strftime('%Y-%m-%d'),
+        'dias': dias,
+        'totais': totais,
+        'assinaturas': por_dia(),
+        'cancelados': por_dia(cancelada),
+        'dias_ate_cancelar': np.bincount(signup[cancelada], weights=dias_vida, minlength=dias).astype('int64').tolist(),
+        'ticket_centavos': por_dia(weights=centavos),
+        'ticket_ativos_centavos': por_dia(ativo, centavos),
+        'sem_cancelamento': por_dia(~cancelada),
+        'ticket_sem_cancelamento_centavos': por_dia(~cancelada, centavos),
+        'meses_cancelados': histograma,
+    }
+
+def write_data_files(payload):
+    """Escreve dados.json, as variantes pré-comprimidas e dados.js (para abrir o index.html direto do disco)."""
+    with METRICAS.etapa("serializacao_json", script="dashboard") as etapa:
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etapa["bytes"] = len(body)
+    path = os.path.join(DASHBOARD_DIR, DADOS_JSON)
+    with METRICAS.etapa("escrita_dados", script="dashboard"):
+        with atomic_open(path, 'wb') as f: f.write(body)
+        if 'gzip' in PRECOMPRIMIR:
+            with atomic_open(path + '.gz', 'wb') as f: f.write(gzip.compress(body, compresslevel=9, mtime=0))
+        if 'br' in PRECOMPRIMIR:
+            try:
+                import brotli
+            except ImportError:
+                brotli = None
+            if brotli:
+                with atomic_open(path + '.br', 'wb') as f: f.write(brotli.compress(body))
+        with atomic_open(os.path.join(DASHBOARD_DIR, 'dados.js'), 'wb') as f:
+            f.write(b'window.dadosDashboard = ' + body + b';\n')
+    return len(body)
 
 # =========================
 # 2. GERAÇÃO DOS FICHEIROS DO SITE
 # =========================
-def write_dashboard_files(json_data):
+def write_dashboard_files(payload):
     print("A gerar ficheiros do dashboard (HTML, CSS, JS)...")
     os.makedirs(DASHBOARD_DIR, exist_ok=True)
 
@@ -74,6 +173,21 @@ def write_dashboard_files(json_data):
                 <canvas id="mrrChart"></canvas>
             </div>
         </div>
+
+        <section id="produtos-section" hidden>
+            <h2>KPIs Mensais por Produto/Oferta</h2>
+            <div class="filters">
+                <select id="produto-metrica">
+                    <option value="receita_centavos">Receita (R$)</option>
+                    <option value="novas">Novas assinaturas</option>
+                    <option value="cancelamentos">Cancelamentos</option>
+                    <option value="ativas">Ativas no fim do mês</option>
+                </select>
+            </div>
+            <div class="chart-container">
+                <canvas id="produtosChart"></canvas>
+            </div>
+        </section>
     </main>
     <script src="https://cdn.jsdelivr.net/npm/flatpickr"></script>
     <script src="https://npmcdn.com/flatpickr/dist/l10n/pt.js"></script>
@@ -91,6 +205,7 @@ h1, h2 { text-align: center; color: #1c1e21; margin-bottom: 20px; }
 h2 { margin-top: 40px; border-bottom: 1px solid #ddd; padding-bottom: 10px; font-size: 1.2em; color: #333; }
 p.footer { text-align: center; color: #606770; font-size: 0.9em; margin-top: -15px; margin-bottom: 30px; }
 .filters { display: flex; justify-content: center; margin-bottom: 30px; }
+#produto-metrica { font-size: 1.1em; padding: 10px; border-radius: 8px; border: 1px solid #ccc; }
 #date-range-picker { text-align: center; font-size: 1.1em; padding: 10px; border-radius: 8px; border: 1px solid #ccc; width: 300px; }
 .kpi-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; margin-bottom: 30px; }
 .kpi-card { background-color: #fff; padding: 25px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center; }
@@ -103,45 +218,159 @@ p.footer { text-align: center; color: #606770; font-size: 0.9em; margin-top: -15
 
     # --- Conteúdo do JavaScript ---
     js_content = f"""
-const rawData = {json_data};
-const data = rawData.map(d => ({{
-    ...d,
-    ativo: String(d.ativo).trim().toUpperCase() === 'TRUE',
-    data_assinatura: new Date(d.data_assinatura),
-    data_cancelamento: d.data_cancelamento ? new Date(d.data_cancelamento) : null
-}}));
+// dados.json traz agregados por dia de assinatura e só é pedido depois de a página carregar.
+// Na carga, cada série vira uma soma por prefixo; um período [início, fim] custa P[fim + 1] - P[início].
+const DIA_MS = 1000 * 60 * 60 * 24;
+
+function prefixSum(values) {{
+    const out = new Float64Array(values.length + 1);
+    for (let i = 0; i < values.length; i++) out[i + 1] = out[i] + values[i];
+    return out;
+}}
+
+function buildCohortIndex(p) {{
+    const [y, m, d] = p.base.split('-').map(Number);
+    let nMeses = 0;
+    p.meses_cancelados.forEach(h => {{ for (let j = 0; j < h.length; j += 3) nMeses = Math.max(nMeses, h[j] + 1); }});
+    // Prefixos 2D (dia x mês de vida) das canceladas: quantidade e ticket em centavos.
+    const mesesQtd = new Float64Array((p.dias + 1) * nMeses), mesesTicket = new Float64Array((p.dias + 1) * nMeses);
+    for (let dia = 0; dia < p.dias; dia++) {{
+        const row = dia * nMeses, next = row + nMeses;
+        for (let k = 0; k < nMeses; k++) {{ mesesQtd[next + k] = mesesQtd[row + k]; mesesTicket[next + k] = mesesTicket[row + k]; }}
+        const h = p.meses_cancelados[dia];
+        for (let j = 0; j < h.length; j += 3) {{ mesesQtd[next + h[j]] += h[j + 1]; mesesTicket[next + h[j]] += h[j + 2]; }}
+    }}
+    return {{
+        base: new Date(y, m - 1, d), baseUtc: Date.UTC(y, m - 1, d), dias: p.dias, nMeses, totais: p.totais,
+        semCancelamento: p.sem_cancelamento, ticketSemCancelamento: p.ticket_sem_cancelamento_centavos,
+        assinaturas: prefixSum(p.assinaturas), cancelados: prefixSum(p.cancelados), diasAteCancelar: prefixSum(p.dias_ate_cancelar),
+        ticket: prefixSum(p.ticket_centavos), ticketAtivos: prefixSum(p.ticket_ativos_centavos), mesesQtd, mesesTicket,
+        produtos: p.produtos || null
+    }};
+}}
 
+function loadScript(src) {{
+    return new Promise((resolve, reject) => {{
+        const s = document.createElement('script');
+        s.src = src; s.onload = resolve; s.onerror = reject;
+        document.head.appendChild(s);
+    }});
+}}
+
+async function loadData() {{
+    // 1) dados.json.gz descomprimido no browser; 2) dados.json; 3) dados.js, quando aberto via file:// (sem fetch).
+    if ('DecompressionStream' in window) {{
+        try {{
+            const resp = await fetch('{DADOS_JSON}.gz');
+            if (resp.ok) return buildCohortIndex(await new Response(resp.body.pipeThrough(new DecompressionStream('gzip'))).json());
+        }} catch (e) {{}}
+    }}
+    try {{
+        const resp = await fetch('{DADOS_JSON}');
+        if (resp.ok) return buildCohortIndex(await resp.json());
+    }} catch (e) {{}}
+    await loadScript('dados.js');
+    return buildCohortIndex(window.dadosDashboard);
+}}
+
+function dayIndex(idx, date) {{
+    return Math.round((Date.UTC(date.getFullYear(), date.getMonth(), date.getDate()) - idx.baseUtc) / DIA_MS);
+}}
+
+function cohortStats(idx, startDate, endDate, now = new Date()) {{
+    const ini = Math.max(0, dayIndex(idx, startDate)), fim = Math.min(idx.dias - 1, dayIndex(idx, endDate));
+    if (fim < ini) return null;
+    const range = P => P[fim + 1] - P[ini];
+    const cohortSize = range(idx.assinaturas);
+    if (cohortSize === 0) return null;
+    const cancelados = range(idx.cancelados);
+
+    // Mês de vida das canceladas: histogramas já somados; das restantes: calculado com "hoje", um dia de cada vez.
+    const qtdPorMes = new Float64Array(idx.nMeses), ticketPorMes = new Float64Array(idx.nMeses);
+    let maxMonths = 0;
+    for (let k = 0; k < idx.nMeses; k++) {{
+        qtdPorMes[k] = idx.mesesQtd[(fim + 1) * idx.nMeses + k] - idx.mesesQtd[ini * idx.nMeses + k];
+        ticketPorMes[k] = idx.mesesTicket[(fim + 1) * idx.nMeses + k] - idx.mesesTicket[ini * idx.nMeses + k];
+        if (qtdPorMes[k] > 0) maxMonths = k + 1;
+    }}
+    const vivas = [];
+    let ticketVivas = 0;
+    for (let dia = ini; dia <= fim; dia++) {{
+        if (!idx.semCancelamento[dia]) continue;
+        const inicio = new Date(idx.base.getFullYear(), idx.base.getMonth(), idx.base.getDate() + dia);
+        const meses = Math.floor(((now - inicio) / DIA_MS) / 30.44);
+        vivas.push([meses, idx.semCancelamento[dia]]);
+        ticketVivas += idx.ticketSemCancelamento[dia];
+        maxMonths = Math.max(maxMonths, meses + 1);
+    }}
+    maxMonths = Math.max(maxMonths, 1);
+
+    // Retenção no mês i = assinaturas com vida >= i; MRR no mês i = tickets das canceladas com vida >= i + todas as vivas.
+    const retentionData = new Array(maxMonths).fill(0), mrrTimeline = new Array(maxMonths).fill(0);
+    let qtdAcum = 0, ticketAcum = 0;
+    for (let k = idx.nMeses - 1; k >= 0; k--) {{
+        qtdAcum += qtdPorMes[k]; ticketAcum += ticketPorMes[k];
+        if (k < maxMonths) {{ retentionData[k] = qtdAcum; mrrTimeline[k] = ticketAcum / 100; }}
+    }}
+    const vivasPorMes = new Array(maxMonths + 1).fill(0);
+    vivas.forEach(([meses, qtd]) => {{ if (meses >= 0) vivasPorMes[Math.min(meses, maxMonths - 1)] += qtd; }});
+    for (let k = maxMonths - 1, acum = 0; k >= 0; k--) {{
+        acum += vivasPorMes[k];
+        retentionData[k] += acum; mrrTimeline[k] += ticketVivas / 100;
+    }}
+
+    const fpcDias = cancelados > 0 ? range(idx.diasAteCancelar) / cancelados : 0;
+    const ticketMedio = range(idx.ticket) / 100 / cohortSize;
+    return {{
+        cohortSize, churnRate: (cancelados / cohortSize) * 100, fpcDias, ticketMedio, ltv: ticketMedio * (fpcDias / 30.44),
+        mrrAtualDaCoorte: range(idx.ticketAtivos) / 100, maxMonths,
+        retentionPercentage: retentionData.map(count => (count / cohortSize) * 100), mrrTimeline
+    }};
+}}
+
+let cohortIndex = null;
 let retentionChart = null;
 let mrrChart = null;
+let produtosChart = null;
+
+const PRODUTOS_NO_GRAFICO = 8;  // os de maior receita em todos os meses; os restantes somam-se em "Outros"
+
+function updateProdutos(p, metrica) {{
+    const soma = row => row.reduce((a, b) => a + b, 0);
+    const ordem = p.produtos.map((_, i) => i).sort((a, b) => soma(p.receita_centavos[b]) - soma(p.receita_centavos[a]));
+    const escala = metrica === 'receita_centavos' ? 100 : 1;
+    const series = ordem.slice(0, PRODUTOS_NO_GRAFICO).map(i => ({{ label: p.produtos[i], data: p[metrica][i].map(v => v / escala) }}));
+    if (ordem.length > PRODUTOS_NO_GRAFICO) {{
+        const outros = new Array(p.meses.length).fill(0);
+        ordem.slice(PRODUTOS_NO_GRAFICO).forEach(i => p[metrica][i].forEach((v, m) => {{ outros[m] += v / escala; }}));
+        series.push({{ label: 'Outros', data: outros }});
+    }}
+    if (produtosChart) produtosChart.destroy();
+    produtosChart = new Chart(document.getElementById('produtosChart'), {{
+        type: 'bar',
+        data: {{ labels: p.meses, datasets: series }},
+        options: {{ responsive: true, scales: {{ x: {{ stacked: true }}, y: {{ stacked: true }} }},
+                    plugins: {{ title: {{ display: true, text: document.getElementById('produto-metrica').selectedOptions[0].text + ' por Produto/Oferta' }} }} }}
+    }});
+}}
 
 function updateDashboard(startDate, endDate) {{
-    endDate.setHours(23, 59, 59, 999);
-    const cohort = data.filter(d => d.data_assinatura >= startDate && d.data_assinatura <= endDate);
+    const stats = cohortStats(cohortIndex, startDate, endDate);
     
     const kpiGrid = document.getElementById('period-kpi-grid');
     kpiGrid.innerHTML = '';
 
-    if (cohort.length === 0) {{
+    if (!stats) {{
         kpiGrid.innerHTML = '<p style="text-align: center; width: 100%;">Nenhuma assinatura iniciada no período selecionado.</p>';
         if(retentionChart) retentionChart.destroy();
         if(mrrChart) mrrChart.destroy();
         return;
     }}
 
-    const cohortSize = cohort.length;
-    const cohortCancelados = cohort.filter(d => d.data_cancelamento);
-    const cohortAtivos = cohort.filter(d => d.ativo);
-    const churnRate = (cohortCancelados.length / cohortSize) * 100;
-    const lifetimeDays = cohortCancelados.map(d => (d.data_cancelamento - d.data_assinatura) / (1000 * 60 * 60 * 24));
-    const fpcDias = lifetimeDays.length > 0 ? lifetimeDays.reduce((a, b) => a + b, 0) / lifetimeDays.length : 0;
-    const ticketMedio = cohort.length > 0 ? cohort.reduce((sum, d) => sum + d.ticket_oferta, 0) / cohortSize : 0;
-    const ltv = ticketMedio * (fpcDias / 30.44);
-    const mrrAtualDaCoorte = cohortAtivos.reduce((sum, d) => sum + d.ticket_oferta, 0);
-
     const kpis = {{
-        "Assinantes na Coorte": cohortSize, "Churn Rate da Coorte": `${{churnRate.toFixed(2)}}%`,
-        "MRR Atual da Coorte": `R$ ${{mrrAtualDaCoorte.toFixed(2)}}`, "LTV da Coorte": `R$ ${{ltv.toFixed(2)}}`,
-        "Ticket Médio da Coorte": `R$ ${{ticketMedio.toFixed(2)}}`, "Tempo até Cancelar": `${{fpcDias.toFixed(1)}} dias`
+        "Assinantes na Coorte": stats.cohortSize, "Churn Rate da Coorte": `${{stats.churnRate.toFixed(2)}}%`,
+        "MRR Atual da Coorte": `R$ ${{stats.mrrAtualDaCoorte.toFixed(2)}}`, "LTV da Coorte": `R$ ${{stats.ltv.toFixed(2)}}`,
+        "Ticket Médio da Coorte": `R$ ${{stats.ticketMedio.toFixed(2)}}`, "Tempo até Cancelar": `${{stats.fpcDias.toFixed(1)}} dias`
     }};
 
     for (const [key, value] of Object.entries(kpis)) {{
@@ -151,56 +380,37 @@ function updateDashboard(startDate, endDate) {{
         kpiGrid.appendChild(card);
     }}
 
-    const cohortLifetimes = cohort.map(sub => {{
-        const endDate = sub.data_cancelamento || new Date();
-        return Math.floor(((endDate - sub.data_assinatura) / (1000 * 60 * 60 * 24)) / 30.44);
-    }});
-    const maxMonths = cohortLifetimes.length > 0 ? Math.max(...cohortLifetimes) + 1 : 1;
-    
     const firstMonth = new Date(startDate.getFullYear(), startDate.getMonth(), 1);
-    const chartLabels = Array.from(Array(maxMonths).keys()).map(i => {{
+    const chartLabels = Array.from(Array(stats.maxMonths).keys()).map(i => {{
         const date = new Date(firstMonth.getFullYear(), firstMonth.getMonth() + i, 1);
         return date.toLocaleDateString('pt-BR', {{ year: 'numeric', month: 'short' }});
     }});
     
-    const retentionData = Array(maxMonths).fill(0);
-    cohort.forEach(sub => {{
-        const endDate = sub.data_cancelamento || new Date();
-        const lifetimeMonths = Math.floor(((endDate - sub.data_assinatura) / (1000 * 60 * 60 * 24)) / 30.44);
-        for (let i = 0; i <= lifetimeMonths && i < maxMonths; i++) retentionData[i]++;
-    }});
-    const retentionPercentage = retentionData.map(count => (count / cohortSize) * 100);
-    
     if (retentionChart) retentionChart.destroy();
     retentionChart = new Chart(document.getElementById('retentionChart'), {{
         type: 'line',
         data: {{
             labels: chartLabels,
-            datasets: [{{ label: '% de Retenção da Coorte', data: retentionPercentage, borderColor: '#4bc0c0', backgroundColor: 'rgba(75, 192, 192, 0.2)', fill: true, tension: 0.1 }}]
+            datasets: [{{ label: '% de Retenção da Coorte', data: stats.retentionPercentage, borderColor: '#4bc0c0', backgroundColor: 'rgba(75, 192, 192, 0.2)', fill: true, tension: 0.1 }}]
         }},
         options: {{ responsive: true, plugins: {{ title: {{ display: true, text: 'Curva de Retenção da Coorte' }} }} }}
     }});
 
-    const mrrTimeline = Array(maxMonths).fill(0);
-    cohort.forEach(sub => {{
-        const endMonth = sub.data_cancelamento ? Math.floor(((sub.data_cancelamento - sub.data_assinatura) / (1000 * 60 * 60 * 24)) / 30.44) : maxMonths -1;
-        for (let i = 0; i <= endMonth && i < maxMonths; i++) mrrTimeline[i] += sub.ticket_oferta;
-    }});
-
     if (mrrChart) mrrChart.destroy();
     mrrChart = new Chart(document.getElementById('mrrChart'), {{
         type: 'line',
         data: {{
             labels: chartLabels,
-            datasets: [{{ label: 'MRR da Coorte (R$)', data: mrrTimeline, borderColor: '#36a2eb', backgroundColor: 'rgba(54, 162, 235, 0.2)', fill: true, tension: 0.1 }}]
+            datasets: [{{ label: 'MRR da Coorte (R$)', data: stats.mrrTimeline, borderColor: '#36a2eb', backgroundColor: 'rgba(54, 162, 235, 0.2)', fill: true, tension: 0.1 }}]
         }},
         options: {{ responsive: true, plugins: {{ title: {{ display: true, text: 'MRR Gerado pela Coorte ao Longo do Tempo' }} }} }}
     }});
 }}
 
-document.addEventListener('DOMContentLoaded', () => {{
-    const totalAtivos = data.filter(d => d.ativo).length;
-    const totalCancelados = data.filter(d => !d.ativo).length;
+document.addEventListener('DOMContentLoaded', async () => {{
+    cohortIndex = await loadData();
+    const totalAtivos = cohortIndex.totais.ativos;
+    const totalCancelados = cohortIndex.totais.cancelados;
     
     document.getElementById('global-kpi-grid').innerHTML = `
         <div class="kpi-card"><div class="kpi-title">Total de Assinantes Ativos</div><div class="kpi-value">${{totalAtivos}}</div></div>
@@ -223,20 +433,35 @@ document.addEventListener('DOMContentLoaded', () => {{
     }});
     
     updateDashboard(fp.selectedDates[0], fp.selectedDates[1]);
+    if (cohortIndex.produtos) {{
+        const seletor = document.getElementById('produto-metrica');
+        document.getElementById('produtos-section').hidden = false;
+        seletor.addEventListener('change', () => updateProdutos(cohortIndex.produtos, seletor.value));
+        updateProdutos(cohortIndex.produtos, seletor.value);
+    }}
     document.getElementById('last-update').textContent = `Dados atualizados em: {datetime.now().strftime("%d/%m/%Y %H:%M:%S")}`;
 }});
     """
 
-    with open(os.path.join(DASHBOARD_DIR, 'index.html'), 'w', encoding='utf-8') as f: f.write(html_content)
-    with open(os.path.join(DASHBOARD_DIR, 'style.css'), 'w', encoding='utf-8') as f: f.write(css_content)
-    with open(os.path.join(DASHBOARD_DIR, 'script.js'), 'w', encoding='utf-8') as f: f.write(js_content)
+    with atomic_open(os.path.join(DASHBOARD_DIR, 'index.html'), 'w', encoding='utf-8') as f: f.write(html_content)
+    with atomic_open(os.path.join(DASHBOARD_DIR, 'style.css'), 'w', encoding='utf-8') as f: f.write(css_content)
+    with atomic_open(os.path.join(DASHBOARD_DIR, 'script.js'), 'w', encoding='utf-8') as f: f.write(js_content)
+    tamanho = write_data_files(payload)
     
-    print("Ficheiros do dashboard gerados com sucesso.")
+    print(f"Ficheiros do dashboard gerados com sucesso ({DADOS_JSON}: {tamanho / 1024:.0f} KB).")
+
+def gerar_dashboard(df=None):
+    """Gera o dashboard; devolve False se não houver dados."""
+    payload = process_data_for_dashboard(df)
+    if not payload: return False
+    write_dashboard_files(payload)
+    print(f"\\n--- SUCESSO ---")
+    print(f"Dashboard de Coortes gerado!")
+    print(f"Abra o ficheiro '{os.path.abspath(os.path.join(DASHBOARD_DIR, 'index.html'))}' no seu navegador.")
+    return True
 
 if __name__ == "__main__":
-    json_data_for_js = process_data_for_dashboard()
-    if json_data_for_js:
-        write_dashboard_files(json_data_for_js)
-        print(f"\\n--- SUCESSO ---")
-        print(f"Dashboard de Coortes gerado!")
-        print(f"Abra o ficheiro '{os.path.abspath(os.path.join(DASHBOARD_DIR, 'index.html'))}' no seu navegador.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Gera o dashboard (docs/) a partir do assinaturas.csv.")
+    parser.add_argument("--profile", action="store_true", help="Grava um cProfile por etapa em out/perfis/.")
+    METRICAS.perfil = METRICAS.perfil or parser.parse_args().profile
+    if gerar_dashboard(): METRICAS.salvar('gerar_dashboard.py')
\ No newline at end of file
@@ -0,0 +1,77 @@
+# historico.py
+# -*- coding: utf-8 -*-
+# Status das assinaturas em qualquer data (as-of): contagens por status e MRR para uma lista inteira de datas
+# numa só passagem vetorizada sobre os registos normalizados do main.py, sem refazer o pipeline por data.
+import math
+from array import array
+from itertools import repeat
+
+STATUSES = ("active", "overdue", "inactive", "canceled")  # os mesmos de main.SUB_STATUSES
+_CODES = {s: i for i, s in enumerate(STATUSES)}
+
+class StatusIndex:
+    """Intervalos [criação, fim] das assinaturas por status atual, ordenados para pesquisa binária em lote.
+
+    Numa data t, uma assinatura criada depois de t é "future", uma cancelada até t é "canceled" e as outras têm o
+    status atual (o critério de main.get_subscription_status). Com fim = max(criação, cancelamento), como no
+    KpiIndex, as assinaturas de um status em t são as criadas até t menos as fechadas até t; o mesmo vale para as
+    somas dos tickets (MRR), com somas acumuladas pela mesma ordem.
+    """
+
+    def __init__(self, subs=(), tickets=None):
+        self.created, self.closed, self.tickets, self.codes = array("d"), array("d"), array("d"), array("b")
+        self._sorted = None
+        for s, ticket in zip(subs, repeat(0.0) if tickets is None else tickets): self.add(s, ticket)
+        self.seal()
+
+    def add(self, s, ticket=0.0):
+        c, x = s.created_ts, s.cancelled_ts
+        self.created.append(-math.inf if c is None else c)  # sem data de criação nunca é "future"
+        self.closed.append(math.inf if x is None else x if c is None else max(c, x))
+        self.tickets.append(ticket or 0.0)
+        self.codes.append(_CODES.get(s.status, 0))
+
+    def seal(self):
+        import numpy as np  # só quem consulta o histórico paga o import do NumPy
+        created, closed = np.frombuffer(self.created), np.frombuffer(self.closed)
+        tickets, codes = np.frombuffer(self.tickets), np.frombuffer(self.codes, dtype=np.int8)
+
+        def sorted_sums(values, weights):
+            order = np.argsort(values, kind="stable")
+            return values[order], np.concatenate(([0.0], np.cumsum(weights[order])))
+
+        self._sorted = {k: (sorted_sums(created[codes == i], tickets[codes == i]), sorted_sums(closed[codes == i], tickets[codes == i]))
+                        for i, k in enumerate(STATUSES)}
+        self._all = (np.sort(created), np.sort(closed))
+        return self
+
+    def __len__(self): return len(self.codes)
+
+    def _alive(self, status, ts, weighted=False):
+        import numpy as np
+        (created, created_sums), (closed, closed_sums) = self._sorted[status]
+        n_created, n_closed = np.searchsorted(created, ts, "right"), np.searchsorted(closed, ts, "right")
+        if weighted: return created_sums[n_created] - closed_sums[n_closed]
+        return n_created - n_closed
+
+    def counts(self, ts):
+        """{status: array} com a quantidade de assinaturas em cada status (STATUSES e "future") em cada epoch de ts."""
+        import numpy as np
+        ts = np.asarray(ts, dtype="float64")
+        out = {k: self._alive(k, ts) for k in STATUSES}
+        created, closed = self._all
+        out["canceled"] = out["canceled"] + np.searchsorted(closed, ts, "right")  # as fechadas até t contam como canceladas
+        out["future"] = len(self) - np.searchsorted(created, ts, "right")
+        return out
+
+    def mrr(self, ts, statuses=("active",)):
+        """Soma dos tickets das assinaturas nos status dados (por omissão, só as ativas) em cada epoch de ts."""
+        import numpy as np
+        ts = np.asarray(ts, dtype="float64")
+        return sum(self._alive(k, ts, weighted=True) for k in statuses)
+
+    def snapshot(self, ts):
+        """Contagens e MRR numa única data, como dict de números Python."""
+        row = {k: int(v[0]) for k, v in self.counts([ts]).items()}
+        row["mrr"] = float(self.mrr([ts])[0])
+        return row
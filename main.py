@@ -1,17 +1,29 @@
 # main.py
 # -*- coding: utf-8 -*-
+# requests/urllib3 (busca), NumPy (índice de transações) e pandas (coortes) só são importados nas etapas que os
+# usam, para que "python main.py --offline" arranque depressa e sem token.
 import os
 import json
-import csv
 import time
 import math
-import requests
-from datetime import datetime, timedelta
-from collections import defaultdict
-import pytz
-from urllib3.util.retry import Retry
-from requests.adapters import HTTPAdapter
+import random
+import argparse
+from array import array
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone as dt_timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from operator import itemgetter
+from collections import deque
+from itertools import chain, groupby, islice
 from dotenv import load_dotenv
+from base_local import LocalStore, FetchCheckpoint
+from datas import timezone, parse_epoch, parse_datetime
+from metricas import METRICAS
+import escrita
+from historico import StatusIndex
+from produtos import ProductKpis
 
 # Carrega as variáveis de ambiente dos ficheiros .env
 load_dotenv()
@@ -24,10 +36,14 @@ else:
 # =========================
 # CONFIG
 # =========================
-BASE_URL = "https://digitalmanager.guru/api/v2"
+BASE_URL = os.getenv("DMG_BASE_URL", "https://digitalmanager.guru/api/v2")
 DMG_USER_TOKEN = os.getenv("DMG_USER_TOKEN")
-if not DMG_USER_TOKEN:
-    raise ValueError("O token DMG_USER_TOKEN não foi encontrado. Verifique o seu .env ou os Secrets do GitHub.")
+
+def require_token():
+    # Só a busca na API precisa do token; os relatórios a partir da base local (--offline) não.
+    if not DMG_USER_TOKEN:
+        raise ValueError("O token DMG_USER_TOKEN não foi encontrado. Verifique o seu .env ou os Secrets do GitHub.")
+    return DMG_USER_TOKEN
 
 END_DATE   = os.getenv("END_DATE", datetime.now().strftime("%Y-%m-%d"))
 OUT_DIR = "./out"
@@ -36,44 +52,50 @@ DMG_TZ = "America/Sao_Paulo"
 PAGE_SIZE = 200
 REQUEST_TIMEOUT = (25, 120)
 API_MAX_RANGE_DAYS = 180
-MIN_DATE_ALL = datetime.now().strftime("%Y-01-01")
+MIN_DATE_ALL = os.getenv("START_DATE", datetime.now().strftime("%Y-01-01"))  # como o END_DATE, fixável para refazer um período passado
 SUBS_CREATED_AT_INI = MIN_DATE_ALL
+STORE_PATH = os.getenv("STORE_PATH", os.path.join(OUT_DIR, "dados.sqlite"))
+SYNC_LOOKBACK_DAYS = int(os.getenv("SYNC_LOOKBACK_DAYS", "7"))
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "20"))
+# Divisão adaptativa das janelas densas: só compensa com o histórico concentrado em poucos meses; com os dados
+# espalhados, dobra os pedidos (benchmark.py chunks/fetch), por isso fica desligada por omissão.
+ADAPTIVE_SPLIT = os.getenv("ADAPTIVE_SPLIT", "") not in ("", "0")
+ADAPTIVE_MIN_DAYS = int(os.getenv("ADAPTIVE_MIN_DAYS", "7"))  # menor janela criada pela divisão adaptativa; 0 desliga
+OUTPUT_PARQUET = os.getenv("OUTPUT_PARQUET", "") not in ("", "0")  # assinaturas.parquet ao lado do CSV (precisa de pyarrow)
+SNAPSHOT = os.getenv("SNAPSHOT", "") not in ("", "0")  # grava o snapshot das respostas da API de cada execução
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(OUT_DIR, "snapshots"))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(OUT_DIR, "busca_checkpoint.sqlite"))  # páginas da busca em curso; vazio desliga
+NETWORK_MAX_RETRIES = int(os.getenv("NETWORK_MAX_RETRIES", "8"))  # falhas de rede seguidas aceites na mesma página
+THROTTLE_MAX_RETRIES = int(os.getenv("THROTTLE_MAX_RETRIES", "6"))  # 429 seguidos aceites na mesma página (o Retry(total=6) de antes)
+NETWORK_RETRY_BUDGET = int(os.getenv("NETWORK_RETRY_BUDGET", "200"))  # retentativas de rede em toda a busca, somando os workers
+NETWORK_BACKOFF_BASE = float(os.getenv("NETWORK_BACKOFF_BASE", "1"))  # segundos; dobra a cada falha seguida
+NETWORK_BACKOFF_MAX = float(os.getenv("NETWORK_BACKOFF_MAX", "60"))
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH")  # cache em disco das páginas da API (ex.: no .env.local); vazio desliga
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "200"))
+HTTP_CACHE_TTL_RECENT = int(os.getenv("HTTP_CACHE_TTL_RECENT", "3600"))  # segundos, janelas que incluem os últimos dias
+HTTP_CACHE_TTL_HISTORICAL = int(os.getenv("HTTP_CACHE_TTL_HISTORICAL", str(7 * 86400)))  # segundos, janelas já fechadas
 
 # =========================
 # FUNÇÕES AUXILIARES DE DATA E HORA
 # =========================
-def _tz(): return pytz.timezone(DMG_TZ)
+def _tz(): return timezone(DMG_TZ)
 
 def to_tz(dt_str, tzname=DMG_TZ):
     if not dt_str: return None
-    tz = pytz.timezone(tzname)
+    tz = timezone(tzname)
     fmt = "%Y-%m-%d %H:%M:%S" if " " in dt_str else "%Y-%m-%d"
     dt_naive = datetime.strptime(dt_str[:19], fmt) if " " in dt_str else datetime.strptime(dt_str[:10], fmt)
     return tz.localize(dt_naive)
 
-def from_iso_any(s):
-    if s in (None, "", 0): return None
-    tz = _tz()
-    if isinstance(s, (int, float)):
-        ts = float(s); ts = ts/1000.0 if ts > 1e12 else ts
-        return datetime.fromtimestamp(ts, tz)
-    if isinstance(s, str):
-        s2 = s.strip()
-        if not s2: return None
-        if s2.replace(".", "", 1).isdigit():
-            ts = float(s2); ts = ts/1000.0 if ts > 1e12 else ts
-            return datetime.fromtimestamp(ts, tz)
-        s2 = s2.replace("T", " ").replace("Z", "")
-        if "." in s2: s2 = s2.split(".")[0]
-        base = s2[:19] if len(s2) >= 19 else s2[:10]
-        fmt  = "%Y-%m-%d %H:%M:%S" if len(base) > 10 else "%Y-%m-%d"
-        try: return tz.localize(datetime.strptime(base, fmt))
-        except: return None
-    return None
+# Leitura das datas da API: ver datas.py (caminho rápido com memo, resultados iguais aos do strptime + localize).
+def from_iso_any(s): return parse_datetime(s, DMG_TZ)
+def epoch_any(s): return parse_epoch(s, DMG_TZ)
 
 def end_of_day(date_str): return to_tz(date_str).replace(hour=23, minute=59, second=59)
 def parse_date(dstr): return datetime.strptime(dstr, "%Y-%m-%d").date()
 def fmt_date(dt): return dt.strftime("%Y-%m-%d") if dt else ""
+def fmt_ts(ts): return datetime.fromtimestamp(ts, _tz()).strftime("%Y-%m-%d") if ts is not None else ""
 
 def chunk_date_strings(start_date_str, end_date_str, max_span_days=API_MAX_RANGE_DAYS):
     s, e, cur = parse_date(start_date_str), parse_date(end_date_str), parse_date(start_date_str)
@@ -85,38 +107,173 @@ def chunk_date_strings(start_date_str, end_date_str, max_span_days=API_MAX_RANGE
 # =========================
 # CLIENTE HTTP ROBUSTO
 # =========================
+class RateLimiter:
+    """Token bucket partilhado por todos os workers (rate <= 0 desliga o limite); um 429 pausa todos até ao Retry-After."""
+
+    def __init__(self, rate=RATE_LIMIT_RPS, burst=None):
+        self.rate, self.capacity = rate, burst or max(1.0, rate)
+        self.tokens, self.updated, self.blocked_until = self.capacity, time.monotonic(), 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until: wait = self.blocked_until - now
+                elif self.rate <= 0: return
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate); self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1; return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+def _retry_after_seconds(value, default=5.0):
+    if not value: return default
+    try: return max(0.0, float(value))
+    except ValueError: pass
+    from email.utils import parsedate_to_datetime
+    try: return max(0.0, (parsedate_to_datetime(value) - datetime.now(dt_timezone.utc)).total_seconds())
+    except (TypeError, ValueError): return default
+
+def _backoff_seconds(attempt, base=None, cap=None):
+    # Backoff exponencial com "full jitter": um valor ao acaso até base * 2^(n-1), limitado a cap, para que os
+    # workers que falharam ao mesmo tempo não voltem todos no mesmo instante.
+    base = NETWORK_BACKOFF_BASE if base is None else base
+    cap = NETWORK_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+class NetworkRetriesExhausted(RuntimeError):
+    """Falhas de rede a mais numa página ou na busca inteira; as páginas já recebidas ficam no checkpoint."""
+
+@lru_cache(maxsize=None)
+def _counting_retry_class():
+    from urllib3.util.retry import Retry
+
+    class CountingRetry(Retry):
+        # As retentativas de 5xx/rede do urllib3 ficam fora do nosso código; contá-las aqui mantém-nas nas métricas.
+        def increment(self, *args, **kwargs):
+            METRICAS.contar("retentativas_urllib3")
+            return super().increment(*args, **kwargs)
+    return CountingRetry
+
 class DMGClient:
-    def __init__(self, token, base_url=BASE_URL):
+    def __init__(self, token, base_url=BASE_URL, limiter=None, cache=None, snapshot=None):
         self.base_url = base_url.rstrip("/")
-        self.session = requests.Session()
-        self.session.headers.update({"Authorization": f"Bearer {token}", "Accept": "application/json", "Content-Type": "application/json", "User-Agent": "kpis-report-script/final"})
-        retry = Retry(total=6, connect=4, read=4, backoff_factor=0.8, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
-        adapter = HTTPAdapter(max_retries=retry)
-        self.session.mount("https://", adapter)
-    
-    def paginate(self, path, params=None):
+        self.token = token
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache  # cache_http.ResponseCache opcional
+        self.revalidate = frozenset()  # paths cujas páginas em cache passam sempre por um pedido condicional, mesmo válidas
+        self.snapshot = snapshot  # snapshots.SnapshotWriter opcional: cada página recebida fica no arquivo
+        self.retry_budget = NETWORK_RETRY_BUDGET  # partilhado pelos workers; ver _network_retry
+        self._budget_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # Uma sessão por thread: requests.Session não é garantidamente thread-safe.
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.headers.update({"Authorization": f"Bearer {self.token}", "Accept": "application/json", "Content-Type": "application/json", "User-Agent": "kpis-report-script/final"})
+            # O 429 fica fora do Retry do urllib3 para ser tratado pelo limitador partilhado; sem
+            # respect_retry_after_header=False, o urllib3 repetia sozinho qualquer 429 que trouxesse Retry-After.
+            retry = _counting_retry_class()(total=6, connect=4, read=4, backoff_factor=0.8, status_forcelist=[500, 502, 503, 504], allowed_methods=["GET"],
+                                            respect_retry_after_header=False)
+            adapter = HTTPAdapter(max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)  # ex.: mock_guru.py local via DMG_BASE_URL
+            self._local.session = session
+        return session
+
+    def iter_pages(self, path, params=None, cursor=None, page_count=1):
+        """Percorre o cursor e devolve (itens, has_more_pages, next_cursor) de cada página.
+
+        cursor e page_count permitem continuar a partir de uma página já recebida (ex.: a de um checkpoint).
+        """
         params = dict(params or {}); params.setdefault("per_page", PAGE_SIZE)
-        cursor, page_count = None, 1
         while True:
             current_params = params.copy()
             if cursor: current_params['cursor'] = cursor
-            try:
-                r = self.session.request("GET", self.base_url + path, params=current_params, timeout=REQUEST_TIMEOUT)
-                if not r.ok: raise RuntimeError(f"HTTP {r.status_code} {self.base_url + path} -> {r.text[:400]}")
-                data = r.json()
-            except (requests.ReadTimeout, requests.ConnectionError) as e:
-                print(f"  -> Erro de rede na página {page_count}, a tentar novamente... ({e})"); time.sleep(5); continue
+            data = self._get_page(path, current_params, page_count)
             
             if not isinstance(data, dict): break
             items = data.get("data", [])
-            print(f"    -> Página {page_count}: Encontrados {len(items)} itens.")
+            print(f"    -> {path} página {page_count}: Encontrados {len(items)} itens.")
             if not items: break
-            for it in items: yield it
-            if data.get('has_more_pages'):
+            if self.snapshot: self.snapshot.add_page(path, current_params, page_count, items)
+            has_more = bool(data.get('has_more_pages'))
+            yield items, has_more, data.get('next_cursor') if has_more else None
+            if has_more:
                 cursor, page_count = data.get('next_cursor'), page_count + 1
-                time.sleep(0.05)
             else: break
 
+    def _get_page(self, path, params, page_count):
+        import requests
+        # Com cache: uma página ainda válida não vai à rede; uma expirada é revalidada com If-None-Match/If-Modified-Since.
+        cached = key = None
+        if self.cache:
+            key = self.cache.key(path, params)
+            cached = self.cache.get(key, revalidate=path in self.revalidate)
+            if cached and cached.fresh() and path not in self.revalidate:
+                METRICAS.contar("paginas_cache", endpoint=path)
+                return json.loads(cached.body)
+        failures = throttled = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                r = self.session.request("GET", self.base_url + path, params=params, timeout=REQUEST_TIMEOUT, headers=cached.conditional_headers() if cached else None)
+                if r.status_code == 429:
+                    throttled += 1
+                    wait = _retry_after_seconds(r.headers.get("Retry-After"))
+                    self._spend_retry(path, page_count, throttled, THROTTLE_MAX_RETRIES, "respostas 429", f"HTTP 429 com Retry-After de {wait:.1f}s")
+                    print(f"  -> Limite de pedidos atingido em '{path}', pausa de {wait:.1f}s para todos os workers.")
+                    METRICAS.contar("pausas_429", endpoint=path)
+                    self.limiter.pause(wait); continue
+                if r.status_code == 304 and cached:
+                    METRICAS.contar("paginas_304", endpoint=path)
+                    self.cache.touch(key, self.cache.ttl(params))
+                    return json.loads(cached.body)
+                if not r.ok: raise RuntimeError(f"HTTP {r.status_code} {self.base_url + path} -> {r.text[:400]}")
+                data = r.json()
+            except (requests.ReadTimeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                # ChunkedEncodingError: a ligação caiu a meio do corpo da resposta (o Retry do urllib3 não cobre esse caso).
+                failures += 1
+                METRICAS.contar("erros_rede", endpoint=path)
+                wait = self._network_retry(path, page_count, failures, e)
+                print(f"  -> Erro de rede na página {page_count} de '{path}' (falha {failures}), nova tentativa em {wait:.1f}s... ({e})")
+                time.sleep(wait); continue
+            METRICAS.contar("paginas", endpoint=path); METRICAS.contar("bytes", len(r.content), endpoint=path)
+            if self.cache:
+                self.cache.put(key, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"), self.cache.ttl(params))
+            return data
+
+    def _network_retry(self, path, page_count, failures, error):
+        self._spend_retry(path, page_count, failures, NETWORK_MAX_RETRIES, "falhas de rede", error)
+        METRICAS.contar("retentativas_rede", endpoint=path)
+        return _backoff_seconds(failures)
+
+    def _spend_retry(self, path, page_count, failures, max_failures, kind, error):
+        # Cada falha (de rede ou 429) gasta uma retentativa da página e uma do orçamento da busca; esgotado qualquer
+        # um, desiste-se (com o checkpoint, a execução seguinte recomeça das páginas já recebidas).
+        with self._budget_lock:
+            self.retry_budget -= 1
+            budget = self.retry_budget
+        if failures > max_failures or budget < 0:
+            motivo = f"{failures} {kind} seguidas na página {page_count}" if failures > max_failures else f"esgotado o orçamento de {NETWORK_RETRY_BUDGET} retentativas da busca"
+            raise NetworkRetriesExhausted(f"Retentativas esgotadas em '{path}': {motivo}. Última falha: {error}")
+
+    def paginate(self, path, params=None):
+        for items, _, _ in self.iter_pages(path, params):
+            yield from items
+
 # =========================
 # FUNÇÕES DE EXTRAÇÃO DE DADOS
 # =========================
@@ -145,115 +302,581 @@ def extract_net_amount(tx):
             except (ValueError, TypeError): continue
     return 0.0
 
-def sub_created_at(sub):
-    return from_iso_any(sub_get(sub, "created_at","started_at"))
+def sub_created_ts(sub):
+    return epoch_any(sub_get(sub, "created_at","started_at"))
 
-def sub_cancelled_at(sub):
-    dt = from_iso_any(sub_get(sub, "cancelled_at"))
-    if dt: return dt
+def sub_cancelled_ts(sub):
+    ts = epoch_any(sub_get(sub, "cancelled_at"))
+    if ts is not None: return ts
     if (sub_get(sub, "last_status") or "").lower() == "canceled":
-        return from_iso_any(sub_get(sub, "last_status_at"))
+        return epoch_any(sub_get(sub, "last_status_at"))
     return None
 
-def get_subscription_status(sub, asof_dt):
-    if sub_created_at(sub) and sub_created_at(sub) > asof_dt: return "future"
-    if sub_cancelled_at(sub) and sub_cancelled_at(sub) <= asof_dt: return "canceled"
-    last_status = (sub_get(sub, "last_status") or "").lower()
+def tx_confirmed_ts(tx): return epoch_any(_from_nested(tx, ["dates", "confirmed_at"]))
+
+def _status_from_last(last_status):
+    last_status = (last_status or "").lower()
     if last_status in ["pastdue", "overdue", "unpaid", "delinquent"]: return "overdue"
     if last_status in ["inactive", "paused", "suspended"]: return "inactive"
     if last_status == "canceled": return "canceled"
     return "active"
 
+def _join_key(v): return str(v) if v not in (None, "") else None
+
+# =========================
+# MODELO NORMALIZADO (DATAS LIDAS UMA ÚNICA VEZ)
+# =========================
+# Logo após a busca, cada item da API é convertido num registo compacto com as datas já em epoch.
+# Todos os relatórios leem destes registos; os dicts originais podem ser descartados.
+SUB_STATUSES = ("active", "overdue", "inactive", "canceled")
+
+class SubRecord:
+    __slots__ = ("id", "code", "created_ts", "cancelled_ts", "status", "value", "charged_times", "contact_name", "product_name")
+
+    def __init__(self, id, code, created_ts, cancelled_ts, status, value, charged_times, contact_name, product_name):
+        self.id, self.code, self.created_ts, self.cancelled_ts, self.status = id, code, created_ts, cancelled_ts, status
+        self.value, self.charged_times, self.contact_name, self.product_name = value, charged_times, contact_name, product_name
+
+class TxRecord:
+    __slots__ = ("id", "sub_id", "confirmed_ts", "net_amount")
+
+    def __init__(self, id, sub_id, confirmed_ts, net_amount):
+        self.id, self.sub_id, self.confirmed_ts, self.net_amount = id, sub_id, confirmed_ts, net_amount
+
+def normalize_subscription(sub):
+    return SubRecord(_join_key(sub_get(sub, "id")), sub_get(sub, "subscription_code", "code", "id"), sub_created_ts(sub), sub_cancelled_ts(sub),
+                     _status_from_last(sub_get(sub, "last_status")), sub_get(sub, "value"), sub_get(sub, "charged_times", 0),
+                     _from_nested(sub, ["contact", "name"]), _from_nested(sub, ["product", "name"]))
+
+def normalize_transaction(tx):
+    sid = _from_nested(tx, ["subscription", "id"]) or sub_get(tx, "subscription_id")
+    return TxRecord(sub_get(tx, "id"), _join_key(sid), tx_confirmed_ts(tx), extract_net_amount(tx))
+
+def normalize_subscriptions(subs): return [normalize_subscription(s) for s in subs]
+def normalize_transactions(txs): return [normalize_transaction(t) for t in txs]
+
+def build_report_state(subs, txs):
+    """Normaliza os itens à medida que chegam e alimenta os agregadores; nenhum dict da API fica em memória.
+
+    Devolve (registos de assinaturas, TxIndex selado, KpiIndex selado): das transações só ficam as colunas
+    compactas do índice e os pares (ts, valor) da receita.
+    """
+    sub_records, tx_index, index = [], TxIndex(), KpiIndex()
+    for item in subs:
+        rec = normalize_subscription(item)
+        sub_records.append(rec); index.add_subscription(rec)
+    for item in txs:
+        rec = normalize_transaction(item)
+        tx_index.add(rec); index.add_transaction(rec)
+    return sub_records, tx_index.seal(), index.seal()
+
+def get_subscription_status(sub, asof_ts):
+    if sub.created_ts is not None and sub.created_ts > asof_ts: return "future"
+    if sub.cancelled_ts is not None and sub.cancelled_ts <= asof_ts: return "canceled"
+    return sub.status
+
 # =========================
 # LÓGICA PRINCIPAL
 # =========================
-def fetch_and_generate_reports():
-    client = DMGClient(DMG_USER_TOKEN)
-    
-    print("\nPASSO 1: Carregando todas as assinaturas...")
-    subs_all = list(fetch_with_chunks(client, "/subscriptions", "created_at_ini", "created_at_end", SUBS_CREATED_AT_INI, END_DATE))
-    print(f"-> {len(subs_all)} assinaturas encontradas.")
-
-    print("\nPASSO 2: Carregando todo o histórico de transações...")
-    txs_all = list(fetch_with_chunks(client, "/transactions", "confirmed_at_ini", "confirmed_at_end", MIN_DATE_ALL, END_DATE))
-    print(f"-> {len(txs_all)} transações encontradas.")
-
-    generate_detailed_csv(subs_all, txs_all, END_DATE)
-    generate_kpi_csvs(subs_all, txs_all, SUBS_CREATED_AT_INI, END_DATE)
-
-def fetch_with_chunks(client, path, date_key_ini, date_key_end, start_date, end_date):
-    print(f"Iniciando busca em '{path}' por períodos de {API_MAX_RANGE_DAYS} dias...")
-    unique_items = {}
+def open_response_cache(path=HTTP_CACHE_PATH):
+    if not path: return None
+    from cache_http import ResponseCache
+    return ResponseCache(path, max_bytes=int(HTTP_CACHE_MAX_MB * 1024 * 1024), ttl_recent=HTTP_CACHE_TTL_RECENT,
+                         ttl_historical=HTTP_CACHE_TTL_HISTORICAL, closed_after_days=SYNC_LOOKBACK_DAYS)
+
+def fetch_and_generate_reports(full_resync=False, workers=FETCH_WORKERS, offline=False, parquet=OUTPUT_PARQUET,
+                               snapshot=SNAPSHOT, from_snapshot=None):
+    """Sincroniza, gera os CSVs e devolve o DataFrame do assinaturas.csv (o gerar_dashboard.py aceita-o sem reler o ficheiro).
+
+    offline=True não acede à API (nem precisa do token): os relatórios saem do que já está na base local.
+    parquet=True grava também o assinaturas.parquet, que o coortes.py e o gerar_dashboard.py leem no lugar do CSV.
+    snapshot=True guarda em SNAPSHOT_DIR as páginas recebidas e os itens usados nos relatórios (snapshots.py);
+    from_snapshot (ID ou "ultimo") refaz os relatórios a partir de um snapshot, com as datas da execução que o
+    gravou, sem API, token nem base local.
+    Devolve None se, offline, a base local estiver vazia, ou se o snapshot pedido não existir.
+    """
+    endpoints = [SUBSCRIPTIONS_ENDPOINT + (SUBS_CREATED_AT_INI,), TRANSACTIONS_ENDPOINT + (MIN_DATE_ALL,)]
+    start_date, end_date = SUBS_CREATED_AT_INI, END_DATE
+    cache = store = archive = None
+    if from_snapshot:
+        import snapshots
+        try:
+            reader = snapshots.SnapshotReader(SNAPSHOT_DIR, from_snapshot)
+        except FileNotFoundError as e:
+            print(f"ERRO: {e}")
+            return None
+        start_date, end_date = reader.header["inicio"], reader.header["fim"]
+        print(f"\nPASSO 1: Sem acesso à API: a usar o snapshot '{reader.id}' gravado em {reader.header['criado_em']} (dados até {end_date}).")
+        subs_iter, txs_iter = [reader.items(path) for path, _, _, _, _ in endpoints]
+    elif offline:
+        store = LocalStore(STORE_PATH)
+        if not store.count(SUBSCRIPTIONS_ENDPOINT[0]):
+            store.close()
+            print(f"ERRO: A base local '{STORE_PATH}' está vazia. Execute o 'main.py' sem --offline primeiro.")
+            return None
+        print(f"\nPASSO 1: Modo offline, sem acesso à API: a usar a base local '{STORE_PATH}'.")
+        subs_iter, txs_iter = [store.items(path, start, END_DATE) for path, _, _, _, start in endpoints]
+    if snapshot and not from_snapshot:
+        import snapshots
+        archive = snapshots.SnapshotWriter(SNAPSHOT_DIR)
+    try:
+        if not (from_snapshot or offline):
+            client = DMGClient(require_token(), base_url=BASE_URL, cache=open_response_cache(), snapshot=archive)
+            cache = client.cache
+            # As páginas de janelas fechadas valem dias no cache; o que é buscado por inteiro para apanhar mudanças
+            # (as assinaturas sempre, tudo com --full-resync) é revalidado com a API em vez de sair do cache.
+            client.revalidate = frozenset(path for path, _, _, _, _ in endpoints) if full_resync else frozenset(ALWAYS_FULL_SYNC)
+            store = LocalStore(STORE_PATH)
+            checkpoint = FetchCheckpoint(CHECKPOINT_PATH) if CHECKPOINT_PATH else None
+            print("\nPASSO 1: Sincronizando assinaturas e histórico de transações...")
+            try:
+                with METRICAS.etapa("sincronizacao"):
+                    subs_iter, txs_iter = sync_endpoints(client, store, endpoints, END_DATE, full_resync, workers=workers, checkpoint=checkpoint)
+            except NetworkRetriesExhausted:
+                if checkpoint: print(f"ERRO: Busca interrompida; as páginas já recebidas ficaram em '{CHECKPOINT_PATH}' e a próxima execução continua daí.")
+                raise
+            finally:
+                if checkpoint: checkpoint.close()
+        if store: print(f"-> {store.count(SUBSCRIPTIONS_ENDPOINT[0])} assinaturas e {store.count(TRANSACTIONS_ENDPOINT[0])} transações na base local.")
+        if archive:  # os itens passam pelo snapshot a caminho da normalização
+            subs_iter, txs_iter = [archive.items(path, items) for (path, _, _, _, _), items in zip(endpoints, (subs_iter, txs_iter))]
+
+        print("\nPASSO 2: Normalizando registos e agregando os relatórios...")
+        with METRICAS.etapa("normalizacao") as etapa:
+            subs, tx_index, index = build_report_state(subs_iter, txs_iter)
+            etapa.update(assinaturas=len(subs), transacoes=len(tx_index.ts))
+        if archive:
+            with METRICAS.etapa("snapshot") as etapa:
+                etapa.update(archive.stats)
+                print(f"-> Snapshot '{archive.close(inicio=start_date, fim=end_date)}' gravado em '{SNAPSHOT_DIR}' "
+                      f"({archive.stats['novos']} de {archive.stats['registos']} registos ainda não arquivados).")
+    except BaseException:
+        if archive: archive.abort()
+        raise
+    if store: store.close()
+    if cache:
+        print(cache.summary()); cache.close()
+
+    cols = write_reports(subs, tx_index, index, start_date, end_date)
+    del subs, tx_index, index
+    with METRICAS.etapa("relatorio_coortes"):
+        import coortes  # pandas só é carregado para esta etapa
+        df = detailed_frame(cols); del cols
+        coortes.generate_cohort_csvs(df, end_date, OUT_DIR)
+    if parquet:
+        with METRICAS.etapa("relatorio_parquet"):
+            path = os.path.join(OUT_DIR, "assinaturas.parquet")
+            if escrita.write_parquet(df, path):
+                print(f"-> Cópia em Parquet gravada em '{path}'.")
+            else:
+                print("  -> Parquet pedido, mas nem pyarrow nem fastparquet estão instalados: só o CSV foi gravado.")
+    return df
+
+def sub_created_date(sub): return fmt_ts(sub_created_ts(sub)) or None
+def tx_confirmed_date(tx): return fmt_ts(tx_confirmed_ts(tx)) or None
+
+# (path, parâmetro início, parâmetro fim, data do item na base local)
+SUBSCRIPTIONS_ENDPOINT = ("/subscriptions", "created_at_ini", "created_at_end", sub_created_date)
+TRANSACTIONS_ENDPOINT = ("/transactions", "confirmed_at_ini", "confirmed_at_end", tx_confirmed_date)
+
+# A API só filtra as assinaturas por created_at: um cancelamento ou mudança de status de uma assinatura antiga nunca
+# cai na janela incremental, por isso /subscriptions volta a ser buscado por inteiro em cada execução. A sincronização
+# incremental fica para /transactions, o endpoint grande, em que uma transação confirmada não volta a mudar de data.
+ALWAYS_FULL_SYNC = {"/subscriptions"}
+
+def _sync_start(store, path, start_date, end_date, full_resync, lookback_days):
+    stored_start, high_water = store.sync_state(path)
+    if full_resync or path in ALWAYS_FULL_SYNC or not high_water or start_date < stored_start:
+        print(f"  -> Sincronização completa de '{path}' desde {start_date}.")
+        store.clear(path)
+        return start_date
+    fetch_start = max(start_date, (parse_date(min(high_water, end_date)) - timedelta(days=lookback_days)).strftime("%Y-%m-%d"))
+    print(f"  -> Sincronização incremental de '{path}' desde {fetch_start} (marca de água {high_water}, look-back de {lookback_days} dias).")
+    return fetch_start
+
+def sync_endpoints(client, store, endpoints, end_date, full_resync=False, lookback_days=None, workers=FETCH_WORKERS, adaptive=None, stats=None, checkpoint=None):
+    """Busca só a janela recente (desde a marca de água menos o look-back) de cada endpoint e junta-a à base local;
+    os de ALWAYS_FULL_SYNC são sempre buscados por inteiro.
+
+    endpoints é uma lista de (path, date_key_ini, date_key_end, date_of, start_date); as janelas de todos os
+    endpoints partilham o mesmo pool de workers. A divisão adaptativa segue ADAPTIVE_SPLIT quando adaptive é None.
+    Devolve, por endpoint, um iterador sobre os itens guardados: a base local tem de continuar aberta enquanto é lido.
+    Com checkpoint (base_local.FetchCheckpoint), as páginas de uma busca interrompida não voltam a ser pedidas;
+    o checkpoint de cada endpoint é descartado quando os itens ficam gravados na base local.
+    """
+    lookback_days = SYNC_LOOKBACK_DAYS if lookback_days is None else lookback_days
+    adaptive = ADAPTIVE_SPLIT if adaptive is None else adaptive
+    starts = [_sync_start(store, path, start_date, end_date, full_resync, lookback_days) for path, _, _, _, start_date in endpoints]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Uma única fila de janelas para todos os endpoints, com uma janela por worker submetida à frente da que está
+        # a ser gravada; as do endpoint seguinte entram na fila assim que as do anterior se esgotam.
+        jobs = chain.from_iterable(((path, job) for job in chunk_jobs(executor, client, path, key_ini, key_end, fetch_start, end_date, adaptive, checkpoint))
+                                   for (path, key_ini, key_end, _, _), fetch_start in zip(endpoints, starts))
+        by_endpoint = groupby(submit_ahead(jobs, workers), key=itemgetter(0))
+        group = next(by_endpoint, None)
+        results = []
+        for path, _, _, date_of, start_date in endpoints:
+            futures = (future for _, future in group[1]) if group and group[0] == path else ()
+            changed = store.upsert(path, iter_chunk_items(futures, stats), date_of)
+            if futures: group = next(by_endpoint, None)
+            store.set_sync_state(path, start_date, end_date)
+            if checkpoint: checkpoint.finish(path)
+            print(f"  -> {changed} itens recebidos e gravados em '{path}'.")
+            METRICAS.contar("itens_gravados", changed, endpoint=path)
+            results.append(store.items(path, start_date, end_date))
+    return results
+
+def sync_endpoint(client, store, path, date_key_ini, date_key_end, date_of, start_date, end_date, full_resync=False, lookback_days=None, workers=FETCH_WORKERS):
+    return sync_endpoints(client, store, [(path, date_key_ini, date_key_end, date_of, start_date)], end_date, full_resync, lookback_days, workers)[0]
+
+def split_window(ini, end, min_days=None):
+    """Divide uma janela densa em duas metades; devolve [] se já não tiver dias suficientes para dividir."""
+    min_days = ADAPTIVE_MIN_DAYS if min_days is None else min_days
+    d_ini, d_end = parse_date(ini), parse_date(end)
+    span = (d_end - d_ini).days + 1
+    if min_days <= 0 or span < 2 * min_days: return []
+    mid = d_ini + timedelta(days=span // 2)
+    return [(ini, (mid - timedelta(days=1)).strftime("%Y-%m-%d")), (mid.strftime("%Y-%m-%d"), end)]
+
+def _fetch_window(executor, client, path, date_key_ini, date_key_end, ini, end, adaptive, chain=0, checkpoint=None):
+    # Devolve (itens, futures das sub-janelas, páginas sequenciais até aqui). No modo adaptativo, uma janela
+    # cuja primeira página já indica mais páginas é dividida e as metades vão para o pool, em vez de
+    # seguir o cursor em série; as janelas esparsas continuam a custar uma única página.
+    # Com checkpoint, cada página é gravada assim que chega e uma janela já começada continua do cursor gravado.
+    def split(halves):
+        return [executor.submit(_fetch_window, executor, client, path, date_key_ini, date_key_end, a, b, adaptive, chain + 1, checkpoint) for a, b in halves]
+
+    with METRICAS.janela(endpoint=path, inicio=ini, fim=end) as janela:
+        items, page_count, cursor = [], 0, None
+        saved = checkpoint.window(path, ini, end) if checkpoint else None
+        if saved:
+            status, cursor, page_count, items = saved
+            janela["paginas_retomadas"] = page_count
+            METRICAS.contar("paginas_retomadas", page_count, endpoint=path)
+            if status != "partial":
+                janela.update(itens=len(items), dividida=status == "split")
+                # min_days=1 dá as mesmas metades da divisão gravada, mesmo que ADAPTIVE_MIN_DAYS tenha mudado entretanto.
+                if status == "split": return items, split(split_window(ini, end, min_days=1)), chain + 1
+                return items, [], chain + page_count
+            print(f"  -> Retomando período: {ini} a {end} ({path}) na página {page_count + 1}, {len(items)} itens já recebidos")
+        else:
+            print(f"  -> Buscando período: {ini} a {end} ({path})")
+        pages = client.iter_pages(path, {date_key_ini: ini, date_key_end: end}, cursor, page_count + 1)
+        for page_items, has_more, next_cursor in pages:
+            items.extend(page_items); page_count += 1
+            halves = split_window(ini, end) if adaptive and page_count == 1 and has_more else []
+            if checkpoint:
+                status = "split" if halves else "partial" if has_more else "done"
+                checkpoint.save_page(path, ini, end, page_count, page_items, next_cursor, status)
+            if halves:
+                pages.close(); janela.update(itens=len(items), dividida=True)
+                return items, split(halves), chain + 1
+        if checkpoint and page_count == 0:
+            checkpoint.save_page(path, ini, end, 1, [], None, "done")  # janela vazia: também não precisa de ser repetida
+        janela["itens"] = len(items)
+        return items, [], chain + page_count
+
+def chunk_jobs(executor, client, path, date_key_ini, date_key_end, start_date, end_date, adaptive=False, checkpoint=None):
+    """Uma função por janela de path (pela ordem cronológica) que a submete ao pool e devolve o future; o checkpoint
+    é aberto quando a primeira é pedida."""
+    print(f"Iniciando busca em '{path}' por períodos de {API_MAX_RANGE_DAYS} dias{' (divisão adaptativa)' if adaptive else ''}...")
+    if checkpoint:
+        checkpoint.begin(path, start_date, end_date)
+        saved = checkpoint.progress(path)
+        if saved:
+            done = sum(1 for _, _, status, _, _ in saved if status != "partial")
+            print(f"  -> Checkpoint de uma busca interrompida: {len(saved)} janelas de '{path}' já começadas ({done} completas, "
+                  f"{sum(w[3] for w in saved)} páginas, {sum(w[4] for w in saved)} itens) serão reaproveitadas.")
     for ini, end in chunk_date_strings(start_date, end_date):
-        print(f"  -> Buscando período: {ini} a {end}")
-        params = {date_key_ini: ini, date_key_end: end}
-        for item in client.paginate(path, params):
-            item_id = item.get("id")
-            if item_id:
-                unique_items[item_id] = item
-    return list(unique_items.values())
+        yield partial(executor.submit, _fetch_window, executor, client, path, date_key_ini, date_key_end, ini, end, adaptive, 0, checkpoint)
+
+def submit_ahead(jobs, ahead):
+    """Chama os jobs ((chave, função que submete uma janela)) de modo a ter no máximo ahead futures submetidos à
+    frente do que está a ser lido, e devolve (chave, future) pela mesma ordem. O job seguinte só é chamado quando o
+    consumidor pede um future: os payloads retidos nos futures ficam limitados a ahead janelas, e não ao histórico."""
+    jobs, pending = iter(jobs), deque()
+    for key, job in islice(jobs, max(1, ahead)): pending.append((key, job()))
+    while pending:
+        head = pending.popleft()
+        for key, job in islice(jobs, 1): pending.append((key, job()))
+        yield head
+
+def iter_chunk_items(futures, stats=None):
+    # Devolve os itens das janelas (e sub-janelas) pela ordem cronológica, sem deduplicar: o upsert da base local
+    # fica com a última versão de cada id na posição da primeira, como fazia o dict de unique_items.
+    # A lista de cada janela é esvaziada logo a seguir, para que os payloads não fiquem presos nos futures.
+    for future in futures:
+        items, children, chain = future.result()
+        if stats is not None:
+            stats["windows"] = stats.get("windows", 0) + 1
+            stats["critical_path_pages"] = max(stats.get("critical_path_pages", 0), chain)
+        for item in items:
+            if item.get("id"): yield item
+        items.clear()
+        yield from iter_chunk_items(children, stats)
+
+class TxIndex:
+    """Tabela única das transações (chave da assinatura, confirmed_at, valor) em colunas compactas.
+
+    seal() ordena a tabela por (assinatura, confirmed_at, ordem de chegada) com um argsort do NumPy e resolve, de
+    uma vez para todas as assinaturas, a quantidade de transações, o primeiro e o último pagamento e o último ticket.
+    """
+
+    def __init__(self, txs=()):
+        self.codes, self.sub_code, self.ts, self.amount = {}, array("q"), array("d"), array("d")
+        self.resolved = ([], [], [], [])
+        for tx in txs: self.add(tx)
+        self.seal()
+
+    def add(self, tx):
+        if not tx.sub_id: return
+        self.sub_code.append(self.codes.setdefault(tx.sub_id, len(self.codes)))
+        self.ts.append(tx.confirmed_ts if tx.confirmed_ts is not None else math.nan)
+        self.amount.append(tx.net_amount)
+
+    def seal(self):
+        if not self.codes: return self
+        import numpy as np  # só esta etapa precisa do NumPy
+        code, ts, amount = np.frombuffer(self.sub_code, dtype=np.int64), np.frombuffer(self.ts), np.frombuffer(self.amount)
+        valid = ~np.isnan(ts)
+        # As transações sem data ficam no início do grupo, logo a última de cada grupo é a mais recente; os empates
+        # ficam pela ordem de chegada, como o sort estável seguido de [-1]. Todos os grupos têm pelo menos uma linha.
+        order = np.lexsort((np.arange(len(code)), np.where(valid, ts, -np.inf), code))
+        ts_sorted = ts[order]
+        counts = np.bincount(code, minlength=len(self.codes))
+        ends = np.cumsum(counts)
+        first_ts = np.minimum.reduceat(np.where(valid[order], ts_sorted, np.inf), ends - counts)
+        last = order[ends - 1]
+        self.resolved = (counts.tolist(), [None if v == math.inf else v for v in first_ts.tolist()],
+                         [None if v != v else v for v in ts[last].tolist()], amount[last].tolist())
+        return self
+
+    def get(self, sub_id):
+        """(quantidade, primeiro pagamento, último pagamento, último ticket) da assinatura, ou None."""
+        code = self.codes.get(sub_id)
+        if code is None: return None
+        counts, first_ts, last_ts, last_amount = self.resolved
+        return counts[code], first_ts[code], last_ts[code], last_amount[code]
 
 def generate_detailed_csv(subs, txs, end_date_str):
+    write_detailed_csv(subs, TxIndex(txs), end_date_str)
+
+DETAILED_COLUMNS = ["id", "data_assinatura", "data_cancelamento", "status_detalhado", "nome_assinante", "produto_oferta", "ticket_oferta", "qtd_ciclos_renovados", "ativo"]
+
+def detailed_columns(subs, tx_index, end_date_str):
+    """Colunas do assinaturas.csv (uma lista por coluna de DETAILED_COLUMNS), com as datas ainda como texto
+    "AAAA-MM-DD" ("" sem data) e o ticket como float."""
+    end_ts = end_of_day(end_date_str).timestamp()
+    cols = [[] for _ in DETAILED_COLUMNS]
+    ids, criadas, canceladas, status_col, nomes, produtos, tickets, ciclos, ativos = cols
+    for s in subs:
+        if not s.code: continue
+        status = get_subscription_status(s, end_ts)
+        if status == "future": continue
+        ticket, n_ciclos = ticket_and_cycles(s, tx_index)
+        ids.append(s.code); criadas.append(fmt_ts(s.created_ts)); canceladas.append(fmt_ts(s.cancelled_ts))
+        status_col.append(status); nomes.append(s.contact_name); produtos.append(s.product_name)
+        tickets.append(ticket); ciclos.append(n_ciclos); ativos.append("TRUE" if status == "active" else "FALSE")
+    return cols
+
+def ticket_and_cycles(s, tx_index):
+    """(ticket, ciclos) da assinatura: o último pagamento (ou o valor da oferta, sem pagamentos) e as transações."""
+    # As transações apontam para subscription.id; o relatório usa o código, por isso procura-se pelos dois.
+    n_txs, _, last_ts, last_amount = tx_index.get(s.id) or tx_index.get(s.code) or (0, None, None, 0.0)
+    ticket = round(last_amount, 2) if last_ts is not None else 0.0
+    if ticket == 0.0:
+        ticket = round(s.value, 2) if s.value is not None else 0.0
+    return ticket, n_txs or s.charged_times
+
+def _detailed_text_columns(cols):
+    # O ticket sai sempre com duas casas; o resto é convertido por escrita.csv_column.
+    return cols[:6] + [list(map("{:.2f}".format, cols[6]))] + cols[7:]
+
+def write_detailed_csv(subs, tx_index, end_date_str):
+    """Escreve o assinaturas.csv e devolve as colunas, para quem as quiser usar sem reler o ficheiro (detailed_frame)."""
     print("\nGerando relatório detalhado de assinaturas (assinaturas.csv)...")
-    end_dt = end_of_day(end_date_str)
-    txs_by_sub_id = defaultdict(list)
-    for tx in txs:
-        sid = _from_nested(tx, ["subscription", "id"]) or sub_get(tx, "subscription_id")
-        if sid: txs_by_sub_id[str(sid)].append(tx)
-
-    with open(os.path.join(OUT_DIR, "assinaturas.csv"), "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["id", "data_assinatura", "data_cancelamento", "status_detalhado", "nome_assinante", "produto_oferta", "ticket_oferta", "qtd_ciclos_renovados", "ativo"])
-        for s in subs:
-            sid, ticket = sub_get(s, "subscription_code","code","id"), 0.0
-            if not sid: continue
-            sub_txs = txs_by_sub_id.get(sid, [])
-            if sub_txs:
-                valid_txs = sorted([tx for tx in sub_txs if _from_nested(tx, ["dates", "confirmed_at"])], key=lambda tx: _from_nested(tx, ["dates", "confirmed_at"]))
-                if valid_txs: ticket = round(extract_net_amount(valid_txs[-1]), 2)
-            if ticket == 0.0:
-                price = sub_get(s, "value")
-                ticket = round(price, 2) if price is not None else 0.0
-            status = get_subscription_status(s, end_dt)
-            if status == "future": continue
-            writer.writerow([sid, fmt_date(sub_created_at(s)), fmt_date(sub_cancelled_at(s)), status, _from_nested(s, ["contact", "name"]), _from_nested(s, ["product", "name"]), f"{ticket:.2f}", len(sub_txs) or sub_get(s, "charged_times", 0), "TRUE" if status == "active" else "FALSE"])
+    # Um bloco de escrita.CSV_CHUNK_ROWS assinaturas de cada vez: o texto do bloco é largado antes do seguinte, e
+    # só as colunas (as que o detailed_frame usa) ficam para o relatório todo.
+    cols = [[] for _ in DETAILED_COLUMNS]
+    with escrita.atomic_open(os.path.join(OUT_DIR, "assinaturas.csv"), "w", newline="", encoding="utf-8") as f:
+        escrita.write_csv_columns(f, DETAILED_COLUMNS, ())
+        for lo in range(0, len(subs), escrita.CSV_CHUNK_ROWS):
+            part = detailed_columns(subs[lo:lo + escrita.CSV_CHUNK_ROWS], tx_index, end_date_str)
+            escrita.write_csv_columns(f, (), _detailed_text_columns(part))
+            for col, values in zip(cols, part): col.extend(values)
+    return cols
 
-def generate_kpi_csvs(subs, txs, start_date_str, end_date_str):
-    print("\nGerando relatórios de KPIs (semanal e mensal)...")
-    start_dt, end_dt = to_tz(start_date_str), to_tz(end_date_str)
-    
-    extract_confirmed_at_from_tx = lambda t: from_iso_any(_from_nested(t, ["dates", "confirmed_at"]))
+def detailed_frame(cols):
+    """DataFrame das colunas do assinaturas.csv com os mesmos tipos que coortes.load_assinaturas dá ao ler o ficheiro."""
+    import pandas as pd  # só quem usa o DataFrame paga o import do pandas
+    df = pd.DataFrame(dict(zip(DETAILED_COLUMNS, cols)))
+    for col in ("data_assinatura", "data_cancelamento"):
+        df[col] = pd.to_datetime(df[col], format="%Y-%m-%d", errors="coerce")  # "" (sem data) vira NaT
+    df["ticket_oferta"] = df["ticket_oferta"].astype("float64")
+    return df
 
-    monthly_kpis = []
-    month_iter = start_dt.replace(day=1)
+def month_periods(start_dt, end_dt):
+    periods, month_iter = [], start_dt.replace(day=1)
     while month_iter <= end_dt:
-        month_ini = month_iter
-        month_end = (month_ini + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        novas = len([s for s in subs if sub_created_at(s) and month_ini <= sub_created_at(s) <= month_end])
-        cancelados = len([s for s in subs if sub_cancelled_at(s) and month_ini <= sub_cancelled_at(s) <= month_end])
-        receita = sum([extract_net_amount(t) for t in txs if extract_confirmed_at_from_tx(t) and month_ini <= extract_confirmed_at_from_tx(t) <= month_end])
-        ativos_fim_mes = len([s for s in subs if sub_created_at(s) <= month_end and (not sub_cancelled_at(s) or sub_cancelled_at(s) > month_end)])
-        monthly_kpis.append({"month": month_ini.strftime("%Y-%m"), "novas_assinaturas_brutas": novas, "cancelamentos_brutos": cancelados, "receita": round(receita, 2), "ticket_medio": round(receita / ativos_fim_mes, 2) if ativos_fim_mes > 0 else 0})
+        periods.append((month_iter, (month_iter + timedelta(days=32)).replace(day=1) - timedelta(days=1)))
         month_iter = (month_iter + timedelta(days=32)).replace(day=1)
-    
-    with open(os.path.join(OUT_DIR, "monthly_kpis.csv"), 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=["month", "novas_assinaturas_brutas", "cancelamentos_brutos", "receita", "ticket_medio"])
-        writer.writeheader(); writer.writerows(monthly_kpis)
+    return periods
 
-    weekly_kpis = []
-    day_iter = start_dt - timedelta(days=start_dt.weekday())
+def week_periods(start_dt, end_dt):
+    periods, day_iter = [], start_dt - timedelta(days=start_dt.weekday())
     while day_iter <= end_dt:
-        week_start, week_end = day_iter, day_iter + timedelta(days=6)
-        novas = len([s for s in subs if sub_created_at(s) and week_start <= sub_created_at(s) <= week_end])
-        cancelados = len([s for s in subs if sub_cancelled_at(s) and week_start <= sub_cancelled_at(s) <= week_end])
-        weekly_kpis.append({"week_start": fmt_date(week_start), "week_end": fmt_date(week_end), "novas_assinaturas_brutas": novas, "cancelamentos_brutos": cancelados})
+        periods.append((day_iter, day_iter + timedelta(days=6)))
         day_iter += timedelta(days=7)
+    return periods
+
+# =========================
+# MOTOR DE KPIS (ÍNDICES ORDENADOS)
+# =========================
+# As datas dos registos normalizados são guardadas em listas ordenadas (epoch);
+# cada período é depois respondido com pesquisa binária em vez de voltar a percorrer os dados.
+class KpiIndex:
+    def __init__(self, subs=(), txs=()):
+        self.created, self.cancelled, self.closed, self.payments = [], [], [], []
+        for s in subs: self.add_subscription(s)
+        for t in txs: self.add_transaction(t)
+        self.seal()
+
+    # add_* aceitam registos um a um (modo streaming); seal() tem de ser chamado antes das consultas.
+    def add_subscription(self, s):
+        c, x = s.created_ts, s.cancelled_ts
+        if c is not None: self.created.append(c)
+        if x is not None:
+            self.cancelled.append(x)
+            if c is not None: self.closed.append(max(c, x))
+
+    def add_transaction(self, t):
+        if t.confirmed_ts is not None: self.payments.append((t.confirmed_ts, t.net_amount))
+
+    def seal(self):
+        self.created.sort(); self.cancelled.sort(); self.closed.sort()
+        return self
+
+    @staticmethod
+    def _count_between(values, ini, end): return bisect_right(values, end) - bisect_left(values, ini)
+
+    def novas(self, ini, end): return self._count_between(self.created, ini, end)
+    def cancelados(self, ini, end): return self._count_between(self.cancelled, ini, end)
+    def ativos_em(self, ts): return bisect_right(self.created, ts) - bisect_right(self.closed, ts)
+
+    def receita_por_periodo(self, bounds):
+        # Uma única passagem pelas transações, pela ordem original, para que as somas sejam idênticas às de sum().
+        starts, totals = [ini for ini, _ in bounds], [0] * len(bounds)
+        for ts, amount in self.payments:
+            i = bisect_right(starts, ts) - 1
+            if i >= 0 and ts <= bounds[i][1]: totals[i] += amount
+        return totals
+
+def compute_monthly_kpis(index, periods):
+    bounds = [(ini.timestamp(), end.timestamp()) for ini, end in periods]
+    receitas = index.receita_por_periodo(bounds)
+    monthly_kpis = []
+    for (month_ini, _), (ini, end), receita in zip(periods, bounds, receitas):
+        ativos_fim_mes = index.ativos_em(end)
+        monthly_kpis.append({"month": month_ini.strftime("%Y-%m"), "novas_assinaturas_brutas": index.novas(ini, end), "cancelamentos_brutos": index.cancelados(ini, end), "receita": round(receita, 2), "ticket_medio": round(receita / ativos_fim_mes, 2) if ativos_fim_mes > 0 else 0})
+    return monthly_kpis
+
+def compute_weekly_kpis(index, periods):
+    weekly_kpis = []
+    for week_start, week_end in periods:
+        ini, end = week_start.timestamp(), week_end.timestamp()
+        weekly_kpis.append({"week_start": fmt_date(week_start), "week_end": fmt_date(week_end), "novas_assinaturas_brutas": index.novas(ini, end), "cancelamentos_brutos": index.cancelados(ini, end)})
+    return weekly_kpis
+
+def day_periods(start_dt, end_dt):
+    return [start_dt + timedelta(days=i) for i in range((end_dt.date() - start_dt.date()).days + 1)]
+
+def build_status_index(subs, tx_index):
+    """historico.StatusIndex das assinaturas, com o mesmo ticket do assinaturas.csv para o MRR."""
+    return StatusIndex(subs, [ticket_and_cycles(s, tx_index)[0] for s in subs])
+
+def compute_daily_kpis(status_index, days):
+    """Assinaturas por status e MRR (tickets das ativas) no fim de cada dia, com uma consulta vetorizada para todos."""
+    ends = [end_of_day(fmt_date(d)).timestamp() for d in days]
+    counts, mrr = status_index.counts(ends), status_index.mrr(ends).tolist()
+    ativas, inadimplentes, inativas, canceladas = (counts[k].tolist() for k in ("active", "overdue", "inactive", "canceled"))
+    return [{"date": fmt_date(d), "ativas": ativas[i], "inadimplentes": inadimplentes[i], "inativas": inativas[i],
+             "canceladas": canceladas[i], "mrr": round(mrr[i], 2)} for i, d in enumerate(days)]
+
+def write_daily_kpi_csv(status_index, start_date_str, end_date_str):
+    print("\nGerando relatório diário de assinaturas por status e MRR (daily_kpis.csv)...")
+    _write_kpi_csv("daily", _daily_kpi_rows(status_index, start_date_str, end_date_str))
+
+def _daily_kpi_rows(status_index, start_date_str, end_date_str):
+    return compute_daily_kpis(status_index, day_periods(to_tz(start_date_str), to_tz(end_date_str)))
+
+def compute_product_kpis(subs, tx_index, index, periods):
+    """KPIs mensais por produto/oferta (produtos.ProductKpis), nos mesmos meses e com os mesmos critérios do
+    compute_monthly_kpis: somando os produtos de um mês, dá-se com as novas, os cancelamentos e a receita dele."""
+    bounds = [(ini.timestamp(), end.timestamp()) for ini, end in periods]
+    grouped = ProductKpis(subs, tx_index, bounds, index.receita_por_periodo(bounds))
+    return grouped.rows([month_ini.strftime("%Y-%m") for month_ini, _ in periods])
+
+def write_product_kpi_csv(subs, tx_index, index, start_date_str, end_date_str):
+    print("\nGerando relatório mensal por produto/oferta (product_kpis.csv)...")
+    _write_kpi_csv("products", _product_kpi_rows(subs, tx_index, index, start_date_str, end_date_str))
+
+def _product_kpi_rows(subs, tx_index, index, start_date_str, end_date_str):
+    return compute_product_kpis(subs, tx_index, index, month_periods(to_tz(start_date_str), to_tz(end_date_str)))
+
+def generate_kpi_csvs(subs, txs, start_date_str, end_date_str):
+    write_kpi_csvs(KpiIndex(subs, txs), start_date_str, end_date_str)
+
+def write_kpi_csvs(index, start_date_str, end_date_str):
+    print("\nGerando relatórios de KPIs (semanal e mensal)...")
+    for kind in KPI_REPORTS: _write_kpi_csv(kind, _kpi_rows(kind, index, start_date_str, end_date_str))
+
+# relatório -> (ficheiro, colunas)
+KPI_REPORTS = {
+    "monthly": ("monthly_kpis.csv", ["month", "novas_assinaturas_brutas", "cancelamentos_brutos", "receita", "ticket_medio"]),
+    "weekly": ("weekly_kpis.csv", ["week_start", "week_end", "novas_assinaturas_brutas", "cancelamentos_brutos"]),
+}
+# O diário sai do historico.StatusIndex (write_daily_kpi_csv) e o por produto do produtos.ProductKpis
+# (write_product_kpi_csv), não do KpiIndex; ficam fora do laço de write_kpi_csvs.
+DAILY_REPORT = ("daily_kpis.csv", ["date", "ativas", "inadimplentes", "inativas", "canceladas", "mrr"])
+PRODUCT_REPORT = ("product_kpis.csv", ["month", "produto_oferta", "novas_assinaturas_brutas", "cancelamentos_brutos", "ativas_fim_mes", "receita"])
+
+def _kpi_rows(kind, index, start_date_str, end_date_str):
+    start_dt, end_dt = to_tz(start_date_str), to_tz(end_date_str)
+    if kind == "monthly": return compute_monthly_kpis(index, month_periods(start_dt, end_dt))
+    return compute_weekly_kpis(index, week_periods(start_dt, end_dt))
+
+def _write_kpi_csv(kind, rows):
+    filename, fieldnames = {"daily": DAILY_REPORT, "products": PRODUCT_REPORT}.get(kind) or KPI_REPORTS[kind]
+    escrita.write_csv(os.path.join(OUT_DIR, filename), fieldnames, [[r[k] for r in rows] for k in fieldnames])
 
-    with open(os.path.join(OUT_DIR, "weekly_kpis.csv"), 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=["week_start", "week_end", "novas_assinaturas_brutas", "cancelamentos_brutos"])
-        writer.writeheader(); writer.writerows(weekly_kpis)
+def write_reports(subs, tx_index, index, start_date_str, end_date_str):
+    """Escreve o assinaturas.csv e os KPIs mensal, semanal, diário e por produto; devolve as colunas do assinaturas.csv."""
+    with METRICAS.etapa("relatorio_assinaturas"):
+        cols = write_detailed_csv(subs, tx_index, end_date_str)
+    with METRICAS.etapa("relatorio_kpis"):
+        write_kpi_csvs(index, start_date_str, end_date_str)
+    with METRICAS.etapa("relatorio_diario"):
+        write_daily_kpi_csv(build_status_index(subs, tx_index), start_date_str, end_date_str)
+    with METRICAS.etapa("relatorio_produtos"):
+        write_product_kpi_csv(subs, tx_index, index, start_date_str, end_date_str)
+    return cols
 
 if __name__ == "__main__":
-    print("Iniciando script de extração de dados...")
-    fetch_and_generate_reports()
+    parser = argparse.ArgumentParser(description="Extrai assinaturas e transações da Guru e gera os relatórios de KPIs.")
+    parser.add_argument("--full-resync", action="store_true", help="Ignora a base local e volta a descarregar todo o histórico.")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS, help="Janelas de datas buscadas em paralelo (1 = sequencial).")
+    parser.add_argument("--offline", action="store_true", help="Refaz os relatórios a partir da base local, sem aceder à API (não precisa do token).")
+    parser.add_argument("--parquet", action="store_true", default=OUTPUT_PARQUET, help="Grava também out/assinaturas.parquet (precisa de pyarrow ou fastparquet).")
+    parser.add_argument("--snapshot", action="store_true", default=SNAPSHOT, help=f"Guarda as respostas da API desta execução num snapshot comprimido em {SNAPSHOT_DIR}.")
+    parser.add_argument("--from-snapshot", metavar="ID", help="Refaz os relatórios a partir de um snapshot gravado (ID ou 'ultimo'), sem API nem base local.")
+    parser.add_argument("--profile", action="store_true", help="Grava um cProfile por etapa em out/perfis/.")
+    args = parser.parse_args()
+    METRICAS.perfil = METRICAS.perfil or args.profile
+    print("Refazendo os relatórios a partir de um snapshot..." if args.from_snapshot else "Refazendo os relatórios a partir da base local..." if args.offline else "Iniciando script de extração de dados...")
+    try:
+        df = fetch_and_generate_reports(full_resync=args.full_resync, workers=args.fetch_workers, offline=args.offline, parquet=args.parquet,
+                                        snapshot=args.snapshot, from_snapshot=args.from_snapshot)
+    finally:
+        print(f"Métricas da execução gravadas em '{METRICAS.salvar('main.py')}'.")
+    if df is None: raise SystemExit(1)
     print("\nScript de extração de dados concluído com sucesso.")
\ No newline at end of file
@@ -0,0 +1,113 @@
+# metricas.py
+# -*- coding: utf-8 -*-
+# Tempos por etapa, contadores (páginas, bytes, retentativas) e pico de memória de uma execução, gravados em
+# out/run_metrics.json. Com o perfil ligado (--profile ou KPIS_PROFILE=1), cada etapa grava também um cProfile.
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from escrita import atomic_open
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RUN_METRICS_PATH = os.getenv("RUN_METRICS_PATH", os.path.join("out", "run_metrics.json"))
+PERFIS_DIR = os.path.join("out", "perfis")
+
+def peak_rss_mb(who=None):
+    """Pico de memória residente (MB) do processo (ou dos filhos, com resource.RUSAGE_CHILDREN); None sem o módulo resource."""
+    if resource is None: return None
+    kb = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # ru_maxrss vem em bytes no macOS
+
+class Metricas:
+    """Coletor de uma execução. contar() e janela() são seguros entre threads (os workers da busca partilham-no)."""
+
+    def __init__(self, perfil=None):
+        self.perfil = os.getenv("KPIS_PROFILE", "") not in ("", "0") if perfil is None else perfil
+        self.etapas, self.janelas, self.contadores = [], [], {}
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._perfil_ativo = False
+
+    @contextmanager
+    def etapa(self, nome, script="main"):
+        """Mede tempo de parede, tempo de CPU e o pico de memória ao fim da etapa."""
+        info = {"etapa": nome}
+        profiler = None
+        # Só um cProfile pode estar ativo de cada vez; numa etapa dentro de outra fica o perfil da de fora.
+        # O cProfile só vê a thread principal: na busca, o tempo dos workers aparece como espera nos futures.
+        if self.perfil and not self._perfil_ativo:
+            import cProfile
+            profiler, self._perfil_ativo = cProfile.Profile(), True
+            profiler.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield info
+        finally:
+            info["segundos"] = round(time.perf_counter() - wall, 3)
+            info["cpu_segundos"] = round(time.process_time() - cpu, 3)
+            info["pico_rss_mb"] = peak_rss_mb()
+            if profiler:
+                profiler.disable(); self._perfil_ativo = False
+                info["perfil"] = self._dump_profile(profiler, f"{script}-{nome}")
+            with self.lock: self.etapas.append(info)
+
+    @staticmethod
+    def _dump_profile(profiler, nome):
+        import pstats
+        os.makedirs(PERFIS_DIR, exist_ok=True)
+        path = os.path.join(PERFIS_DIR, nome.replace("/", "_") + ".prof")
+        profiler.dump_stats(path)
+        # Resumo legível ao lado do .prof (abrir o .prof com snakeviz ou python -m pstats para mais detalhe).
+        with open(path[:-5] + ".txt", "w", encoding="utf-8") as f:
+            pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+        return path
+
+    def contar(self, nome, n=1, endpoint=None):
+        """Soma n ao contador global ("endpoint:nome") e ao da janela de busca em curso nesta thread, se houver."""
+        chave = f"{endpoint}:{nome}" if endpoint else nome
+        with self.lock:
+            self.contadores[chave] = self.contadores.get(chave, 0) + n
+            janela = getattr(self._local, "janela", None)
+            if janela is not None: janela[nome] = janela.get(nome, 0) + n
+
+    @contextmanager
+    def janela(self, **info):
+        """Agrupa os contadores de uma janela de datas da busca (path, início, fim), que corre inteira numa thread."""
+        anterior, self._local.janela = getattr(self._local, "janela", None), dict(info)
+        inicio = time.perf_counter()
+        try:
+            yield self._local.janela
+        finally:
+            janela, self._local.janela = self._local.janela, anterior
+            janela["segundos"] = round(time.perf_counter() - inicio, 3)
+            with self.lock: self.janelas.append(janela)
+
+    def como_dict(self):
+        with self.lock:
+            return {"gerado_em": datetime.now().isoformat(timespec="seconds"), "pico_rss_mb": peak_rss_mb(),
+                    "etapas": list(self.etapas), "contadores": dict(sorted(self.contadores.items())), "janelas": list(self.janelas)}
+
+    def salvar(self, script, path=None):
+        """Junta as métricas deste script às que já estão no ficheiro (cada script da execução escreve a sua secção)."""
+        path = path or RUN_METRICS_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        dados = carregar(path)
+        dados.setdefault("scripts", {})[script] = self.como_dict()
+        with atomic_open(path, "w", encoding="utf-8") as f: json.dump(dados, f, ensure_ascii=False, indent=2)
+        return path
+
+def carregar(path=None):
+    try:
+        with open(path or RUN_METRICS_PATH, encoding="utf-8") as f: return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# Coletor do processo, usado por main.py e gerar_dashboard.py.
+METRICAS = Metricas()
@@ -0,0 +1,241 @@
+# mock_guru.py
+# -*- coding: utf-8 -*-
+# Servidor local que imita os endpoints /subscriptions e /transactions da API da Guru,
+# para testar e medir o main.py sem token nem acesso à rede.
+# Uso: python mock_guru.py --assinaturas 100000 --latencia 0.05 --erros-5xx 0.01
+#      DMG_BASE_URL=http://127.0.0.1:8765 DMG_USER_TOKEN=mock python main.py
+#      python mock_guru.py --cortes 0.02   (2% das respostas cortadas a meio do corpo)
+import json
+import time
+import socket
+import random
+import hashlib
+import argparse
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# endpoint -> (caminho do campo de data no item, parâmetro início, parâmetro fim)
+ENDPOINTS = {
+    "/subscriptions": (("created_at",), "created_at_ini", "created_at_end"),
+    "/transactions": (("dates", "confirmed_at"), "confirmed_at_ini", "confirmed_at_end"),
+}
+
+def _item_date(item, keys):
+    cur = item
+    for k in keys:
+        cur = cur.get(k) if isinstance(cur, dict) else None
+    return str(cur)[:10] if cur else ""
+
+# =========================
+# DADOS SINTÉTICOS
+# =========================
+PRODUTOS = ["1 All In Greens", "1 Natural Fire", "3 All In Greens", "1 All In Greens + 1 Natural Fire", "1 Cordyceps 2 Juba de Leão"]
+STATUS = ["active", "active", "active", "canceled", "pastdue", "paused"]
+
+def iter_synthetic(n_subs, start_date="2024-01-01", end_date="2025-12-31", seed=42, hotspot=None):
+    """Gera (endpoint, item) no mesmo formato que a API da Guru devolve; a mesma seed dá sempre os mesmos dados.
+
+    hotspot=(data_inicial, dias, fração) concentra essa fração das assinaturas numa janela curta (ex.: promoção).
+    """
+    rnd = random.Random(seed)
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    span = int((datetime.strptime(end_date, "%Y-%m-%d") - start).total_seconds())
+    n_txs = 0
+    for i in range(n_subs):
+        if hotspot and rnd.random() < hotspot[2]:
+            created = datetime.strptime(hotspot[0], "%Y-%m-%d") + timedelta(seconds=rnd.randrange(hotspot[1] * 86400))
+        else:
+            created = start + timedelta(seconds=rnd.randrange(span))
+        status = rnd.choice(STATUS)
+        cancelled = created + timedelta(days=rnd.randint(1, 400)) if status == "canceled" else None
+        value = round(rnd.uniform(90, 300), 2)
+        sid = f"sub_{i:09d}"
+        yield "/subscriptions", {
+            "id": sid, "subscription_code": sid, "created_at": created.strftime("%Y-%m-%d %H:%M:%S"),
+            "cancelled_at": cancelled.strftime("%Y-%m-%d %H:%M:%S") if cancelled else None,
+            "last_status": status, "last_status_at": (cancelled or created).strftime("%Y-%m-%d %H:%M:%S"),
+            "value": value, "charged_times": 1, "contact": {"name": f"Assinante {i}"},
+            "product": {"name": rnd.choice(PRODUTOS)},
+        }
+        for c in range(rnd.randint(1, 3)):
+            confirmed = created + timedelta(days=30 * c, minutes=rnd.randint(0, 120))
+            if cancelled and confirmed > cancelled: break
+            yield "/transactions", {
+                "id": f"tx_{n_txs:010d}", "subscription": {"id": sid},
+                "dates": {"confirmed_at": confirmed.strftime("%Y-%m-%d %H:%M:%S")},
+                "payment": {"net": value if rnd.random() > 0.1 else str(value).replace(".", ",")},
+            }
+            n_txs += 1
+
+def synthetic_dataset(n_subs, start_date="2024-01-01", end_date="2025-12-31", seed=42, hotspot=None):
+    """(assinaturas, transações) de iter_synthetic como listas de dicts."""
+    data = {path: [] for path in ENDPOINTS}
+    for path, item in iter_synthetic(n_subs, start_date, end_date, seed, hotspot): data[path].append(item)
+    return data["/subscriptions"], data["/transactions"]
+
+# =========================
+# SERVIDOR
+# =========================
+class MockGuruAPI:
+    """API falsa com paginação por cursor, has_more_pages e filtros de data; conta os pedidos por endpoint.
+
+    latency simula o tempo de resposta (segundos) e throttle_every devolve um 429 a cada N pedidos.
+    error_rate devolve um 5xx (500/502/503/504) a essa fração dos pedidos, sorteada com a seed.
+    drop_rate corta essa fração das respostas a meio: o 200 e o Content-Length completo seguem, mas a ligação é
+    fechada depois de metade do corpo (como uma ligação que cai durante a transferência).
+    Com etags=True cada página leva um ETag e um If-None-Match igual recebe 304 sem corpo.
+    Os itens ficam guardados já em JSON, para que a escala de 1M de assinaturas caiba em memória.
+    """
+
+    def __init__(self, subs, txs, max_page_size=200, latency=0.0, throttle_every=0, retry_after=1, etags=False, error_rate=0.0, drop_rate=0.0, seed=42):
+        self.max_page_size = max_page_size
+        self.latency, self.throttle_every, self.retry_after = latency, throttle_every, retry_after
+        self.etags, self.not_modified = etags, 0
+        self.error_rate, self._error_rnd = error_rate, random.Random(seed)
+        self.drop_rate, self._drop_rnd = drop_rate, random.Random(seed + 1)
+        self.throttled = self.errors = self.dropped = 0
+        self._served = 0
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._data = {}
+        self.set_items("/subscriptions", subs)
+        self.set_items("/transactions", txs)
+        self._server = None
+
+    @classmethod
+    def synthetic(cls, n_subs, seed=42, start_date="2024-01-01", end_date="2025-12-31", hotspot=None, **kwargs):
+        """API com os dados de iter_synthetic, sem guardar os dicts (só o JSON de cada item)."""
+        api = cls((), (), seed=seed, **kwargs)
+        rows = {path: [] for path in ENDPOINTS}
+        for path, item in iter_synthetic(n_subs, start_date, end_date, seed, hotspot):
+            rows[path].append((_item_date(item, ENDPOINTS[path][0]), json.dumps(item, separators=(",", ":")).encode("utf-8")))
+        for path, path_rows in rows.items(): api._set_rows(path, path_rows)
+        return api
+
+    def _set_rows(self, path, rows):
+        rows.sort(key=lambda r: r[0])
+        with self._lock:
+            self._data[path] = ([d for d, _ in rows], [body for _, body in rows])
+
+    def set_items(self, path, items):
+        keys = ENDPOINTS[path][0]
+        self._set_rows(path, [(_item_date(it, keys), json.dumps(it, separators=(",", ":")).encode("utf-8")) for it in items])
+
+    def add_items(self, path, items):
+        keys = ENDPOINTS[path][0]
+        dates, bodies = self._data[path]
+        self._set_rows(path, list(zip(dates, bodies)) + [(_item_date(it, keys), json.dumps(it, separators=(",", ":")).encode("utf-8")) for it in items])
+
+    def page_body(self, path, params):
+        keys, key_ini, key_end = ENDPOINTS[path]
+        with self._lock:
+            dates, items = self._data[path]
+            self.requests[path] += 1
+        lo = bisect_left(dates, params[key_ini]) if params.get(key_ini) else 0
+        hi = bisect_right(dates, params[key_end]) if params.get(key_end) else len(dates)
+        per_page = min(int(params.get("per_page") or self.max_page_size), self.max_page_size)
+        offset = lo + int(params.get("cursor") or 0)
+        has_more = offset + per_page < hi
+        tail = {"has_more_pages": has_more, "next_cursor": str(offset + per_page - lo) if has_more else None}
+        return b'{"data":[' + b",".join(items[offset:min(offset + per_page, hi)]) + b"]," + json.dumps(tail)[1:].encode("utf-8")
+
+    def page(self, path, params): return json.loads(self.page_body(path, params))
+
+    def total_requests(self): return sum(self.requests.values())
+
+    def _should_throttle(self):
+        if not self.throttle_every: return False
+        with self._lock:
+            self._served += 1
+            if self._served % self.throttle_every: return False
+            self.throttled += 1
+            return True
+
+    def _injected_error(self):
+        if not self.error_rate: return None
+        with self._lock:
+            if self._error_rnd.random() >= self.error_rate: return None
+            self.errors += 1
+            return self._error_rnd.choice((500, 502, 503, 504))
+
+    def _should_drop(self):
+        if not self.drop_rate: return False
+        with self._lock:
+            if self._drop_rnd.random() >= self.drop_rate: return False
+            self.dropped += 1
+            return True
+
+    def start(self, host="127.0.0.1", port=0):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path not in ENDPOINTS:
+                    self.send_error(404); return
+                if api.latency: time.sleep(api.latency)
+                if api._should_throttle():
+                    self.send_response(429); self.send_header("Retry-After", str(api.retry_after))
+                    self.send_header("Content-Length", "0"); self.end_headers(); return
+                status = api._injected_error()
+                if status:
+                    self.send_response(status); self.send_header("Content-Length", "0"); self.end_headers(); return
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                body = api.page_body(url.path, params)
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"' if api.etags else None
+                if etag and self.headers.get("If-None-Match") == etag:
+                    with api._lock: api.not_modified += 1
+                    self.send_response(304); self.send_header("ETag", etag); self.end_headers(); return
+                self.send_response(200)
+                if etag: self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if api._should_drop():
+                    self.wfile.write(body[:len(body) // 2]); self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR); self.close_connection = True
+                    return
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):  # o cliente desistiu (ex.: processo morto a meio)
+                    self.close_connection = True
+
+            def log_message(self, *args): pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown(); self._server.server_close(); self._server = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API da Guru falsa, com dados sintéticos, para correr o main.py sem rede nem token.")
+    parser.add_argument("--assinaturas", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-inicio", default=datetime.now().strftime("%Y-01-01"))
+    parser.add_argument("--data-fim", default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--porta", type=int, default=8765, help="0 escolhe uma porta livre.")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera por pedido.")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Devolve um 429 a cada N pedidos.")
+    parser.add_argument("--erros-5xx", type=float, default=0.0, help="Fração dos pedidos que recebe um 5xx.")
+    parser.add_argument("--cortes", type=float, default=0.0, help="Fração das respostas cortadas a meio do corpo (ligação fechada).")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    api = MockGuruAPI.synthetic(args.assinaturas, seed=args.seed, start_date=args.data_inicio, end_date=args.data_fim,
+                                latency=args.latencia, throttle_every=args.throttle_every, error_rate=args.erros_5xx,
+                                drop_rate=args.cortes)
+    url = api.start(port=args.porta)
+    counts = {path: len(api._data[path][0]) for path in ENDPOINTS}
+    print(f"{counts['/subscriptions']} assinaturas e {counts['/transactions']} transações geradas em {time.perf_counter() - t0:.1f}s", flush=True)
+    print(url, flush=True)  # a última linha é o endereço, para quem arranca o servidor a partir de outro processo
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,114 @@
+# produtos.py
+# -*- coding: utf-8 -*-
+# KPIs mensais por produto/oferta (novas, cancelamentos, ativas no fim do mês e receita) numa única passagem
+# agrupada sobre os registos normalizados do main.py: cada registo vira uma célula (produto, mês) e cada métrica é
+# um bincount sobre essas células, em vez de repetir os filtros por período uma vez por produto.
+import math
+from array import array
+
+SEM_PRODUTO = "(sem produto)"      # assinaturas sem product.name
+SEM_ASSINATURA = "(sem assinatura)"  # receita de transações que não apontam para nenhuma assinatura conhecida
+COLUNAS_KPI = ("novas_assinaturas_brutas", "cancelamentos_brutos", "ativas_fim_mes", "receita")
+
+class ProductKpis:
+    """Matrizes produto x mês das quatro COLUNAS_KPI, com os mesmos limites de mês do main.compute_monthly_kpis.
+
+    bounds: [(início, fim)] em epoch, por ordem e sem sobreposição. Uma data entra no mês i se início <= ts <= fim
+    (como em KpiIndex.novas/cancelados); as ativas no fim do mês i são as criadas até fim menos as fechadas até
+    fim, com fechada = max(criação, cancelamento), como em KpiIndex.ativos_em. Os produtos são agrupados por um
+    dict nome -> código (hash), pela ordem em que aparecem.
+    """
+
+    def __init__(self, subs, tx_index, bounds, total_revenue=None):
+        import numpy as np  # só esta etapa precisa do NumPy
+        self.months = len(bounds)
+        starts, ends = np.array([b[0] for b in bounds], dtype="float64"), np.array([b[1] for b in bounds], dtype="float64")
+        products, created, cancelled, closed = {}, array("d"), array("d"), array("d")
+        prod_code, tx_product = array("q"), {}
+        # Passagem única pelas assinaturas: código do produto e datas (NaN sem data) em colunas compactas, e o
+        # produto de cada chave de transação (subscription.id ou o código, como em main.ticket_and_cycles).
+        for s in subs:
+            code = products.setdefault(s.product_name or SEM_PRODUTO, len(products))
+            c, x = s.created_ts, s.cancelled_ts
+            prod_code.append(code)
+            created.append(math.nan if c is None else c)
+            cancelled.append(math.nan if x is None else x)
+            closed.append(math.nan if c is None or x is None else max(c, x))
+            key = tx_index.codes.get(s.id)
+            if key is None: key = tx_index.codes.get(s.code)
+            if key is not None: tx_product.setdefault(key, code)
+        self.products = list(products)
+
+        n_products, n_months = len(self.products), self.months
+        prod = np.frombuffer(prod_code, dtype=np.int64)
+
+        def cells(codes, ts):
+            # Célula produto * meses + mês de cada data que cai dentro de um mês; as outras ficam de fora.
+            i = np.searchsorted(starts, ts, "right") - 1
+            inside = (i >= 0) & (ts <= ends[np.maximum(i, 0)])  # NaN nunca é <= fim
+            return codes[inside] * n_months + i[inside], inside
+
+        def grid(codes, ts, weights=None):
+            idx, inside = cells(codes, ts)
+            w = None if weights is None else weights[inside]
+            return np.bincount(idx, weights=w, minlength=n_products * n_months).reshape(n_products, n_months)
+
+        def first_month_ending_after(ts):
+            # Primeiro mês cujo fim é >= ts: a partir dele a data já conta como "até o fim do mês".
+            valid = ~np.isnan(ts)
+            col = np.searchsorted(ends, ts[valid], "left")
+            acc = np.bincount(prod[valid] * (n_months + 1) + col, minlength=n_products * (n_months + 1))
+            return acc.reshape(n_products, n_months + 1)[:, :n_months].cumsum(axis=1)
+
+        created_a, closed_a = np.frombuffer(created), np.frombuffer(closed)
+        self.novas = grid(prod, created_a)
+        self.cancelamentos = grid(prod, np.frombuffer(cancelled))
+        self.ativas = first_month_ending_after(created_a) - first_month_ending_after(closed_a)
+
+        # Receita: a coluna de assinatura de cada transação do TxIndex vira o código do produto (-1 sem produto).
+        lookup = np.full(len(tx_index.codes) + 1, -1, dtype=np.int64)
+        if tx_product: lookup[np.fromiter(tx_product.keys(), np.int64, len(tx_product))] = np.fromiter(tx_product.values(), np.int64, len(tx_product))
+        tx_prod = lookup[np.frombuffer(tx_index.sub_code, dtype=np.int64)] if len(tx_index.sub_code) else np.zeros(0, np.int64)
+        tx_ts, tx_amount = np.frombuffer(tx_index.ts), np.frombuffer(tx_index.amount)
+        linked = tx_prod >= 0
+        self.receita = grid(tx_prod[linked], tx_ts[linked], tx_amount[linked])
+
+        # O resto da receita do mês (transações sem assinatura ou com uma assinatura que não veio) fica numa linha à
+        # parte, para que a soma por mês bata com o monthly_kpis.csv.
+        if total_revenue is not None:
+            resto = np.asarray(total_revenue, dtype="float64") - self.receita.sum(axis=0)
+            if np.any(np.abs(resto) >= 0.005):
+                self.products.append(SEM_ASSINATURA)
+                zeros = np.zeros((1, n_months), dtype=np.int64)
+                self.novas, self.cancelamentos, self.ativas = (np.vstack((m, zeros)) for m in (self.novas, self.cancelamentos, self.ativas))
+                self.receita = np.vstack((self.receita, resto))
+
+    def rows(self, labels):
+        """Linhas do CSV em formato longo (mês, produto), por mês e depois por nome de produto, sem as linhas a zero.
+
+        labels: o rótulo "AAAA-MM" de cada mês."""
+        order = sorted(range(len(self.products)), key=lambda p: self.products[p])
+        novas, cancel, ativas = self.novas.tolist(), self.cancelamentos.tolist(), self.ativas.tolist()
+        receita = [[round(v, 2) for v in r] for r in self.receita.tolist()]  # round() do Python, como no monthly_kpis
+        out = []
+        for m, label in enumerate(labels):
+            for p in order:
+                row = (novas[p][m], cancel[p][m], ativas[p][m], receita[p][m])
+                if any(row):
+                    out.append({"month": label, "produto_oferta": self.products[p], "novas_assinaturas_brutas": int(row[0]),
+                                "cancelamentos_brutos": int(row[1]), "ativas_fim_mes": int(row[2]), "receita": row[3] + 0.0})
+        return out
+
+def dashboard_payload(rows):
+    """Payload compacto do dashboard a partir das linhas do product_kpis.csv (dicts ou DataFrame.to_dict("records")):
+    meses e produtos uma vez só e, por métrica, uma matriz produto x mês (receita em centavos)."""
+    months = sorted({r["month"] for r in rows})
+    products = sorted({r["produto_oferta"] for r in rows})
+    m_idx, p_idx = {m: i for i, m in enumerate(months)}, {p: i for i, p in enumerate(products)}
+    mats = {k: [[0] * len(months) for _ in products] for k in COLUNAS_KPI}
+    for r in rows:
+        p, m = p_idx[r["produto_oferta"]], m_idx[r["month"]]
+        for k in COLUNAS_KPI[:3]: mats[k][p][m] = int(r[k])
+        mats["receita"][p][m] = int(round(float(r["receita"]) * 100))
+    return {"meses": months, "produtos": products, "novas": mats["novas_assinaturas_brutas"], "cancelamentos": mats["cancelamentos_brutos"],
+            "ativas": mats["ativas_fim_mes"], "receita_centavos": mats["receita"]}
@@ -0,0 +1,222 @@
+# snapshots.py
+# -*- coding: utf-8 -*-
+# Arquivo das respostas da API de cada execução, para refazer os relatórios tal como estavam num dia passado:
+# os registos ficam guardados uma única vez, pelo hash do conteúdo, em pacotes JSONL comprimidos (zstd se o
+# pacote zstandard estiver instalado, gzip se não); cada snapshot é um manifesto com os hashes das páginas
+# recebidas e dos itens usados nos relatórios, pela mesma ordem.
+import io
+import os
+import gzip
+import json
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from escrita import atomic_path
+
+LOOKUP_BATCH = 500  # hashes por consulta ao índice
+MAX_CHAIN = 30  # manifestos seguidos descritos em relação ao anterior; o seguinte volta a ser completo
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+_CANONICAL = json.JSONEncoder(ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def record_hash(record):
+    """(hash, texto) do registo: JSON canónico (chaves ordenadas, sem espaços) e o seu BLAKE2b de 128 bits."""
+    text = _CANONICAL.encode(record)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest(), text
+
+def _open_text(path, mode):
+    # O formato sai da extensão: .zst (zstandard) ou .gz.
+    if path.endswith(".zst"):
+        zstandard = _zstd()
+        if zstandard is None: raise RuntimeError(f"'{path}' está comprimido com zstd: instale o pacote zstandard para o ler.")
+        raw = open(path, mode[0] + "b")
+        stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True) if "w" in mode else zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+    return gzip.open(path, mode[0] + "t", encoding="utf-8", newline="\n", compresslevel=6)
+
+def list_snapshots(directory):
+    """IDs dos snapshots completos em directory, do mais antigo para o mais recente."""
+    folder = os.path.join(directory, "manifestos")
+    if not os.path.isdir(folder): return []
+    return sorted(name[:-len(".jsonl.gz")] for name in os.listdir(folder) if name.endswith(".jsonl.gz"))
+
+def _manifest_path(directory, snapshot_id): return os.path.join(directory, "manifestos", snapshot_id + ".jsonl.gz")
+
+def read_header(directory, snapshot_id):
+    with _open_text(_manifest_path(directory, snapshot_id), "r") as f: return json.loads(next(f))
+
+class SnapshotWriter:
+    """Snapshot em curso: add_page (a partir do DMGClient, por qualquer worker) e items (os itens que seguem para os
+    relatórios) gravam no pacote desta execução só os registos que o índice ainda não conhece.
+
+    O pacote e o manifesto são escritos em temporários e só aparecem em close(); abort() descarta a execução,
+    sem tocar no índice, logo um snapshot interrompido nunca fica referenciado a meio.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        for sub in ("objetos", "manifestos"): os.makedirs(os.path.join(directory, sub), exist_ok=True)
+        available = list_snapshots(directory)
+        self.id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        while self.id in available: self.id += "b"
+        # A lista de itens é gravada em relação à do snapshot anterior (quase igual de um dia para o outro).
+        self.base, self.depth = None, 0
+        if available:
+            depth = read_header(directory, available[-1]).get("profundidade", 0) + 1
+            if depth <= MAX_CHAIN: self.base, self.depth = available[-1], depth
+        self.pack_name = self.id + (".jsonl.zst" if _zstd() else ".jsonl.gz")
+        self.lock = threading.Lock()
+        self.index = sqlite3.connect(os.path.join(directory, "indice.sqlite"), check_same_thread=False)
+        self.index.executescript("""
+            CREATE TABLE IF NOT EXISTS packs (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+            CREATE TABLE IF NOT EXISTS objects (hash BLOB PRIMARY KEY, pack INTEGER NOT NULL) WITHOUT ROWID;
+        """)
+        self._pack_path = os.path.join(directory, "objetos", self.pack_name)
+        self._pack_tmp = os.path.join(directory, "objetos", "." + self.pack_name + ".tmp")
+        self._pack = _open_text(self._pack_tmp, "w")
+        # Hashes já resolvidos nesta execução (no índice ou no pacote novo), os gravados no pacote novo e os pacotes
+        # de onde vêm os registos referenciados.
+        self.seen, self.new, self.packs = set(), set(), set()
+        self.pages, self.listings = [], {}
+        self.stats = {"registos": 0, "novos": 0, "bytes_json": 0}
+
+    def _store(self, records):
+        """Grava os registos ainda desconhecidos e devolve os hashes, pela ordem de records."""
+        hashed = [record_hash(r) for r in records]
+        with self.lock:
+            pending = [(h, text) for h, text in hashed if h not in self.seen]
+            for lo in range(0, len(pending), LOOKUP_BATCH):
+                batch = pending[lo:lo + LOOKUP_BATCH]
+                rows = self.index.execute(f"SELECT o.hash, p.name FROM objects o JOIN packs p ON p.id = o.pack WHERE o.hash IN ({','.join('?' * len(batch))})",
+                                          [bytes.fromhex(h) for h, _ in batch])
+                known = {blob.hex(): pack for blob, pack in rows}
+                self.packs.update(known.values())
+                for h, text in batch:
+                    if h in self.seen: continue
+                    self.seen.add(h)
+                    if h in known: continue
+                    self._pack.write(h + "\t" + text + "\n")
+                    self.new.add(h)
+                    self.stats["novos"] += 1; self.stats["bytes_json"] += len(text) + 1
+            self.stats["registos"] += len(hashed)
+        return [h for h, _ in hashed]
+
+    def add_page(self, path, params, page, items):
+        hashes = self._store(items)
+        with self.lock: self.pages.append({"endpoint": path, "params": params, "pagina": page, "hashes": hashes})
+
+    def items(self, path, items, batch=LOOKUP_BATCH * 4):
+        """Devolve os itens tal como chegam e regista-os (por hash) como os itens de path usados nos relatórios."""
+        listing, buf = self.listings.setdefault(path, []), []
+        for item in items:
+            buf.append(item)
+            if len(buf) >= batch:
+                listing.extend(self._store(buf)); yield from buf; buf = []
+        listing.extend(self._store(buf)); yield from buf
+
+    def close(self, **meta):
+        """Fecha o pacote, acrescenta os registos novos ao índice e escreve o manifesto; devolve o ID do snapshot."""
+        self._pack.close()
+        if not self.new:
+            os.remove(self._pack_tmp)
+        else:
+            os.replace(self._pack_tmp, self._pack_path)
+            self.packs.add(self.pack_name)
+            pack_id = self.index.execute("INSERT INTO packs (name) VALUES (?)", (self.pack_name,)).lastrowid
+            self.index.executemany("INSERT OR IGNORE INTO objects (hash, pack) VALUES (?, ?)", ((bytes.fromhex(h), pack_id) for h in self.new))
+        self.index.commit(); self.index.close()
+        header = {"id": self.id, "criado_em": datetime.now().isoformat(timespec="seconds"), "pacotes": sorted(self.packs),
+                  "itens": {path: len(hashes) for path, hashes in self.listings.items()}, "paginas": len(self.pages),
+                  "base": self.base, "profundidade": self.depth, **meta}
+        base = SnapshotReader(self.directory, self.base).listings if self.base else {}
+        base_positions = {path: _positions(hashes) for path, hashes in base.items()}
+        with atomic_path(_manifest_path(self.directory, self.id)) as tmp, _open_text(tmp, "w") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for page in self.pages:
+                # Os hashes de cada página também vão como saltos sobre a lista do snapshot anterior: numa busca
+                # completa, quase todos os registos já lá estão, pela mesma ordem.
+                row = dict(page, hashes=_encode_listing(page["hashes"], base_positions.get(page["endpoint"], {})))
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+            for path, hashes in self.listings.items():
+                encoded = _encode_listing(hashes, _positions(_reference(path, base, self.pages)))
+                for lo in range(0, len(encoded), 10_000):
+                    f.write(json.dumps({"itens": path, "ref": encoded[lo:lo + 10_000]}, separators=(",", ":")) + "\n")
+        return self.id
+
+    def abort(self):
+        self._pack.close(); self.index.close()
+        if os.path.exists(self._pack_tmp): os.remove(self._pack_tmp)
+
+# Os itens usados nos relatórios são quase todos os do snapshot anterior e os das páginas desta execução, pela mesma
+# ordem: no manifesto, cada um é gravado como o salto (inteiro) desde a posição anterior nessa sequência de
+# referência, ou como o hash quando não está nela. Um dia sem mudanças fica com uma lista de 1, que o gzip reduz a
+# quase nada, em vez de repetir todos os hashes. As páginas usam a mesma codificação sobre a lista anterior.
+def _reference(path, base, pages):
+    return base.get(path, []) + [h for page in pages if page["endpoint"] == path for h in page["hashes"]]
+
+def _positions(sequence):
+    position = {}
+    for i, h in enumerate(sequence): position.setdefault(h, i)
+    return position
+
+def _encode_listing(hashes, position):
+    out, prev = [], -1
+    for h in hashes:
+        pos = position.get(h)
+        if pos is None: out.append(h)
+        else: out.append(pos - prev); prev = pos
+    return out
+
+def _decode_listing(encoded, sequence):
+    out, prev = [], -1
+    for ref in encoded:
+        if isinstance(ref, str): out.append(ref)
+        else: prev += ref; out.append(sequence[prev])
+    return out
+
+class SnapshotReader:
+    """Lê um snapshot gravado (ID ou "ultimo"): header com as datas da execução, e os itens de cada endpoint."""
+
+    def __init__(self, directory, snapshot_id="ultimo"):
+        available = list_snapshots(directory)
+        if snapshot_id in ("ultimo", "latest") and available: snapshot_id = available[-1]
+        if snapshot_id not in available:
+            raise FileNotFoundError(f"Snapshot '{snapshot_id}' não encontrado em '{directory}'. Disponíveis: {', '.join(available) or 'nenhum'}.")
+        self.directory, self.id = directory, snapshot_id
+        refs, self.pages = {}, []
+        with _open_text(_manifest_path(directory, snapshot_id), "r") as f:
+            self.header = json.loads(next(f))
+            for line in f:
+                row = json.loads(line)
+                if "itens" in row: refs.setdefault(row["itens"], []).extend(row["ref"])
+                else: self.pages.append(row)
+        base = SnapshotReader(directory, self.header["base"]).listings if self.header.get("base") else {}
+        for page in self.pages: page["hashes"] = _decode_listing(page["hashes"], base.get(page["endpoint"], []))
+        self.listings = {path: _decode_listing(encoded, _reference(path, base, self.pages)) for path, encoded in refs.items()}
+        self._texts = None
+
+    def _load(self):
+        # Lê os pacotes uma única vez e guarda só o texto dos registos referenciados pelo manifesto.
+        needed = set().union(*self.listings.values()) if self.listings else set()
+        texts = {}
+        for pack in self.header["pacotes"]:
+            with _open_text(os.path.join(self.directory, "objetos", pack), "r") as f:
+                for line in f:
+                    h, _, text = line.partition("\t")
+                    if h in needed: texts[h] = text[:-1]
+        missing = len(needed) - len(texts)
+        if missing: raise RuntimeError(f"Snapshot '{self.id}': {missing} registos em falta nos pacotes {self.header['pacotes']}.")
+        self._texts = texts
+
+    def items(self, path):
+        """Itera os itens (dicts) de path pela ordem em que os relatórios os receberam."""
+        if self._texts is None: self._load()
+        for h in self.listings.get(path, ()):
+            yield json.loads(self._texts[h])